@@ -28,14 +28,31 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True
 }
 
+# Réplicas de leitura opcionais (hosts separados por vírgula, mesmas credenciais do primário)
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if host.strip()]
+if DB_REPLICA_HOSTS:
+    app.config['SQLALCHEMY_BINDS'] = {
+        f'replica_{index}': f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{host if ':' in host else f'{host}:{DB_PORT}'}/{DB_NAME}"
+        for index, host in enumerate(DB_REPLICA_HOSTS)
+    }
+
 # Configurar CORS
 CORS(app, origins="*")
 
 # Inicializar SQLAlchemy
 db.init_app(app)
 
-# Configurar SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# Leituras de relatórios e dashboards nas réplicas (quando configuradas)
+from src.utils.replicas import init_replica_routing
+init_replica_routing(app)
+
+# Configurar SocketIO (fila de mensagens opcional, ex.: redis://, para vários workers)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode='threading',
+    message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE')
+)
 
 # Configurar JWT
 jwt = JWTManager(app)
@@ -48,6 +65,13 @@ with app.app_context():
     from src.models.customer import Customer
     from src.models.service import Service
     from src.models.payment import Payment, Commission, DriverEarning
+    from src.models.ledger import LedgerEntry, AccountBalance
+    from src.models.idempotency import IdempotencyKey
+    from src.models.settings import CommissionSettings
+    from src.models.outbox import OutboxEvent
+    from src.models.reconciliation import ReconciliationRun, ReconciliationMismatch
+    from src.models.rollup import DailyPlatformStats, DailyCompanyStats, DailyDriverStats, RollupDirtyDay, RollupState
+    from src.models.replica import ReplicaHeartbeat
     from src.models.trip import Trip
     from src.models.chat import ChatMessage, ChatRoom
     from src.models.rating import DriverRating
@@ -57,7 +81,7 @@ with app.app_context():
     from src.routes.driver import driver_bp
     from src.routes.customer import customer_bp
     from src.routes.admin import admin_bp
-    from src.routes.chat import chat_bp
+    from src.routes.chat import chat_bp, register_socketio_events
     from src.routes.rating import rating_bp
     from src.routes.location import location_bp
     from src.routes.user import user_bp
@@ -72,12 +96,31 @@ with app.app_context():
     app.register_blueprint(location_bp, url_prefix='/api/location')
     app.register_blueprint(user_bp, url_prefix='/api/user')
     
+    # Registrar eventos do SocketIO
+    register_socketio_events(socketio)
+    
     # Criar tabelas se não existirem
     try:
         db.create_all()
         print("✅ Banco de dados conectado e tabelas criadas!")
     except Exception as e:
         print(f"❌ Erro ao conectar com banco: {e}")
+    
+    # Consumidor do outbox (pagamentos gerados na conclusão de viagens)
+    from src.services.outbox import start_outbox_consumer
+    start_outbox_consumer(socketio, app)
+    
+    # Consolidação diária (relatórios por período)
+    from src.services.rollups import start_rollup_worker
+    start_rollup_worker(socketio, app)
+    
+    # Snapshot colunar para consultas analíticas do admin
+    from src.services.analytics_snapshot import start_snapshot_worker
+    start_snapshot_worker(socketio, app)
+    
+    # Heartbeat no primário para medir o atraso das réplicas
+    from src.utils.replicas import start_replica_heartbeat
+    start_replica_heartbeat(socketio, app)
 
 @app.route('/')
 def home():
@@ -309,7 +352,182 @@ def migrate_database():
             migrations_executed.append('driver_ratings.company_id_nullable')
         except Exception as e:
             pass
-        
+
+        # 8. Chave canônica do par de participantes nas salas de chat
+        try:
+            cursor.execute("ALTER TABLE chat_rooms ADD COLUMN pair_key VARCHAR(64) NULL")
+            migrations_executed.append('chat_rooms.pair_key')
+        except Exception as e:
+            if '1060' not in str(e):
+                pass
+
+        try:
+            # Preencher a chave com os pares (tipo, id) ordenados
+            cursor.execute("""
+                UPDATE chat_rooms SET pair_key = CASE
+                    WHEN participant1_type < participant2_type
+                      OR (participant1_type = participant2_type AND participant1_id <= participant2_id)
+                    THEN CONCAT(participant1_type, ':', participant1_id, '|', participant2_type, ':', participant2_id)
+                    ELSE CONCAT(participant2_type, ':', participant2_id, '|', participant1_type, ':', participant1_id)
+                END
+                WHERE pair_key IS NULL
+            """)
+            # Salas duplicadas antigas ficam sem chave; apenas a mais antiga de cada par é mantida no índice
+            cursor.execute("""
+                UPDATE chat_rooms r
+                JOIN (
+                    SELECT pair_key, MIN(id) AS keep_id
+                    FROM chat_rooms
+                    WHERE pair_key IS NOT NULL
+                    GROUP BY pair_key
+                    HAVING COUNT(*) > 1
+                ) d ON r.pair_key = d.pair_key AND r.id <> d.keep_id
+                SET r.pair_key = NULL
+            """)
+            migrations_executed.append('chat_rooms.pair_key_backfill')
+        except Exception as e:
+            pass
+
+        try:
+            cursor.execute("CREATE UNIQUE INDEX ix_chat_rooms_pair_key ON chat_rooms (pair_key)")
+            migrations_executed.append('chat_rooms.ix_chat_rooms_pair_key')
+        except Exception as e:
+            if '1061' not in str(e):
+                pass
+
+        # 9. Índice FULLTEXT para a busca de mensagens do chat
+        try:
+            cursor.execute("CREATE FULLTEXT INDEX ix_chat_messages_message_ft ON chat_messages (message)")
+            migrations_executed.append('chat_messages.ix_chat_messages_message_ft')
+        except Exception as e:
+            if '1061' not in str(e):
+                pass
+
+        # 10. Fila de suporte: flag de resposta pendente do admin e índices
+        try:
+            cursor.execute("ALTER TABLE chat_rooms ADD COLUMN awaiting_admin_reply BOOLEAN DEFAULT FALSE")
+            migrations_executed.append('chat_rooms.awaiting_admin_reply')
+        except Exception as e:
+            if '1060' not in str(e):
+                pass
+
+        try:
+            cursor.execute("ALTER TABLE chat_rooms ADD COLUMN awaiting_since DATETIME NULL")
+            migrations_executed.append('chat_rooms.awaiting_since')
+        except Exception as e:
+            if '1060' not in str(e):
+                pass
+
+        try:
+            # Salas de suporte cuja última mensagem não foi do admin entram na fila
+            cursor.execute("""
+                UPDATE chat_rooms r
+                JOIN chat_messages m ON m.id = (
+                    SELECT MAX(id) FROM chat_messages WHERE chat_room_id = r.id
+                )
+                SET r.awaiting_admin_reply = TRUE,
+                    r.awaiting_since = COALESCE(r.awaiting_since, m.created_at)
+                WHERE 'admin' IN (r.participant1_type, r.participant2_type)
+                  AND m.sender_type <> 'admin'
+            """)
+            migrations_executed.append('chat_rooms.awaiting_admin_reply_backfill')
+        except Exception as e:
+            pass
+
+        for index_sql, description in [
+            ("CREATE INDEX ix_chat_rooms_active_last_message ON chat_rooms (is_active, last_message_at)",
+             'chat_rooms.ix_chat_rooms_active_last_message'),
+            ("CREATE INDEX ix_chat_rooms_support_queue ON chat_rooms (is_active, awaiting_admin_reply, awaiting_since)",
+             'chat_rooms.ix_chat_rooms_support_queue'),
+        ]:
+            try:
+                cursor.execute(index_sql)
+                migrations_executed.append(description)
+            except Exception as e:
+                if '1061' not in str(e):
+                    pass
+
+        # 11. Índice para a varredura de repasses pendentes
+        try:
+            cursor.execute("CREATE INDEX ix_driver_earnings_status_id ON driver_earnings (status_repasse, id)")
+            migrations_executed.append('driver_earnings.ix_driver_earnings_status_id')
+        except Exception as e:
+            if '1061' not in str(e):
+                pass
+
+        # 12. Valores monetários de FLOAT para DECIMAL(14,2) (arredonda ao centavo; pode ser reexecutado)
+        money_columns = [
+            ('services', 'valor_base', 'NOT NULL'),
+            ('services', 'valor_final', 'NULL'),
+            ('services', 'valor_comissao', 'NULL'),
+            ('services', 'valor_motorista', 'NULL'),
+            ('payments', 'valor_total', 'NOT NULL'),
+            ('payments', 'valor_comissao', 'NOT NULL'),
+            ('payments', 'valor_motorista', 'NOT NULL'),
+            ('commissions', 'valor_comissao', 'NOT NULL'),
+            ('commissions', 'valor_servico', 'NOT NULL'),
+            ('driver_earnings', 'valor_bruto', 'NOT NULL'),
+            ('driver_earnings', 'valor_comissao', 'NOT NULL'),
+            ('driver_earnings', 'valor_liquido', 'NOT NULL'),
+            ('customers', 'total_gasto', 'NULL DEFAULT 0'),
+            ('payout_jobs', 'total_amount', 'NULL DEFAULT 0'),
+            ('ledger_entries', 'debit', 'NOT NULL DEFAULT 0'),
+            ('ledger_entries', 'credit', 'NOT NULL DEFAULT 0'),
+            ('account_balances', 'balance', 'NOT NULL DEFAULT 0'),
+            ('account_balances', 'total_debits', 'NOT NULL DEFAULT 0'),
+            ('account_balances', 'total_credits', 'NOT NULL DEFAULT 0'),
+            ('commission_settings', 'min_commission', 'NOT NULL'),
+            ('commission_settings', 'max_commission', 'NOT NULL'),
+        ]
+        for table, column, options in money_columns:
+            try:
+                cursor.execute(f"ALTER TABLE {table} MODIFY COLUMN {column} DECIMAL(14,2) {options}")
+                migrations_executed.append(f'{table}.{column} DECIMAL(14,2)')
+            except Exception as e:
+                pass
+
+        # 13. Índice para as faixas de data da conciliação
+        try:
+            cursor.execute("CREATE INDEX ix_payments_status_data ON payments (status_pagamento, data_pagamento)")
+            migrations_executed.append('payments.ix_payments_status_data')
+        except Exception as e:
+            if '1061' not in str(e):
+                pass
+
+        # 14. Índices da listagem de transações do admin (filtro + cursor por id)
+        transaction_indexes = [
+            ('ix_payments_status_id', 'status_pagamento, id'),
+            ('ix_payments_metodo_id', 'metodo_pagamento, id'),
+            ('ix_payments_company_id_id', 'company_id, id'),
+            ('ix_payments_driver_id_id', 'driver_id, id'),
+        ]
+        for index_name, columns in transaction_indexes:
+            try:
+                cursor.execute(f"CREATE INDEX {index_name} ON payments ({columns})")
+                migrations_executed.append(f'payments.{index_name}')
+            except Exception as e:
+                if '1061' not in str(e):
+                    pass
+
+        # 15. Índices da consolidação diária (updated_at e datas dos eventos)
+        rollup_indexes = [
+            ('services', 'ix_services_updated_at', 'updated_at'),
+            ('services', 'ix_services_data_solicitacao', 'data_solicitacao'),
+            ('services', 'ix_services_status_conclusao', 'status, data_conclusao'),
+            ('trips', 'ix_trips_updated_at', 'updated_at'),
+            ('trips', 'ix_trips_status_fim', 'status, data_fim'),
+            ('payments', 'ix_payments_updated_at', 'updated_at'),
+            ('driver_ratings', 'ix_driver_ratings_updated_at', 'updated_at'),
+            ('driver_ratings', 'ix_driver_ratings_created_at', 'created_at'),
+        ]
+        for table, index_name, columns in rollup_indexes:
+            try:
+                cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+                migrations_executed.append(f'{table}.{index_name}')
+            except Exception as e:
+                if '1061' not in str(e):
+                    pass
+
         connection.commit()
         cursor.close()
         connection.close()
@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from src.models.user import db
 
 class ChatMessage(db.Model):
@@ -31,6 +33,11 @@ class ChatMessage(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Índice FULLTEXT para a busca de mensagens (MySQL)
+        db.Index('ix_chat_messages_message_ft', 'message', mysql_prefix='FULLTEXT'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -68,6 +75,9 @@ class ChatRoom(db.Model):
     participant2_id = db.Column(db.Integer, nullable=False)
     participant2_type = db.Column(db.String(20), nullable=False) # 'admin', 'company', 'driver'
     
+    # Chave canônica do par de participantes, ex.: 'company:3|driver:7' (ordem independente)
+    pair_key = db.Column(db.String(64), nullable=True)
+    
     # Opcional: ID do serviço se o chat for relacionado a um serviço específico
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=True)
     
@@ -82,9 +92,19 @@ class ChatRoom(db.Model):
     unread_count_p1 = db.Column(db.Integer, default=0)
     unread_count_p2 = db.Column(db.Integer, default=0)
     
+    # Fila de suporte: salas com admin aguardando resposta desde awaiting_since
+    awaiting_admin_reply = db.Column(db.Boolean, default=False)
+    awaiting_since = db.Column(db.DateTime, nullable=True)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('ix_chat_rooms_pair_key', 'pair_key', unique=True),
+        db.Index('ix_chat_rooms_active_last_message', 'is_active', 'last_message_at'),
+        db.Index('ix_chat_rooms_support_queue', 'is_active', 'awaiting_admin_reply', 'awaiting_since'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -98,26 +118,142 @@ class ChatRoom(db.Model):
             'last_message_preview': self.last_message_preview,
             'unread_count_p1': self.unread_count_p1,
             'unread_count_p2': self.unread_count_p2,
+            'awaiting_admin_reply': self.awaiting_admin_reply,
+            'awaiting_since': self.awaiting_since.isoformat() if self.awaiting_since else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
-    def update_last_message(self, message, sender_id):
-        self.last_message_at = datetime.utcnow()
-        self.last_message_preview = message[:200] if len(message) > 200 else message
+    def participant_slot(self, user_type, user_id):
+        """Retorna 1 ou 2 conforme a posição do usuário na sala, ou None"""
+        if user_type == self.participant1_type and user_id == self.participant1_id:
+            return 1
+        if user_type == self.participant2_type and user_id == self.participant2_id:
+            return 2
+        return None
+    
+    @property
+    def is_support_room(self):
+        return 'admin' in (self.participant1_type, self.participant2_type)
+    
+    def admin_unread_count(self):
+        """Mensagens não lidas pelo lado admin de uma sala de suporte"""
+        if self.participant1_type == 'admin':
+            return self.unread_count_p1
+        if self.participant2_type == 'admin':
+            return self.unread_count_p2
+        return 0
+    
+    def update_last_message(self, message, sender_id, sender_type):
+        """Atualiza a prévia e incrementa o contador do destinatário no próprio SQL"""
+        now = datetime.utcnow()
+        values = {
+            ChatRoom.last_message_at: now,
+            ChatRoom.last_message_preview: message[:200]
+        }
+        
+        # Salas de suporte entram na fila na primeira mensagem sem resposta do admin
+        if self.is_support_room:
+            if sender_type == 'admin':
+                values[ChatRoom.awaiting_admin_reply] = False
+                values[ChatRoom.awaiting_since] = None
+            else:
+                values[ChatRoom.awaiting_admin_reply] = True
+                values[ChatRoom.awaiting_since] = func.coalesce(ChatRoom.awaiting_since, now)
+        
+        # unread = unread + 1, sem ler o valor atual (seguro com remetentes concorrentes)
+        slot = self.participant_slot(sender_type, sender_id)
+        if slot == 1:
+            values[ChatRoom.unread_count_p2] = ChatRoom.unread_count_p2 + 1
+        elif slot == 2:
+            values[ChatRoom.unread_count_p1] = ChatRoom.unread_count_p1 + 1
+        
+        ChatRoom.query.filter_by(id=self.id).update(values, synchronize_session=False)
+    
+    def mark_messages_as_read(self, reader_id, reader_type, last_seen_id=None):
+        """Marca como lidas as mensagens até last_seen_id e recalcula o contador do leitor.
+        
+        Usa um único UPDATE por faixa de ids. Retorna (mensagens_atualizadas, last_seen_id).
+        Quem não participa da sala (ex.: admin olhando uma sala empresa-motorista)
+        não marca nada como lido.
+        """
+        slot = self.participant_slot(reader_type, reader_id)
+        if slot is None:
+            return 0, last_seen_id
+        
+        if last_seen_id is None:
+            last_seen_id = db.session.query(func.max(ChatMessage.id))\
+                .filter(ChatMessage.chat_room_id == self.id).scalar()
+            if last_seen_id is None:
+                return 0, None
+        
+        sent_by_reader = db.and_(
+            ChatMessage.sender_type == reader_type,
+            ChatMessage.sender_id == reader_id
+        )
+        
+        updated = ChatMessage.query.filter(
+            ChatMessage.chat_room_id == self.id,
+            ChatMessage.id <= last_seen_id,
+            ChatMessage.is_read == False,
+            db.not_(sent_by_reader)
+        ).update({
+            ChatMessage.is_read: True,
+            ChatMessage.read_at: datetime.utcnow()
+        }, synchronize_session=False)
+        
+        # O contador passa a ser o número de mensagens recebidas após last_seen_id,
+        # mas uma leitura nunca o aumenta (ex.: confirmação de uma página antiga)
+        counter = ChatRoom.unread_count_p1 if slot == 1 else ChatRoom.unread_count_p2
+        remaining = db.session.query(func.count(ChatMessage.id)).filter(
+            ChatMessage.chat_room_id == self.id,
+            ChatMessage.id > last_seen_id,
+            db.not_(sent_by_reader)
+        ).scalar_subquery()
+        
+        # Salas já zeradas não são reescritas
+        ChatRoom.query.filter(ChatRoom.id == self.id, counter != 0)\
+            .update({counter: db.case((remaining < counter, remaining), else_=counter)},
+                    synchronize_session=False)
+        
+        return updated, last_seen_id
+    
+    @staticmethod
+    def build_pair_key(type1, id1, type2, id2):
+        """Gera a chave canônica a partir dos pares (tipo, id) ordenados"""
+        pairs = sorted([(type1, int(id1)), (type2, int(id2))])
+        return '|'.join(f'{user_type}:{user_id}' for user_type, user_id in pairs)
+    
+    @classmethod
+    def get_or_create(cls, type1, id1, type2, id2, service_id=None):
+        """Busca a sala do par pelo índice único ou cria uma nova.
+        
+        Retorna (sala, criada). Se outra requisição criar a mesma sala ao mesmo
+        tempo, a violação do índice único é tratada e a sala existente é retornada.
+        """
+        pair_key = cls.build_pair_key(type1, id1, type2, id2)
+        
+        room = cls.query.filter_by(pair_key=pair_key).first()
+        if room:
+            return room, False
+        
+        room = cls(
+            participant1_id=int(id1),
+            participant1_type=type1,
+            participant2_id=int(id2),
+            participant2_type=type2,
+            service_id=service_id,
+            pair_key=pair_key
+        )
+        
+        try:
+            with db.session.begin_nested():
+                db.session.add(room)
+        except IntegrityError:
+            # Outra requisição criou a sala primeiro
+            return cls.query.filter_by(pair_key=pair_key).one(), False
         
-        # Incrementar contador de não lidas para o destinatário
-        if sender_id == self.participant1_id:
-            self.unread_count_p2 += 1
-        elif sender_id == self.participant2_id:
-            self.unread_count_p1 += 1
-    
-    def mark_messages_as_read(self, reader_id):
-        """Marca mensagens como lidas e zera o contador para o leitor"""
-        if reader_id == self.participant1_id:
-            self.unread_count_p1 = 0
-        elif reader_id == self.participant2_id:
-            self.unread_count_p2 = 0
+        return room, True
     
     def __repr__(self):
         return f'<ChatRoom {self.id}>'
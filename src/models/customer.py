@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.utils.money import Money
 
 class Customer(db.Model):
     __tablename__ = 'customers'
@@ -21,7 +22,7 @@ class Customer(db.Model):
     foto_url = db.Column(db.String(255), nullable=True)
     status = db.Column(db.String(20), default='ativo')  # ativo, inativo, pendente, suspenso
     total_servicos = db.Column(db.Integer, default=0)
-    total_gasto = db.Column(db.Float, default=0.00)
+    total_gasto = db.Column(Money, default=0.00)
     avaliacao_media = db.Column(db.Float, default=0.00)
     metodo_pagamento_preferido = db.Column(db.String(20), default='pix')  # pix, cartao, dinheiro
     
@@ -0,0 +1,28 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class IdempotencyKey(db.Model):
+    """Resposta armazenada para uma Idempotency-Key enviada pelo cliente"""
+    __tablename__ = 'idempotency_keys'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # SHA-256 de usuário + método + rota + chave (a chave original não é gravada)
+    key_hash = db.Column(db.String(64), nullable=False, unique=True)
+    # SHA-256 do corpo da requisição, para detectar reuso da chave com outro payload
+    request_hash = db.Column(db.String(64), nullable=False)
+
+    status = db.Column(db.String(20), nullable=False, default='processando')  # processando, concluido
+
+    # Resposta original
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key_hash[:12]} - {self.status}>'
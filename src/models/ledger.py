@@ -0,0 +1,91 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+from src.utils.money import Money
+
+class LedgerEntry(db.Model):
+    """Lançamento do livro razão (append-only, partidas dobradas)"""
+    __tablename__ = 'ledger_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Lançamentos de um mesmo evento compartilham a chave, ex.: 'payment_approved:42'
+    journal_key = db.Column(db.String(64), nullable=False)
+    entry_type = db.Column(db.String(30), nullable=False)  # payment_approved, driver_payout
+
+    # Conta: ('driver', id), ('company', id), ('platform', 0), ('bank', 0)
+    account_type = db.Column(db.String(20), nullable=False)
+    account_id = db.Column(db.Integer, nullable=False)
+
+    # Valores
+    debit = db.Column(Money, nullable=False, default=0.0)
+    credit = db.Column(Money, nullable=False, default=0.0)
+
+    # Referências de origem
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=True)
+    driver_earning_id = db.Column(db.Integer, db.ForeignKey('driver_earnings.id'), nullable=True)
+
+    description = db.Column(db.String(200), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Um evento não pode ser lançado duas vezes na mesma conta
+        db.Index('ix_ledger_entries_journal_account', 'journal_key', 'account_type', 'account_id', unique=True),
+        # Extrato por conta
+        db.Index('ix_ledger_entries_account', 'account_type', 'account_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'journal_key': self.journal_key,
+            'entry_type': self.entry_type,
+            'account_type': self.account_type,
+            'account_id': self.account_id,
+            'debit': self.debit,
+            'credit': self.credit,
+            'payment_id': self.payment_id,
+            'driver_earning_id': self.driver_earning_id,
+            'description': self.description,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.id} - {self.account_type}:{self.account_id}>'
+
+
+class AccountBalance(db.Model):
+    """Saldo materializado por conta, atualizado na mesma transação dos lançamentos"""
+    __tablename__ = 'account_balances'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    account_type = db.Column(db.String(20), nullable=False)
+    account_id = db.Column(db.Integer, nullable=False)
+
+    # Saldo = créditos - débitos
+    balance = db.Column(Money, nullable=False, default=0.0)
+    total_debits = db.Column(Money, nullable=False, default=0.0)
+    total_credits = db.Column(Money, nullable=False, default=0.0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_account_balances_account', 'account_type', 'account_id', unique=True),
+    )
+
+    def to_dict(self):
+        return {
+            'account_type': self.account_type,
+            'account_id': self.account_id,
+            'balance': self.balance,
+            'total_debits': self.total_debits,
+            'total_credits': self.total_credits,
+            'entry_count': self.entry_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<AccountBalance {self.account_type}:{self.account_id} - R$ {self.balance}>'
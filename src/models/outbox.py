@@ -0,0 +1,43 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+
+class OutboxEvent(db.Model):
+    """Evento gravado na mesma transação da alteração de origem e consumido em segundo plano"""
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    event_type = db.Column(db.String(50), nullable=False)  # trip_completed
+    aggregate_id = db.Column(db.Integer, nullable=False)  # ex.: id do serviço
+    payload = db.Column(db.Text, nullable=False)  # JSON compacto
+
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processado, ignorado, erro
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)  # próxima tentativa
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Um evento por agregado (ex.: o serviço só é concluído uma vez)
+        db.Index('ix_outbox_events_type_aggregate', 'event_type', 'aggregate_id', unique=True),
+        db.Index('ix_outbox_events_status_id', 'status', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'aggregate_id': self.aggregate_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'available_at': self.available_at.isoformat() if self.available_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} - {self.event_type}:{self.aggregate_id}>'
@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.utils.money import Money
 
 class Payment(db.Model):
     __tablename__ = 'payments'
@@ -14,9 +15,9 @@ class Payment(db.Model):
     customer_id = db.Column(db.Integer, db.ForeignKey('customers.id'), nullable=True)  # Para serviços de pessoa física
     
     # Valores do pagamento
-    valor_total = db.Column(db.Float, nullable=False)
-    valor_comissao = db.Column(db.Float, nullable=False)
-    valor_motorista = db.Column(db.Float, nullable=False)
+    valor_total = db.Column(Money, nullable=False)
+    valor_comissao = db.Column(Money, nullable=False)
+    valor_motorista = db.Column(Money, nullable=False)
     
     # Método de pagamento
     metodo_pagamento = db.Column(db.String(50), nullable=False)  # pix, cartao_credito, cartao_debito, dinheiro, boleto
@@ -39,6 +40,18 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Faixas de data dos pagamentos aprovados (conciliação, relatórios)
+        db.Index('ix_payments_status_data', 'status_pagamento', 'data_pagamento'),
+        # Listagem de transações do admin (filtro + cursor por id)
+        db.Index('ix_payments_status_id', 'status_pagamento', 'id'),
+        db.Index('ix_payments_metodo_id', 'metodo_pagamento', 'id'),
+        db.Index('ix_payments_company_id_id', 'company_id', 'id'),
+        db.Index('ix_payments_driver_id_id', 'driver_id', 'id'),
+        # Linhas alteradas desde a última consolidação diária
+        db.Index('ix_payments_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -74,9 +87,9 @@ class Commission(db.Model):
     company_id = db.Column(db.Integer, db.ForeignKey('companies.id'), nullable=False)
     
     # Valores da comissão
-    valor_comissao = db.Column(db.Float, nullable=False)
+    valor_comissao = db.Column(Money, nullable=False)
     percentual_comissao = db.Column(db.Float, nullable=False)
-    valor_servico = db.Column(db.Float, nullable=False)
+    valor_servico = db.Column(Money, nullable=False)
     
     # Status da comissão
     status = db.Column(db.String(30), default='pendente')  # pendente, processada, paga
@@ -118,9 +131,9 @@ class DriverEarning(db.Model):
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
     
     # Valores dos ganhos
-    valor_bruto = db.Column(db.Float, nullable=False)  # Valor total do serviço
-    valor_comissao = db.Column(db.Float, nullable=False)  # Comissão da plataforma
-    valor_liquido = db.Column(db.Float, nullable=False)  # Valor que o motorista recebe
+    valor_bruto = db.Column(Money, nullable=False)  # Valor total do serviço
+    valor_comissao = db.Column(Money, nullable=False)  # Comissão da plataforma
+    valor_liquido = db.Column(Money, nullable=False)  # Valor que o motorista recebe
     
     # Status do repasse
     status_repasse = db.Column(db.String(30), default='pendente')  # pendente, processando, pago, erro
@@ -141,6 +154,11 @@ class DriverEarning(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Varredura de repasses pendentes em ordem de id
+        db.Index('ix_driver_earnings_status_id', 'status_repasse', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -165,3 +183,54 @@ class DriverEarning(db.Model):
     def __repr__(self):
         return f'<DriverEarning {self.id} - R$ {self.valor_liquido}>'
 
+
+
+class PayoutJob(db.Model):
+    __tablename__ = 'payout_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Status do job
+    status = db.Column(db.String(30), default='pendente')  # pendente, executando, concluido, erro
+    
+    # Parâmetros
+    cutoff_time = db.Column(db.DateTime, nullable=False)  # Ganhos até esta data entram no repasse
+    chunk_size = db.Column(db.Integer, default=500)
+    
+    # Checkpoint: último DriverEarning.id processado
+    last_earning_id = db.Column(db.Integer, default=0)
+    
+    # Progresso
+    processed_count = db.Column(db.Integer, default=0)
+    total_amount = db.Column(Money, default=0.0)
+    chunks_done = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+    
+    # Datas
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'cutoff_time': self.cutoff_time.isoformat() if self.cutoff_time else None,
+            'chunk_size': self.chunk_size,
+            'last_earning_id': self.last_earning_id,
+            'processed_count': self.processed_count,
+            'total_amount': self.total_amount,
+            'chunks_done': self.chunks_done,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<PayoutJob {self.id} - {self.status}>'
@@ -24,6 +24,12 @@ class DriverRating(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Consolidação diária (linhas alteradas e dias recalculados)
+        db.Index('ix_driver_ratings_updated_at', 'updated_at'),
+        db.Index('ix_driver_ratings_created_at', 'created_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
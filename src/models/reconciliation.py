@@ -0,0 +1,92 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+from src.utils.money import Money
+
+class ReconciliationRun(db.Model):
+    """Execução da conciliação financeira, processada em faixas de datas"""
+    __tablename__ = 'reconciliation_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    
+    # Status do job
+    status = db.Column(db.String(30), default='pendente')  # pendente, executando, concluido, erro
+    
+    # Parâmetros (Payment.data_pagamento em [start_date, end_date))
+    start_date = db.Column(db.DateTime, nullable=False)
+    end_date = db.Column(db.DateTime, nullable=False)
+    chunk_hours = db.Column(db.Integer, default=24)
+    
+    # Checkpoint: faixas anteriores a esta data já foram conciliadas
+    checkpoint_date = db.Column(db.DateTime, nullable=False)
+    
+    # Progresso
+    payments_checked = db.Column(db.Integer, default=0)
+    mismatches_found = db.Column(db.Integer, default=0)
+    chunks_done = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text, nullable=True)
+    
+    # Datas
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'start_date': self.start_date.isoformat() if self.start_date else None,
+            'end_date': self.end_date.isoformat() if self.end_date else None,
+            'chunk_hours': self.chunk_hours,
+            'checkpoint_date': self.checkpoint_date.isoformat() if self.checkpoint_date else None,
+            'payments_checked': self.payments_checked,
+            'mismatches_found': self.mismatches_found,
+            'chunks_done': self.chunks_done,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'heartbeat_at': self.heartbeat_at.isoformat() if self.heartbeat_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ReconciliationRun {self.id} - {self.status}>'
+
+
+class ReconciliationMismatch(db.Model):
+    """Divergência encontrada pela conciliação"""
+    __tablename__ = 'reconciliation_mismatches'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    run_id = db.Column(db.Integer, db.ForeignKey('reconciliation_runs.id'), nullable=False)
+    payment_id = db.Column(db.Integer, nullable=False)
+    
+    # missing_commission, duplicate_commission, commission_amount,
+    # missing_earning, duplicate_earning, earning_amount, payment_split
+    mismatch_type = db.Column(db.String(30), nullable=False)
+    
+    # Valor esperado x encontrado (quantidade de registros ou valor em R$, conforme o tipo)
+    expected_value = db.Column(Money, nullable=True)
+    actual_value = db.Column(Money, nullable=True)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_reconciliation_mismatches_run_type', 'run_id', 'mismatch_type', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'run_id': self.run_id,
+            'payment_id': self.payment_id,
+            'mismatch_type': self.mismatch_type,
+            'expected_value': self.expected_value,
+            'actual_value': self.actual_value,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ReconciliationMismatch {self.mismatch_type} - pagamento {self.payment_id}>'
@@ -0,0 +1,8 @@
+from src.models.user import db
+
+class ReplicaHeartbeat(db.Model):
+    """Marca de tempo gravada no primário para medir o atraso das réplicas"""
+    __tablename__ = 'replica_heartbeat'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    beat_at = db.Column(db.DateTime, nullable=False)
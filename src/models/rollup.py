@@ -0,0 +1,106 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+from src.utils.money import Money
+
+class DailyPlatformStats(db.Model):
+    """Totais diários da plataforma"""
+    __tablename__ = 'daily_platform_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False, unique=True)
+    
+    services_created = db.Column(db.Integer, nullable=False, default=0)
+    services_completed = db.Column(db.Integer, nullable=False, default=0)
+    trips_completed = db.Column(db.Integer, nullable=False, default=0)
+    payments_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    commission = db.Column(Money, nullable=False, default=0)
+    driver_payments = db.Column(Money, nullable=False, default=0)
+    ratings_count = db.Column(db.Integer, nullable=False, default=0)
+    ratings_sum = db.Column(db.Float, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class DailyCompanyStats(db.Model):
+    """Totais diários por empresa"""
+    __tablename__ = 'daily_company_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    company_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    
+    services_created = db.Column(db.Integer, nullable=False, default=0)
+    services_completed = db.Column(db.Integer, nullable=False, default=0)
+    trips_completed = db.Column(db.Integer, nullable=False, default=0)
+    payments_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(Money, nullable=False, default=0)
+    commission = db.Column(Money, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_daily_company_stats_company_day', 'company_id', 'day', unique=True),
+        db.Index('ix_daily_company_stats_day', 'day'),
+    )
+
+
+class DailyDriverStats(db.Model):
+    """Totais diários por motorista"""
+    __tablename__ = 'daily_driver_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    
+    trips_completed = db.Column(db.Integer, nullable=False, default=0)
+    payments_count = db.Column(db.Integer, nullable=False, default=0)
+    earnings = db.Column(Money, nullable=False, default=0)
+    ratings_count = db.Column(db.Integer, nullable=False, default=0)
+    ratings_sum = db.Column(db.Float, nullable=False, default=0)
+    
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_daily_driver_stats_driver_day', 'driver_id', 'day', unique=True),
+        db.Index('ix_daily_driver_stats_day', 'day'),
+    )
+
+
+class DailyDemandCell(db.Model):
+    """Serviços solicitados por dia, empresa e célula base da grade (origem)"""
+    __tablename__ = 'daily_demand_cells'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    company_id = db.Column(db.Integer, nullable=True)  # NULL para serviços de pessoa física
+    cell_x = db.Column(db.Integer, nullable=False)
+    cell_y = db.Column(db.Integer, nullable=False)
+    services = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_daily_demand_cells_day_company_cell', 'day', 'company_id', 'cell_x', 'cell_y', unique=True),
+        db.Index('ix_daily_demand_cells_company_day', 'company_id', 'day'),
+    )
+
+
+class RollupDirtyDay(db.Model):
+    """Dia a recalcular que a marca d'água não encontra (linha apagada ou data do evento alterada)"""
+    __tablename__ = 'rollup_dirty_days'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class RollupState(db.Model):
+    """Marca d'água (high-water mark) e vez (locked_at) dos jobs periódicos (consolidação, snapshot)"""
+    __tablename__ = 'rollup_state'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, unique=True)
+    watermark = db.Column(db.DateTime, nullable=True)  # alterações até aqui já consolidadas
+    days_refreshed = db.Column(db.Integer, default=0)
+    locked_at = db.Column(db.DateTime, nullable=True)  # execução em andamento
+    last_run_at = db.Column(db.DateTime, nullable=True)
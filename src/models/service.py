@@ -1,6 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.utils.money import Money
 
 class Service(db.Model):
     __tablename__ = 'services'
@@ -27,11 +28,11 @@ class Service(db.Model):
     destino_longitude = db.Column(db.Float, nullable=True)
     
     # Valores e pagamento
-    valor_base = db.Column(db.Float, nullable=False)
-    valor_final = db.Column(db.Float, nullable=True)
-    comissao_plataforma = db.Column(db.Float, default=0.15)  # 15% padrão
-    valor_comissao = db.Column(db.Float, nullable=True)
-    valor_motorista = db.Column(db.Float, nullable=True)
+    valor_base = db.Column(Money, nullable=False)
+    valor_final = db.Column(Money, nullable=True)
+    comissao_plataforma = db.Column(db.Float, nullable=True)  # fração; padrão vem das configurações de comissão
+    valor_comissao = db.Column(Money, nullable=True)
+    valor_motorista = db.Column(Money, nullable=True)
     
     # Status e datas
     status = db.Column(db.String(30), default='disponivel')  # disponivel, aceito, em_andamento, concluido, cancelado
@@ -52,19 +53,28 @@ class Service(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Consolidação diária e mapa de calor (linhas alteradas e dias recalculados)
+        db.Index('ix_services_updated_at', 'updated_at'),
+        db.Index('ix_services_data_solicitacao', 'data_solicitacao'),
+        db.Index('ix_services_status_conclusao', 'status', 'data_conclusao'),
+    )
+    
     # Relacionamentos
     trips = db.relationship('Trip', backref='service', lazy=True, cascade='all, delete-orphan')
     payments = db.relationship('Payment', backref='service', lazy=True, cascade='all, delete-orphan')
     # messages = db.relationship('ChatMessage', backref='service', lazy=True, cascade='all, delete-orphan')  # Removido: ChatMessage não tem service_id
     
     def calculate_commission(self):
-        """Calcula a comissão da plataforma"""
-        if self.valor_final:
-            self.valor_comissao = self.valor_final * self.comissao_plataforma
-            self.valor_motorista = self.valor_final - self.valor_comissao
-        elif self.valor_base:
-            self.valor_comissao = self.valor_base * self.comissao_plataforma
-            self.valor_motorista = self.valor_base - self.valor_comissao
+        """Calcula a comissão da plataforma com as configurações atuais (em cache)"""
+        from src.services.commission_settings import compute_commission
+        
+        valor = self.valor_final or self.valor_base
+        if not valor:
+            return
+        
+        rate, self.valor_comissao, self.valor_motorista = compute_commission(valor, rate=self.comissao_plataforma)
+        self.comissao_plataforma = rate
     
     def to_dict(self):
         return {
@@ -0,0 +1,35 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+from src.models.user import db
+from src.utils.money import Money
+
+class CommissionSettings(db.Model):
+    """Configurações de comissão versionadas (cada alteração cria uma nova versão)"""
+    __tablename__ = 'commission_settings'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, unique=True)
+
+    platform_commission = db.Column(db.Float, nullable=False)  # percentual, ex.: 15.0
+    min_commission = db.Column(Money, nullable=False)
+    max_commission = db.Column(Money, nullable=False)
+    auto_transfer = db.Column(db.Boolean, default=True)
+    transfer_delay = db.Column(db.Integer, nullable=False)  # horas
+
+    created_by = db.Column(db.Integer, nullable=True)  # id do admin
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'platform_commission': self.platform_commission,
+            'min_commission': self.min_commission,
+            'max_commission': self.max_commission,
+            'auto_transfer': self.auto_transfer,
+            'transfer_delay': self.transfer_delay,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+    def __repr__(self):
+        return f'<CommissionSettings v{self.version} - {self.platform_commission}%>'
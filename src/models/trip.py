@@ -42,6 +42,12 @@ class Trip(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        # Consolidação diária (linhas alteradas e dias recalculados)
+        db.Index('ix_trips_updated_at', 'updated_at'),
+        db.Index('ix_trips_status_fim', 'status', 'data_fim'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
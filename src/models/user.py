@@ -1,6 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
+from src.utils.replicas import RoutingSession
 
-db = SQLAlchemy()
+# Sessão que envia leituras de endpoints @read_replica para as réplicas
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
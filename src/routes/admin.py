@@ -1,24 +1,93 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 from src.models.user import db
 from src.models.company import Company
 from src.models.driver import Driver
 from src.models.service import Service
-from src.models.payment import Payment, Commission, DriverEarning
+from src.models.payment import Payment, Commission, DriverEarning, PayoutJob
 from src.models.trip import Trip
-from sqlalchemy import func
+from sqlalchemy import func, case, select
+from src.utils.money import money_sum
+from src.utils.cache import TTLCache
+from src.services.jobs import JobConflictError, is_job_running
+from src.services.payouts import (
+    DEFAULT_CHUNK_SIZE, get_or_create_payout_job, remaining_earnings, start_payout_job_in_background
+)
+from src.services.ledger import get_balance, get_statement
+from src.services.payout_export import EXPORT_FORMATS, invalid_cnab_rows, iter_earnings
+from src.services.report_export import (
+    GROUP_BY_OPTIONS, REPORT_FORMATS, export_financial_report
+)
+from src.utils.streaming import parquet_available
+from src.services.reconciliation import (
+    DEFAULT_CHUNK_HOURS, default_period, get_or_create_run, mismatch_summary, start_reconciliation_in_background
+)
+from src.models.reconciliation import ReconciliationRun, ReconciliationMismatch
+from src.models.rollup import DailyPlatformStats
+from src.services.rollups import parse_day_range, range_stats
+from src.services.leaderboards import DEFAULT_WINDOW, clamp_limit, get_leaderboard, window_start
+from src.services.timeseries import get_timeseries
+from src.services import analytics
+from src.services.heatmap import get_heatmap, heatmap_response, parse_zoom
+from src.services.analytics_snapshot import read_manifest, snapshot_age, start_snapshot_in_background
+from src.services.commission_settings import (
+    SettingsConflictError, compute_commission, get_commission_settings as load_commission_settings,
+    save_commission_settings
+)
+from src.utils.replicas import read_replica
 
 admin_bp = Blueprint('admin', __name__)
 
-# Configurações padrão do sistema
-DEFAULT_COMMISSION_RATE = 15.0  # 15%
-MIN_COMMISSION = 5.00
-MAX_COMMISSION = 100.00
-AUTO_TRANSFER_DELAY = 24  # horas
+# Configurações de comissão/repasse ficam em commission_settings (src/services/commission_settings.py)
+LEDGER_ACCOUNT_TYPES = ('company', 'driver', 'platform', 'bank')
+
+# Estatísticas do dashboard ficam em cache por alguns segundos (uma consulta por TTL, não por aba)
+DASHBOARD_STATS_TTL = 30  # segundos
+dashboard_cache = TTLCache(ttl=DASHBOARD_STATS_TTL, max_size=16)
+
+def compute_dashboard_stats():
+    """Estatísticas do dashboard em duas consultas agregadas"""
+    active_statuses = ['disponivel', 'aceito', 'em_andamento']
+    
+    # Contagens: serviços por status com CASE + subconsultas escalares
+    (total_companies, total_drivers, total_services,
+     active_services, completed_services) = db.session.query(
+        select(func.count(Company.id)).scalar_subquery(),
+        select(func.count(Driver.id)).scalar_subquery(),
+        func.count(Service.id),
+        func.coalesce(func.sum(case((Service.status.in_(active_statuses), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Service.status == 'concluido', 1), else_=0)), 0)
+    ).select_from(Service).one()
+    
+    # Valores: receita total, comissões do mês atual e transferências pendentes
+    current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    total_revenue, monthly_commission, pending_transfers = db.session.query(
+        select(money_sum(Payment.valor_total))
+            .where(Payment.status_pagamento == 'aprovado')
+            .scalar_subquery(),
+        select(money_sum(Commission.valor_comissao))
+            .where(Commission.data_comissao >= current_month, Commission.status == 'processada')
+            .scalar_subquery(),
+        select(money_sum(DriverEarning.valor_liquido))
+            .where(DriverEarning.status_repasse == 'pendente')
+            .scalar_subquery()
+    ).one()
+    
+    return {
+        'total_companies': total_companies,
+        'total_drivers': total_drivers,
+        'total_services': total_services,
+        'total_revenue': total_revenue,
+        'monthly_commission': monthly_commission,
+        'pending_transfers': pending_transfers,
+        'active_services': int(active_services),
+        'completed_services': int(completed_services)
+    }
 
 @admin_bp.route('/admin/dashboard/stats', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_admin_dashboard_stats():
     """Obter estatísticas para o dashboard do admin"""
     try:
@@ -26,45 +95,9 @@ def get_admin_dashboard_stats():
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Estatísticas básicas
-        total_companies = Company.query.count()
-        total_drivers = Driver.query.count()
-        total_services = Service.query.count()
-        
-        # Receita total
-        total_payments = Payment.query.filter_by(status_pagamento='aprovado').all()
-        total_revenue = sum(payment.valor_total for payment in total_payments)
-        
-        # Comissões do mês atual
-        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_commissions = Commission.query.filter(
-            Commission.data_comissao >= current_month,
-            Commission.status == 'processada'
-        ).all()
-        monthly_commission = sum(commission.valor_comissao for commission in monthly_commissions)
-        
-        # Transferências pendentes
-        pending_earnings = DriverEarning.query.filter_by(status_repasse='pendente').all()
-        pending_transfers = sum(earning.valor_liquido for earning in pending_earnings)
-        
-        # Serviços ativos e concluídos
-        active_services = Service.query.filter(
-            Service.status.in_(['disponivel', 'aceito', 'em_andamento'])
-        ).count()
-        completed_services = Service.query.filter_by(status='concluido').count()
+        stats = dashboard_cache.get_or_set('stats', compute_dashboard_stats)
         
-        return jsonify({
-            'stats': {
-                'total_companies': total_companies,
-                'total_drivers': total_drivers,
-                'total_services': total_services,
-                'total_revenue': total_revenue,
-                'monthly_commission': monthly_commission,
-                'pending_transfers': pending_transfers,
-                'active_services': active_services,
-                'completed_services': completed_services
-            }
-        }), 200
+        return jsonify({'stats': stats}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -78,15 +111,7 @@ def get_commission_settings():
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Por enquanto, retornar configurações padrão
-        # Em uma implementação real, isso viria de uma tabela de configurações
-        settings = {
-            'platform_commission': DEFAULT_COMMISSION_RATE,
-            'min_commission': MIN_COMMISSION,
-            'max_commission': MAX_COMMISSION,
-            'auto_transfer': True,
-            'transfer_delay': AUTO_TRANSFER_DELAY
-        }
+        settings = load_commission_settings()
         
         return jsonify({'settings': settings}), 200
         
@@ -102,38 +127,46 @@ def update_commission_settings():
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        data = request.get_json()
+        data = request.get_json() or {}
+        current = load_commission_settings()
         
         # Validar dados
-        platform_commission = float(data.get('platform_commission', DEFAULT_COMMISSION_RATE))
+        platform_commission = float(data.get('platform_commission', current['platform_commission']))
         if platform_commission < 0 or platform_commission > 50:
             return jsonify({'error': 'Percentual de comissão deve estar entre 0% e 50%'}), 400
         
-        min_commission = float(data.get('min_commission', MIN_COMMISSION))
-        max_commission = float(data.get('max_commission', MAX_COMMISSION))
+        min_commission = float(data.get('min_commission', current['min_commission']))
+        max_commission = float(data.get('max_commission', current['max_commission']))
         
         if min_commission > max_commission:
             return jsonify({'error': 'Comissão mínima não pode ser maior que a máxima'}), 400
         
-        # Em uma implementação real, salvar em tabela de configurações
-        # Por enquanto, apenas retornar sucesso
+        transfer_delay = int(data.get('transfer_delay', current['transfer_delay']))
+        if transfer_delay < 0:
+            return jsonify({'error': 'Prazo de transferência inválido'}), 400
+        
+        settings = save_commission_settings({
+            'platform_commission': platform_commission,
+            'min_commission': min_commission,
+            'max_commission': max_commission,
+            'auto_transfer': bool(data.get('auto_transfer', current['auto_transfer'])),
+            'transfer_delay': transfer_delay
+        }, created_by=current_user.get('id'))
         
         return jsonify({
             'message': 'Configurações atualizadas com sucesso',
-            'settings': {
-                'platform_commission': platform_commission,
-                'min_commission': min_commission,
-                'max_commission': max_commission,
-                'auto_transfer': data.get('auto_transfer', True),
-                'transfer_delay': int(data.get('transfer_delay', AUTO_TRANSFER_DELAY))
-            }
+            'settings': settings
         }), 200
         
+    except SettingsConflictError as e:
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/transactions', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_admin_transactions():
     """Listar transações para o admin"""
     try:
@@ -141,38 +174,58 @@ def get_admin_transactions():
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        
-        # Buscar pagamentos com dados relacionados
-        payments = Payment.query.join(Service).join(Company).join(Driver)\
-            .order_by(Payment.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        cursor = request.args.get('cursor', type=int)
+        limit = min(request.args.get('limit', request.args.get('per_page', 20, type=int), type=int), 100)
+        
+        # Apenas as colunas exibidas, em uma única consulta
+        query = db.session.query(
+            Payment.id,
+            Company.nome.label('company_name'),
+            Driver.nome.label('driver_name'),
+            Service.titulo.label('service_title'),
+            Payment.valor_total,
+            Payment.valor_comissao,
+            Payment.valor_motorista,
+            Payment.status_pagamento,
+            Payment.metodo_pagamento,
+            Payment.created_at
+        ).join(Service, Service.id == Payment.service_id)\
+         .join(Company, Company.id == Payment.company_id)\
+         .join(Driver, Driver.id == Payment.driver_id)
+        
+        # Filtros opcionais (cada um tem índice composto com id)
+        if request.args.get('status'):
+            query = query.filter(Payment.status_pagamento == request.args['status'])
+        if request.args.get('method'):
+            query = query.filter(Payment.metodo_pagamento == request.args['method'])
+        if request.args.get('company_id'):
+            query = query.filter(Payment.company_id == request.args.get('company_id', type=int))
+        if request.args.get('driver_id'):
+            query = query.filter(Payment.driver_id == request.args.get('driver_id', type=int))
+        if cursor:
+            query = query.filter(Payment.id < cursor)
+        
+        rows = query.order_by(Payment.id.desc()).limit(limit + 1).all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
         
         transactions = []
-        for payment in payments.items:
-            service = Service.query.get(payment.service_id)
-            company = Company.query.get(payment.company_id)
-            driver = Driver.query.get(payment.driver_id)
-            
+        for row in rows[:limit]:
             transactions.append({
-                'id': payment.id,
-                'company_name': company.nome if company else 'N/A',
-                'driver_name': driver.nome if driver else 'N/A',
-                'service_title': service.titulo if service else 'N/A',
-                'service_value': payment.valor_total,
-                'commission': payment.valor_comissao,
-                'driver_payment': payment.valor_motorista,
-                'status': payment.status_pagamento,
-                'payment_method': payment.metodo_pagamento,
-                'created_at': payment.created_at.isoformat() if payment.created_at else None
+                'id': row.id,
+                'company_name': row.company_name,
+                'driver_name': row.driver_name,
+                'service_title': row.service_title,
+                'service_value': row.valor_total,
+                'commission': row.valor_comissao,
+                'driver_payment': row.valor_motorista,
+                'status': row.status_pagamento,
+                'payment_method': row.metodo_pagamento,
+                'created_at': row.created_at.isoformat() if row.created_at else None
             })
         
         return jsonify({
             'transactions': transactions,
-            'total': payments.total,
-            'pages': payments.pages,
-            'current_page': page
+            'next_cursor': next_cursor
         }), 200
         
     except Exception as e:
@@ -181,45 +234,303 @@ def get_admin_transactions():
 @admin_bp.route('/admin/process-transfers', methods=['POST'])
 @jwt_required()
 def process_pending_transfers():
-    """Processar transferências pendentes para motoristas"""
+    """Processar transferências pendentes para motoristas (job em segundo plano)"""
     try:
         current_user = get_jwt_identity()
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Buscar ganhos pendentes que estão prontos para repasse
-        cutoff_time = datetime.utcnow() - timedelta(hours=AUTO_TRANSFER_DELAY)
+        data = request.get_json(silent=True) or {}
         
-        pending_earnings = DriverEarning.query.filter(
-            DriverEarning.status_repasse == 'pendente',
-            DriverEarning.data_ganho <= cutoff_time
-        ).all()
+        # Job interrompido (corte antigo) só é retomado explicitamente
+        try:
+            job = get_or_create_payout_job(
+                load_commission_settings()['transfer_delay'],
+                chunk_size=int(data.get('chunk_size', DEFAULT_CHUNK_SIZE))
+            )
+        except JobConflictError as e:
+            return jsonify({
+                'message': 'Já existe um processamento de transferências em andamento' if e.running
+                           else 'Há um processamento de transferências interrompido; retome-o antes de iniciar outro',
+                'job': e.job.to_dict(),
+                'resume_url': None if e.running else f'/api/admin/admin/process-transfers/{e.job.id}/resume'
+            }), 409
         
-        processed_count = 0
-        total_amount = 0
+        start_payout_job_in_background(job.id)
         
-        for earning in pending_earnings:
-            # Simular processamento de transferência
-            earning.status_repasse = 'pago'
-            earning.data_repasse = datetime.utcnow()
-            
-            processed_count += 1
-            total_amount += earning.valor_liquido
+        return jsonify({
+            'message': 'Processamento de transferências iniciado',
+            'job': job.to_dict(),
+            'status_url': f'/api/admin/admin/process-transfers/{job.id}'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/process-transfers/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_transfer_job_status(job_id):
+    """Progresso de um processamento de transferências"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        job = PayoutJob.query.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        job_data = job.to_dict()
+        if job.status != 'concluido':
+            remaining_count, remaining_amount = remaining_earnings(job)
+            job_data['remaining_count'] = remaining_count
+            job_data['remaining_amount'] = remaining_amount
+            job_data['running'] = is_job_running(job)
+        
+        return jsonify({'job': job_data}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/process-transfers/<int:job_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_transfer_job(job_id):
+    """Retomar um processamento de transferências interrompido ou com erro"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        job = PayoutJob.query.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        if job.status == 'concluido':
+            return jsonify({'error': 'Job já concluído'}), 400
+        if is_job_running(job):
+            return jsonify({'message': 'Job já está em andamento', 'job': job.to_dict()}), 409
+        
+        start_payout_job_in_background(job.id)
+        
+        return jsonify({
+            'message': 'Processamento de transferências retomado',
+            'job': job.to_dict(),
+            'status_url': f'/api/admin/admin/process-transfers/{job.id}'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/reconciliation', methods=['POST'])
+@jwt_required()
+def start_reconciliation():
+    """Iniciar a conciliação financeira de um período (job em segundo plano)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
         
-        db.session.commit()
+        data = request.get_json(silent=True) or {}
+        
+        start_date, end_date = default_period()
+        if data.get('start_date'):
+            start_date = datetime.fromisoformat(data['start_date'])
+        if data.get('end_date'):
+            end_date = datetime.fromisoformat(data['end_date'])
+        if start_date >= end_date:
+            return jsonify({'error': 'Período inválido'}), 400
+        
+        # Execução interrompida do mesmo período é retomada; de outro período, conflito
+        try:
+            run = get_or_create_run(start_date, end_date, int(data.get('chunk_hours', DEFAULT_CHUNK_HOURS)))
+        except JobConflictError as e:
+            return jsonify({
+                'message': 'Já existe uma conciliação em andamento' if e.running
+                           else 'Há uma conciliação interrompida de outro período; retome-a antes de iniciar outra',
+                'run': e.job.to_dict(),
+                'resume_url': None if e.running else f'/api/admin/admin/reconciliation/{e.job.id}/resume'
+            }), 409
+        
+        start_reconciliation_in_background(run.id)
         
         return jsonify({
-            'message': f'{processed_count} transferências processadas com sucesso',
-            'processed_count': processed_count,
-            'total_amount': total_amount
+            'message': 'Conciliação iniciada',
+            'run': run.to_dict(),
+            'status_url': f'/api/admin/admin/reconciliation/{run.id}'
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/reconciliation/<int:run_id>', methods=['GET'])
+@jwt_required()
+def get_reconciliation(run_id):
+    """Progresso e divergências de uma conciliação (divergências paginadas por cursor)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        run = ReconciliationRun.query.get(run_id)
+        if not run:
+            return jsonify({'error': 'Conciliação não encontrada'}), 404
+        
+        mismatch_type = request.args.get('type')
+        cursor = request.args.get('cursor', type=int)
+        limit = min(request.args.get('limit', 100, type=int), 500)
+        
+        query = ReconciliationMismatch.query.filter_by(run_id=run_id)
+        if mismatch_type:
+            query = query.filter_by(mismatch_type=mismatch_type)
+        if cursor:
+            query = query.filter(ReconciliationMismatch.id > cursor)
+        mismatches = query.order_by(ReconciliationMismatch.id).limit(limit + 1).all()
+        
+        run_data = run.to_dict()
+        run_data['running'] = is_job_running(run)
+        
+        return jsonify({
+            'run': run_data,
+            'summary': mismatch_summary(run_id),
+            'mismatches': [mismatch.to_dict() for mismatch in mismatches[:limit]],
+            'next_cursor': mismatches[limit - 1].id if len(mismatches) > limit else None
         }), 200
         
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/reconciliation/<int:run_id>/resume', methods=['POST'])
+@jwt_required()
+def resume_reconciliation(run_id):
+    """Retomar uma conciliação interrompida ou com erro"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        run = ReconciliationRun.query.get(run_id)
+        if not run:
+            return jsonify({'error': 'Conciliação não encontrada'}), 404
+        if run.status == 'concluido':
+            return jsonify({'error': 'Conciliação já concluída'}), 400
+        if is_job_running(run):
+            return jsonify({'message': 'Conciliação já está em andamento', 'run': run.to_dict()}), 409
+        
+        start_reconciliation_in_background(run.id)
+        
+        return jsonify({
+            'message': 'Conciliação retomada',
+            'run': run.to_dict(),
+            'status_url': f'/api/admin/admin/reconciliation/{run.id}'
+        }), 202
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/admin/payouts/export', methods=['GET'])
+@jwt_required()
+def export_payouts():
+    """Arquivo de remessa dos repasses (CSV ou CNAB), gerado em streaming"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': 'Formato inválido (use csv ou cnab)'}), 400
+        
+        status = request.args.get('status', 'pendente')
+        if status not in ('pendente', 'pago'):
+            return jsonify({'error': 'Status inválido'}), 400
+        
+        # Por padrão, apenas ganhos que já passaram do prazo de transferência
+        cutoff = request.args.get('cutoff')
+        if cutoff:
+            cutoff = datetime.fromisoformat(cutoff)
+        elif status == 'pendente':
+            cutoff = datetime.utcnow() - timedelta(hours=load_commission_settings()['transfer_delay'])
+        
+        # A remessa não é gerada com dados bancários inválidos (o banco rejeitaria ou pagaria errado)
+        if export_format == 'cnab':
+            invalid_count, invalid = invalid_cnab_rows(iter_earnings(status=status, cutoff=cutoff))
+            if invalid_count:
+                return jsonify({
+                    'error': 'Há ganhos com dados bancários inválidos para a remessa',
+                    'invalid_count': invalid_count,
+                    'invalid_earnings': invalid
+                }), 400
+        
+        generator, mimetype, extension = EXPORT_FORMATS[export_format]
+        filename = f"repasses_{status}_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{extension}"
+        
+        return Response(
+            stream_with_context(generator(iter_earnings(status=status, cutoff=cutoff))),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/ledger/<account_type>/<int:account_id>/balance', methods=['GET'])
+@jwt_required()
+def get_account_balance(account_type, account_id):
+    """Saldo materializado de uma conta do livro razão"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if account_type not in LEDGER_ACCOUNT_TYPES:
+            return jsonify({'error': 'Tipo de conta inválido'}), 400
+        
+        return jsonify({'balance': get_balance(account_type, account_id).to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/ledger/<account_type>/<int:account_id>/statement', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_account_statement(account_type, account_id):
+    """Extrato de uma conta do livro razão (paginado por cursor)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if account_type not in LEDGER_ACCOUNT_TYPES:
+            return jsonify({'error': 'Tipo de conta inválido'}), 400
+        
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        cursor = request.args.get('cursor', type=int)
+        limit = min(request.args.get('limit', 50, type=int), 200)
+        
+        entries, next_cursor = get_statement(
+            account_type, account_id,
+            start_date=datetime.fromisoformat(start_date) if start_date else None,
+            end_date=datetime.fromisoformat(end_date) if end_date else None,
+            cursor=cursor,
+            limit=limit
+        )
+        
+        return jsonify({
+            'balance': get_balance(account_type, account_id).to_dict(),
+            'entries': [entry.to_dict() for entry in entries],
+            'next_cursor': next_cursor
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/admin/top-companies', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_top_companies():
     """Obter ranking de empresas"""
     try:
@@ -227,34 +538,27 @@ def get_top_companies():
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Buscar empresas com mais serviços
-        companies = db.session.query(
-            Company.id,
-            Company.nome,
-            func.count(Service.id).label('service_count'),
-            func.sum(Service.valor_base).label('total_revenue')
-        ).join(Service)\
-         .group_by(Company.id, Company.nome)\
-         .order_by(func.count(Service.id).desc())\
-         .limit(10)\
-         .all()
-        
-        top_companies = []
-        for company in companies:
-            top_companies.append({
-                'id': company.id,
-                'name': company.nome,
-                'services': company.service_count,
-                'revenue': float(company.total_revenue or 0)
-            })
+        window = request.args.get('window', DEFAULT_WINDOW)
+        limit = request.args.get('limit', 10, type=int)
+        
+        try:
+            if request.args.get('source') == 'snapshot':
+                top_companies = analytics.top_companies(window_start(window), clamp_limit(limit))
+            else:
+                top_companies = get_leaderboard('companies', window, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except analytics.SnapshotUnavailableError as e:
+            return jsonify({'error': str(e)}), 503
         
-        return jsonify({'top_companies': top_companies}), 200
+        return jsonify({'window': window, 'top_companies': top_companies}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/admin/top-drivers', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_top_drivers():
     """Obter ranking de motoristas"""
     try:
@@ -262,31 +566,20 @@ def get_top_drivers():
         if current_user.get('type') != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
         
-        # Buscar motoristas com mais viagens
-        drivers = db.session.query(
-            Driver.id,
-            Driver.nome,
-            Driver.avaliacao,
-            func.count(Trip.id).label('trip_count'),
-            func.sum(DriverEarning.valor_liquido).label('total_earnings')
-        ).join(Trip, Driver.id == Trip.driver_id)\
-         .join(DriverEarning, Driver.id == DriverEarning.driver_id)\
-         .group_by(Driver.id, Driver.nome, Driver.avaliacao)\
-         .order_by(func.count(Trip.id).desc())\
-         .limit(10)\
-         .all()
-        
-        top_drivers = []
-        for driver in drivers:
-            top_drivers.append({
-                'id': driver.id,
-                'name': driver.nome,
-                'trips': driver.trip_count,
-                'earnings': float(driver.total_earnings or 0),
-                'rating': float(driver.avaliacao or 0)
-            })
+        window = request.args.get('window', DEFAULT_WINDOW)
+        limit = request.args.get('limit', 10, type=int)
+        
+        try:
+            if request.args.get('source') == 'snapshot':
+                top_drivers = analytics.top_drivers(window_start(window), clamp_limit(limit))
+            else:
+                top_drivers = get_leaderboard('drivers', window, limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except analytics.SnapshotUnavailableError as e:
+            return jsonify({'error': str(e)}), 503
         
-        return jsonify({'top_drivers': top_drivers}), 200
+        return jsonify({'window': window, 'top_drivers': top_drivers}), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -306,18 +599,13 @@ def calculate_commission():
         if service_value <= 0:
             return jsonify({'error': 'Valor do serviço deve ser maior que zero'}), 400
         
-        # Calcular comissão
-        commission_rate = DEFAULT_COMMISSION_RATE / 100
-        commission_amount = service_value * commission_rate
-        
-        # Aplicar limites mínimo e máximo
-        commission_amount = max(MIN_COMMISSION, min(commission_amount, MAX_COMMISSION))
-        
-        driver_payment = service_value - commission_amount
+        # Calcular comissão (limites mínimo e máximo aplicados)
+        settings = load_commission_settings()
+        commission_rate, commission_amount, driver_payment = compute_commission(service_value, settings=settings, apply_limits=True)
         
         return jsonify({
             'service_value': service_value,
-            'commission_rate': DEFAULT_COMMISSION_RATE,
+            'commission_rate': settings['platform_commission'],
             'commission_amount': commission_amount,
             'driver_payment': driver_payment
         }), 200
@@ -325,8 +613,123 @@ def calculate_commission():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/admin/reports/daily', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_daily_report():
+    """Relatório diário da plataforma (tabelas consolidadas)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        try:
+            start_day, end_day = parse_day_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Período inválido'}), 400
+        
+        stats = range_stats(DailyPlatformStats, start_day, end_day)
+        
+        return jsonify({
+            'period': {'start_date': start_day.isoformat(), 'end_date': end_day.isoformat()},
+            'totals': stats['totals'],
+            'series': stats['series']
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/reports/timeseries', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_timeseries_report():
+    """Série temporal de receita, comissão e serviços pagos (hour, day, week ou month)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        bucket = request.args.get('bucket', 'day')
+        
+        try:
+            end_date = datetime.fromisoformat(request.args['end_date']) if request.args.get('end_date') else datetime.utcnow()
+            start_date = datetime.fromisoformat(request.args['start_date']) if request.args.get('start_date') \
+                else end_date - timedelta(days=30)
+            if request.args.get('source') == 'snapshot':
+                timeseries = analytics.timeseries(start_date, end_date, bucket)
+            else:
+                timeseries = get_timeseries(start_date, end_date, bucket)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except analytics.SnapshotUnavailableError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify({
+            'period': {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+            **timeseries
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/heatmap', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_demand_heatmap():
+    """Mapa de calor da demanda (origem dos serviços) por célula da grade"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        window = request.args.get('window', DEFAULT_WINDOW)
+        company_id = request.args.get('company_id', type=int)
+        
+        try:
+            zoom = parse_zoom(request.args.get('zoom'))
+            if request.args.get('source') == 'snapshot':
+                cells = analytics.demand_heatmap(zoom, window_start(window), company_id)
+                heatmap = heatmap_response(window, zoom, cells)
+            else:
+                heatmap = get_heatmap(window, zoom, company_id)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except analytics.SnapshotUnavailableError as e:
+            return jsonify({'error': str(e)}), 503
+        
+        return jsonify(heatmap), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/admin/analytics/snapshot', methods=['GET', 'POST'])
+@jwt_required()
+def analytics_snapshot():
+    """Estado do snapshot analítico (GET) ou gerar um novo em segundo plano (POST)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user.get('type') != 'admin':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if not parquet_available():
+            return jsonify({'error': 'Snapshot analítico indisponível neste servidor'}), 503
+        
+        if request.method == 'POST':
+            start_snapshot_in_background()
+            return jsonify({'message': 'Snapshot analítico iniciado'}), 202
+        
+        manifest = read_manifest()
+        if manifest is None:
+            return jsonify({'snapshot': None}), 200
+        
+        return jsonify({'snapshot': dict(manifest, age_seconds=int(snapshot_age()))}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/admin/reports/financial', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_financial_report():
     """Gerar relatório financeiro"""
     try:
@@ -348,18 +751,38 @@ def get_financial_report():
         else:
             end_date = datetime.now()
         
+        # Exportação em streaming (CSV ou Parquet), opcionalmente agrupada no banco
+        export_format = request.args.get('format')
+        if export_format:
+            group_by = request.args.get('group_by') or None
+            if export_format not in REPORT_FORMATS:
+                return jsonify({'error': f'Formato inválido. Use: {", ".join(REPORT_FORMATS)}'}), 400
+            if group_by and group_by not in GROUP_BY_OPTIONS:
+                return jsonify({'error': f'Agrupamento inválido. Use: {", ".join(GROUP_BY_OPTIONS)}'}), 400
+            if export_format == 'parquet' and not parquet_available():
+                return jsonify({'error': 'Exportação Parquet indisponível neste servidor'}), 400
+            
+            content, mimetype, extension = export_financial_report(start_date, end_date, export_format, group_by)
+            filename = f"relatorio_financeiro_{start_date:%Y%m%d}_{end_date:%Y%m%d}"
+            if group_by:
+                filename += f"_{group_by}"
+            return Response(
+                stream_with_context(content),
+                mimetype=mimetype,
+                headers={'Content-Disposition': f'attachment; filename={filename}.{extension}'}
+            )
+        
         # Buscar dados do período
-        payments = Payment.query.filter(
+        total_revenue, total_commission, total_driver_payments, services_count = db.session.query(
+            money_sum(Payment.valor_total),
+            money_sum(Payment.valor_comissao),
+            money_sum(Payment.valor_motorista),
+            func.count(func.distinct(Payment.service_id))
+        ).filter(
             Payment.data_pagamento >= start_date,
             Payment.data_pagamento <= end_date,
             Payment.status_pagamento == 'aprovado'
-        ).all()
-        
-        total_revenue = sum(payment.valor_total for payment in payments)
-        total_commission = sum(payment.valor_comissao for payment in payments)
-        total_driver_payments = sum(payment.valor_motorista for payment in payments)
-        
-        services_count = len(set(payment.service_id for payment in payments))
+        ).one()
         
         return jsonify({
             'period': {
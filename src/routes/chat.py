@@ -1,17 +1,143 @@
+import re
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_socketio import emit, join_room, leave_room
 from datetime import datetime
+from sqlalchemy.dialects.mysql import match as mysql_match
 from src.models.user import db
 from src.models.chat import ChatMessage, ChatRoom
 from src.models.service import Service
 from src.models.company import Company
 from src.models.driver import Driver
+from src.utils.cache import TTLCache
+from src.utils.typing_indicator import TypingTracker
+from src.utils.read_receipts import ReadReceiptCoalescer
+from src.utils.presence import create_presence_registry, presence_key
+from src.services.chat_archive import (
+    DEFAULT_ARCHIVE_AFTER_DAYS, archive_chat_messages, count_archived_messages, read_archived_messages
+)
+from src.utils.replicas import read_replica
 
 chat_bp = Blueprint('chat', __name__)
 
+# Nomes padrão quando o participante não é encontrado
+DEFAULT_PARTICIPANT_NAMES = {'company': 'Empresa', 'driver': 'Motorista'}
+
+# Tipos de usuário aceitos no registro de presença
+PRESENCE_USER_TYPES = ('company', 'driver', 'admin')
+
+# Estado de "digitando" por sala e usuário
+typing_tracker = TypingTracker(interval=1.0, timeout=5.0)
+
+# Confirmações de leitura agrupadas antes do envio
+read_receipts = ReadReceiptCoalescer(interval=1.0)
+
+# Registro de presença (conexões ativas por usuário)
+presence = create_presence_registry(ttl=60)
+
+# Cache de nomes de exibição dos participantes, chave (tipo, id)
+participant_name_cache = TTLCache(ttl=300, max_size=10000)
+
+def resolve_participant_names(rooms):
+    """Resolver nomes dos participantes das salas com uma consulta IN por tipo"""
+    keys = set()
+    for room in rooms:
+        keys.add((room.participant1_type, room.participant1_id))
+        keys.add((room.participant2_type, room.participant2_id))
+    
+    names = participant_name_cache.get_many(keys)
+    
+    missing = {}
+    for user_type, user_id in keys - set(names):
+        missing.setdefault(user_type, set()).add(user_id)
+    
+    loaded = {}
+    for user_type, model in (('company', Company), ('driver', Driver)):
+        ids = missing.get(user_type)
+        if not ids:
+            continue
+        rows = db.session.query(model.id, model.nome).filter(model.id.in_(ids)).all()
+        for row in rows:
+            loaded[(user_type, row.id)] = row.nome
+    
+    participant_name_cache.set_many(loaded)
+    names.update(loaded)
+    return names
+
+def resolve_service_summaries(rooms):
+    """Resumo dos serviços vinculados às salas com uma única consulta IN"""
+    service_ids = {room.service_id for room in rooms if room.service_id}
+    if not service_ids:
+        return {}
+    
+    rows = db.session.query(
+        Service.id,
+        Service.titulo,
+        Service.status,
+        Service.origem_endereco,
+        Service.destino_endereco
+    ).filter(Service.id.in_(service_ids)).all()
+    
+    return {
+        row.id: {
+            'id': row.id,
+            'titulo': row.titulo,
+            'status': row.status,
+            'origem_endereco': row.origem_endereco,
+            'destino_endereco': row.destino_endereco
+        }
+        for row in rows
+    }
+
+def emit_presence_change(socketio, user_key, online):
+    """Avisar quem acompanha o usuário (salas em comum) sobre a mudança de presença"""
+    user_type, user_id = user_key.split(':', 1)
+    socketio.emit('presence_update', {
+        'user_type': user_type,
+        'user_id': int(user_id),
+        'online': online
+    }, room=f"presence_{user_key}")
+
+# Servidor SocketIO registrado, usado para avisos fora de um evento de socket
+socketio_server = None
+
+SUPPORT_QUEUE_ROOM = 'support_queue'
+
+def support_queue_entry(chat_room):
+    """Resumo de uma sala para a fila de suporte"""
+    return {
+        'chat_room_id': chat_room.id,
+        'awaiting_admin_reply': chat_room.awaiting_admin_reply,
+        'awaiting_since': chat_room.awaiting_since.isoformat() if chat_room.awaiting_since else None,
+        'unread_count': chat_room.admin_unread_count(),
+        'last_message_at': chat_room.last_message_at.isoformat() if chat_room.last_message_at else None,
+        'last_message_preview': chat_room.last_message_preview
+    }
+
+def push_support_queue_update(chat_room):
+    """Avisar os admins conectados sobre a mudança de uma sala de suporte"""
+    if socketio_server is None or not chat_room.is_support_room:
+        return
+    socketio_server.emit('support_queue_update', support_queue_entry(chat_room), room=SUPPORT_QUEUE_ROOM)
+
+def mark_room_as_read(chat_room, user_type, user_id, last_seen_id=None):
+    """Marcar mensagens como lidas e agendar a confirmação de leitura (só participantes)"""
+    if chat_room.participant_slot(user_type, user_id) is None:
+        return 0
+    
+    updated, last_read_id = chat_room.mark_messages_as_read(user_id, user_type, last_seen_id)
+    db.session.commit()
+    
+    if updated:
+        read_receipts.add(chat_room.id, user_type, user_id, last_read_id)
+        if user_type == 'admin':
+            push_support_queue_update(chat_room)
+    return updated
+
 # Eventos do SocketIO para chat universal em tempo real
 def register_socketio_events(socketio):
+    global socketio_server
+    socketio_server = socketio
     
     @socketio.on('join_chat')
     def on_join_chat(data):
@@ -42,19 +168,64 @@ def register_socketio_events(socketio):
             room_name = f"chat_{chat_room_id}"
             join_room(room_name)
             
+            # Acompanhar a presença dos participantes da sala
+            participant_keys = [
+                presence_key(chat_room.participant1_type, chat_room.participant1_id),
+                presence_key(chat_room.participant2_type, chat_room.participant2_id)
+            ]
+            for participant_key in participant_keys:
+                join_room(f"presence_{participant_key}")
+            
             # Marcar mensagens como lidas
-            chat_room.mark_messages_as_read(user_id)
-            db.session.commit()
+            mark_room_as_read(chat_room, user_type, user_id)
             
             emit('joined_chat', {
                 'room': room_name,
                 'chat_room_id': chat_room_id,
-                'chat_room': chat_room.to_dict()
+                'chat_room': chat_room.to_dict(),
+                'presence': presence.lookup(participant_keys)
             })
             
         except Exception as e:
             emit('error', {'message': str(e)})
     
+    @socketio.on('presence_online')
+    def on_presence_online(data):
+        """Registrar a conexão (aba/dispositivo) do usuário no registro de presença"""
+        try:
+            user_type = data['user_type']
+            if user_type not in PRESENCE_USER_TYPES:
+                emit('error', {'message': 'Tipo de usuário inválido'})
+                return
+            try:
+                user_id = int(data['user_id'])
+            except (TypeError, ValueError):
+                emit('error', {'message': 'ID de usuário inválido'})
+                return
+            
+            online_key, offline_key = presence.connect(user_type, user_id, request.sid)
+            if offline_key:
+                emit_presence_change(socketio, offline_key, False)
+            if online_key:
+                emit_presence_change(socketio, online_key, True)
+        except Exception as e:
+            emit('error', {'message': str(e)})
+    
+    @socketio.on('heartbeat')
+    def on_heartbeat(data=None):
+        """Renovar a presença da conexão"""
+        presence.heartbeat(request.sid)
+    
+    @socketio.on('join_support_queue')
+    def on_join_support_queue(data):
+        """Admin passa a receber as mudanças da fila de suporte"""
+        if data.get('user_type') != 'admin':
+            emit('error', {'message': 'Acesso negado à fila de suporte'})
+            return
+        
+        join_room(SUPPORT_QUEUE_ROOM)
+        emit('joined_support_queue', {'room': SUPPORT_QUEUE_ROOM})
+    
     @socketio.on('leave_chat')
     def on_leave_chat(data):
         """Sair de uma sala de chat"""
@@ -111,7 +282,7 @@ def register_socketio_events(socketio):
             db.session.add(chat_message)
             
             # Atualizar sala de chat
-            chat_room.update_last_message(message, sender_id)
+            chat_room.update_last_message(message, sender_id, sender_type)
             
             db.session.commit()
             
@@ -122,28 +293,113 @@ def register_socketio_events(socketio):
                 'chat_room_id': chat_room_id
             }, room=room_name)
             
+            push_support_queue_update(chat_room)
+            
+        except Exception as e:
+            db.session.rollback()
+            emit('error', {'message': str(e)})
+    
+    @socketio.on('mark_read')
+    def on_mark_read(data):
+        """Confirmar leitura das mensagens até last_seen_id"""
+        try:
+            chat_room_id = data['chat_room_id']
+            user_type = data['user_type']
+            user_id = data['user_id']
+            
+            chat_room = ChatRoom.query.get(chat_room_id)
+            if not chat_room:
+                emit('error', {'message': 'Sala de chat não encontrada'})
+                return
+            
+            if chat_room.participant_slot(user_type, user_id) is None and user_type != 'admin':
+                emit('error', {'message': 'Acesso negado a esta sala de chat'})
+                return
+            
+            mark_room_as_read(chat_room, user_type, user_id, data.get('last_seen_id'))
+            
         except Exception as e:
             db.session.rollback()
             emit('error', {'message': str(e)})
     
     @socketio.on('typing')
     def on_typing(data):
-        """Indicar que usuário está digitando"""
+        """Indicar que usuário está digitando (eventos coalescidos no servidor)"""
         try:
             chat_room_id = data['chat_room_id']
             sender_type = data['sender_type']
             sender_id = data['sender_id']
             is_typing = data.get('is_typing', True)
             
+            # Apenas mudanças de estado são repassadas para a sala
+            payload = typing_tracker.update(
+                chat_room_id, sender_type, sender_id, is_typing, sid=request.sid
+            )
+            if payload is None:
+                return
+            
             room_name = f"chat_{chat_room_id}"
-            emit('user_typing', {
-                'sender_type': sender_type,
-                'sender_id': sender_id,
-                'is_typing': is_typing
-            }, room=room_name, include_self=False)
+            emit('user_typing', payload, room=room_name, include_self=False)
             
         except Exception as e:
             emit('error', {'message': str(e)})
+    
+    @socketio.on('disconnect')
+    def on_disconnect():
+        """Encerrar indicadores de digitação e a presença do socket desconectado"""
+        for payload, sid in typing_tracker.forget(request.sid):
+            socketio.emit('user_typing', payload, room=f"chat_{payload['chat_room_id']}", skip_sid=sid)
+        
+        user_key = presence.disconnect(request.sid)
+        if user_key:
+            emit_presence_change(socketio, user_key, False)
+    
+    def typing_sweeper():
+        """Expirar indicadores inativos e enviar mudanças que aguardavam o intervalo"""
+        while True:
+            socketio.sleep(typing_tracker.interval)
+            try:
+                for payload, sid in typing_tracker.sweep():
+                    socketio.emit('user_typing', payload, room=f"chat_{payload['chat_room_id']}", skip_sid=sid)
+            except Exception as e:
+                print(f"❌ Erro na varredura de digitação: {e}")
+    
+    def read_receipt_flusher():
+        """Enviar as confirmações de leitura agrupadas no intervalo"""
+        while True:
+            socketio.sleep(read_receipts.interval)
+            try:
+                for payload in read_receipts.drain():
+                    socketio.emit('messages_read', payload, room=f"chat_{payload['chat_room_id']}")
+            except Exception as e:
+                print(f"❌ Erro no envio das confirmações de leitura: {e}")
+    
+    def presence_sweeper():
+        """Expirar conexões sem heartbeat"""
+        while True:
+            socketio.sleep(presence.ttl / 3)
+            try:
+                for user_key in presence.expire():
+                    emit_presence_change(socketio, user_key, False)
+            except Exception as e:
+                print(f"❌ Erro na varredura de presença: {e}")
+    
+    socketio.start_background_task(typing_sweeper)
+    socketio.start_background_task(presence_sweeper)
+    socketio.start_background_task(read_receipt_flusher)
+
+@chat_bp.route('/chat/typing/stats', methods=['GET'])
+@jwt_required()
+def get_typing_stats():
+    """Contadores do coalescimento de indicadores de digitação (admin)"""
+    current_user = get_jwt_identity()
+    if current_user != 'admin@driverconnect.com':
+        return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+    
+    return jsonify({
+        'success': True,
+        'stats': typing_tracker.get_stats()
+    }), 200
 
 @chat_bp.route('/chat/create-room', methods=['POST'])
 @jwt_required()
@@ -180,37 +436,25 @@ def create_chat_room():
         participant_type = data['participant_type']
         service_id = data.get('service_id')  # Opcional
         
-        # Verificar se já existe uma sala entre esses usuários
-        existing_room = ChatRoom.query.filter(
-            ((ChatRoom.participant1_id == current_user_id and ChatRoom.participant1_type == current_user_type and
-              ChatRoom.participant2_id == participant_id and ChatRoom.participant2_type == participant_type) or
-             (ChatRoom.participant1_id == participant_id and ChatRoom.participant1_type == participant_type and
-              ChatRoom.participant2_id == current_user_id and ChatRoom.participant2_type == current_user_type))
-        ).first()
+        # Buscar a sala do par pelo índice único ou criar uma nova
+        chat_room, created = ChatRoom.get_or_create(
+            current_user_type, current_user_id,
+            participant_type, participant_id,
+            service_id=service_id
+        )
+        db.session.commit()
         
-        if existing_room:
+        if not created:
             return jsonify({
                 'success': True,
                 'message': 'Sala de chat já existe',
-                'chat_room': existing_room.to_dict()
+                'chat_room': chat_room.to_dict()
             }), 200
         
-        # Criar nova sala de chat
-        new_room = ChatRoom(
-            participant1_id=current_user_id,
-            participant1_type=current_user_type,
-            participant2_id=participant_id,
-            participant2_type=participant_type,
-            service_id=service_id
-        )
-        
-        db.session.add(new_room)
-        db.session.commit()
-        
         return jsonify({
             'success': True,
             'message': 'Sala de chat criada com sucesso',
-            'chat_room': new_room.to_dict()
+            'chat_room': chat_room.to_dict()
         }), 201
         
     except Exception as e:
@@ -241,65 +485,169 @@ def get_chat_rooms():
         else:
             return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
         
+        # Parâmetros de paginação
+        page = int(request.args.get('page', 1))
+        per_page = min(int(request.args.get('per_page', 20)), 100)
+        
         # Buscar salas onde o usuário é participante
-        if is_admin:
-            # Admin pode ver todas as salas
-            chat_rooms = ChatRoom.query.filter_by(is_active=True).all()
-        else:
-            chat_rooms = ChatRoom.query.filter(
-                ChatRoom.is_active == True,
-                ((ChatRoom.participant1_id == current_user_id and ChatRoom.participant1_type == current_user_type) or
-                 (ChatRoom.participant2_id == current_user_id and ChatRoom.participant2_type == current_user_type))
-            ).all()
+        query = ChatRoom.query.filter(ChatRoom.is_active == True)
+        if not is_admin:
+            # Admin pode ver todas as salas, demais usuários apenas as suas
+            query = query.filter(db.or_(
+                db.and_(ChatRoom.participant1_id == current_user_id,
+                        ChatRoom.participant1_type == current_user_type),
+                db.and_(ChatRoom.participant2_id == current_user_id,
+                        ChatRoom.participant2_type == current_user_type)
+            ))
+        
+        # Salas com atividade mais recente primeiro; em DESC os NULLs (salas sem
+        # mensagens) já ficam no final. As colunas puras deixam o índice
+        # (is_active, last_message_at) servir a ordenação: no InnoDB ele termina
+        # na chave primária, o que cobre o desempate por id
+        query = query.order_by(
+            ChatRoom.last_message_at.desc(),
+            ChatRoom.id.desc()
+        )
+        
+        chat_rooms = query.paginate(page=page, per_page=per_page, error_out=False)
+        
+        # Resolver nomes dos participantes e serviços com uma consulta por tipo
+        names = resolve_participant_names(chat_rooms.items)
+        services = resolve_service_summaries(chat_rooms.items)
+        online = presence.lookup(
+            [presence_key(room.participant1_type, room.participant1_id) for room in chat_rooms.items] +
+            [presence_key(room.participant2_type, room.participant2_id) for room in chat_rooms.items]
+        )
         
-        # Incluir dados dos participantes para cada sala
         rooms_data = []
-        for room in chat_rooms:
+        for room in chat_rooms.items:
             room_data = room.to_dict()
-            
-            # Adicionar informações dos participantes
-            if room.participant1_type == 'company':
-                p1 = Company.query.get(room.participant1_id)
-                room_data['participant1_name'] = p1.nome if p1 else 'Empresa'
-            elif room.participant1_type == 'driver':
-                p1 = Driver.query.get(room.participant1_id)
-                room_data['participant1_name'] = p1.nome if p1 else 'Motorista'
-            else:
-                room_data['participant1_name'] = 'Admin'
-            
-            if room.participant2_type == 'company':
-                p2 = Company.query.get(room.participant2_id)
-                room_data['participant2_name'] = p2.nome if p2 else 'Empresa'
-            elif room.participant2_type == 'driver':
-                p2 = Driver.query.get(room.participant2_id)
-                room_data['participant2_name'] = p2.nome if p2 else 'Motorista'
-            else:
-                room_data['participant2_name'] = 'Admin'
+            room_data['participant1_name'] = names.get(
+                (room.participant1_type, room.participant1_id),
+                DEFAULT_PARTICIPANT_NAMES.get(room.participant1_type, 'Admin')
+            )
+            room_data['participant2_name'] = names.get(
+                (room.participant2_type, room.participant2_id),
+                DEFAULT_PARTICIPANT_NAMES.get(room.participant2_type, 'Admin')
+            )
+            room_data['participant1_online'] = online[presence_key(room.participant1_type, room.participant1_id)]
+            room_data['participant2_online'] = online[presence_key(room.participant2_type, room.participant2_id)]
             
             # Adicionar dados do serviço se existir
-            if room.service_id:
-                service = Service.query.get(room.service_id)
-                if service:
-                    room_data['service'] = {
-                        'id': service.id,
-                        'titulo': service.titulo,
-                        'status': service.status,
-                        'origem_endereco': service.origem_endereco,
-                        'destino_endereco': service.destino_endereco
-                    }
+            if room.service_id in services:
+                room_data['service'] = services[room.service_id]
             
             rooms_data.append(room_data)
         
         return jsonify({
             'success': True,
-            'chat_rooms': rooms_data
+            'chat_rooms': rooms_data,
+            'total': chat_rooms.total,
+            'pages': chat_rooms.pages,
+            'current_page': page
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
+
+@chat_bp.route('/chat/presence', methods=['GET'])
+@jwt_required()
+def get_presence():
+    """Consultar presença em lote: ?users=company:1,driver:2"""
+    try:
+        user_keys = [key for key in request.args.get('users', '').split(',') if key]
+        if len(user_keys) > 200:
+            return jsonify({'success': False, 'message': 'Máximo de 200 usuários por consulta'}), 400
+        
+        return jsonify({
+            'success': True,
+            'presence': presence.lookup(user_keys)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
+
+@chat_bp.route('/chat/support-queue', methods=['GET'])
+@jwt_required()
+def get_support_queue():
+    """Fila de suporte do admin: salas aguardando resposta, das mais antigas para as mais recentes"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user != 'admin@driverconnect.com':
+            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        
+        per_page = min(int(request.args.get('per_page', 20)), 100)
+        cursor = request.args.get('cursor')
+        
+        # Mensagens não lidas pelo lado admin da sala
+        admin_unread = db.case(
+            (ChatRoom.participant1_type == 'admin', ChatRoom.unread_count_p1),
+            else_=ChatRoom.unread_count_p2
+        )
+        
+        query = ChatRoom.query.filter(
+            ChatRoom.is_active == True,
+            ChatRoom.awaiting_admin_reply == True,
+            ChatRoom.awaiting_since.isnot(None)
+        )
+        
+        # Cursor: "<awaiting_since>|<não lidas>|<id>" do último item da página anterior
+        if cursor:
+            since, unread, room_id = cursor.split('|')
+            since = datetime.fromisoformat(since)
+            unread = int(unread)
+            room_id = int(room_id)
+            query = query.filter(db.or_(
+                ChatRoom.awaiting_since > since,
+                db.and_(ChatRoom.awaiting_since == since, admin_unread < unread),
+                db.and_(ChatRoom.awaiting_since == since, admin_unread == unread, ChatRoom.id > room_id)
+            ))
+        
+        rooms = query.order_by(
+            ChatRoom.awaiting_since.asc(),
+            admin_unread.desc(),
+            ChatRoom.id.asc()
+        ).limit(per_page + 1).all()
+        
+        has_more = len(rooms) > per_page
+        rooms = rooms[:per_page]
+        
+        names = resolve_participant_names(rooms)
+        now = datetime.utcnow()
+        
+        queue = []
+        for room in rooms:
+            entry = support_queue_entry(room)
+            user_type, user_id = (
+                (room.participant2_type, room.participant2_id)
+                if room.participant1_type == 'admin'
+                else (room.participant1_type, room.participant1_id)
+            )
+            entry['user_type'] = user_type
+            entry['user_id'] = user_id
+            entry['user_name'] = names.get((user_type, user_id), DEFAULT_PARTICIPANT_NAMES.get(user_type))
+            entry['waiting_seconds'] = int((now - room.awaiting_since).total_seconds()) if room.awaiting_since else 0
+            queue.append(entry)
+        
+        next_cursor = None
+        if has_more:
+            last = rooms[-1]
+            next_cursor = f"{last.awaiting_since.isoformat()}|{last.admin_unread_count()}|{last.id}"
+        
+        return jsonify({
+            'success': True,
+            'queue': queue,
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Cursor inválido'}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
 
 @chat_bp.route('/chat/messages/<int:chat_room_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_chat_messages(chat_room_id):
     """Obter mensagens de um chat"""
     try:
@@ -341,26 +689,59 @@ def get_chat_messages(chat_room_id):
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 50))
         
-        # Buscar mensagens
+        # Buscar mensagens (tabela quente primeiro, depois o histórico arquivado)
         messages = ChatMessage.query.filter_by(chat_room_id=chat_room_id)\
             .order_by(ChatMessage.created_at.desc())\
             .paginate(page=page, per_page=per_page, error_out=False)
         
-        # Marcar mensagens como lidas
-        chat_room.mark_messages_as_read(current_user_id)
-        db.session.commit()
+        items = [message.to_dict() for message in messages.items]
+        archived_total = count_archived_messages(chat_room_id)
+        
+        if len(items) < per_page and archived_total:
+            skip = max((page - 1) * per_page - messages.total, 0)
+            items.extend(read_archived_messages(chat_room_id, skip, per_page - len(items)))
+        
+        total = messages.total + archived_total
+        
+        # Só a primeira página contém a mensagem mais recente: páginas antigas não
+        # movem a marca de leitura para trás
+        if page == 1 and messages.items:
+            mark_room_as_read(chat_room, current_user_type, current_user_id,
+                              max(message.id for message in messages.items))
         
         return jsonify({
             'success': True,
-            'messages': [message.to_dict() for message in reversed(messages.items)],
-            'total': messages.total,
-            'pages': messages.pages,
+            'messages': list(reversed(items)),
+            'total': total,
+            'pages': -(-total // per_page),
             'current_page': page
         }), 200
         
     except Exception as e:
         return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
 
+@chat_bp.route('/chat/archive', methods=['POST'])
+@jwt_required()
+def run_chat_archive():
+    """Arquivar mensagens antigas em segmentos comprimidos (admin)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user != 'admin@driverconnect.com':
+            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        result = archive_chat_messages(
+            older_than_days=int(data.get('older_than_days', DEFAULT_ARCHIVE_AFTER_DAYS)),
+            batch_size=int(data.get('batch_size', 1000)),
+            max_batches=int(data.get('max_batches', 10))
+        )
+        
+        return jsonify({'success': True, **result}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
+
 @chat_bp.route('/chat/mark-read/<int:chat_room_id>', methods=['POST'])
 @jwt_required()
 def mark_messages_read(chat_room_id):
@@ -374,10 +755,13 @@ def mark_messages_read(chat_room_id):
         is_admin = current_user == 'admin@driverconnect.com'
         
         if company:
+            current_user_type = 'company'
             current_user_id = company.id
         elif driver:
+            current_user_type = 'driver'
             current_user_id = driver.id
         elif is_admin:
+            current_user_type = 'admin'
             current_user_id = 1  # ID fixo para admin
         else:
             return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
@@ -387,9 +771,11 @@ def mark_messages_read(chat_room_id):
         if not chat_room:
             return jsonify({'success': False, 'message': 'Sala de chat não encontrada'}), 404
         
-        # Marcar mensagens como lidas
-        chat_room.mark_messages_as_read(current_user_id)
-        db.session.commit()
+        # Marcar mensagens como lidas (opcionalmente apenas até last_seen_id)
+        data = request.get_json(silent=True) or {}
+        last_seen_id = data.get('last_seen_id')
+        mark_room_as_read(chat_room, current_user_type, current_user_id,
+                          int(last_seen_id) if last_seen_id is not None else None)
         
         return jsonify({
             'success': True,
@@ -420,32 +806,20 @@ def create_support_chat():
         else:
             return jsonify({'success': False, 'message': 'Usuário não encontrado'}), 404
         
-        # Verificar se já existe uma sala de suporte
-        existing_room = ChatRoom.query.filter(
-            ((ChatRoom.participant1_id == current_user_id and ChatRoom.participant1_type == current_user_type and
-              ChatRoom.participant2_type == 'admin') or
-             (ChatRoom.participant2_id == current_user_id and ChatRoom.participant2_type == current_user_type and
-              ChatRoom.participant1_type == 'admin'))
-        ).first()
+        # Buscar a sala de suporte pelo índice único ou criar uma nova
+        support_room, created = ChatRoom.get_or_create(
+            current_user_type, current_user_id,
+            'admin', 1  # ID fixo para admin
+        )
+        db.session.commit()
         
-        if existing_room:
+        if not created:
             return jsonify({
                 'success': True,
                 'message': 'Chat de suporte já existe',
-                'chat_room': existing_room.to_dict()
+                'chat_room': support_room.to_dict()
             }), 200
         
-        # Criar nova sala de suporte
-        support_room = ChatRoom(
-            participant1_id=current_user_id,
-            participant1_type=current_user_type,
-            participant2_id=1,  # ID fixo para admin
-            participant2_type='admin'
-        )
-        
-        db.session.add(support_room)
-        db.session.commit()
-        
         return jsonify({
             'success': True,
             'message': 'Chat de suporte criado com sucesso',
@@ -456,3 +830,106 @@ def create_support_chat():
         db.session.rollback()
         return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
 
+
+# Caracteres com significado especial na busca booleana do MySQL
+FULLTEXT_SPECIAL_CHARS = re.compile(r'[+\-<>()~*"@]+')
+
+def parse_search_terms(query_text):
+    """Separar a busca em termos sem operadores especiais"""
+    return [term for term in FULLTEXT_SPECIAL_CHARS.sub(' ', query_text).split() if term]
+
+def build_search_condition(terms):
+    """Condição de busca: MATCH ... AGAINST no MySQL, LIKE nos demais bancos"""
+    if db.engine.dialect.name == 'mysql':
+        boolean_query = ' '.join(f'+{term}*' for term in terms)
+        return mysql_match(ChatMessage.message, against=boolean_query).in_boolean_mode()
+    
+    return db.and_(*[ChatMessage.message.ilike(f'%{term}%') for term in terms])
+
+def make_snippet(text, terms, radius=60):
+    """Trecho da mensagem em torno do primeiro termo encontrado"""
+    lowered = text.lower()
+    positions = [lowered.find(term.lower()) for term in terms]
+    positions = [position for position in positions if position >= 0]
+    if not positions:
+        return text[:radius * 2]
+    
+    start = max(min(positions) - radius, 0)
+    end = min(min(positions) + radius, len(text))
+    snippet = text[start:end]
+    if start > 0:
+        snippet = '...' + snippet
+    if end < len(text):
+        snippet = snippet + '...'
+    return snippet
+
+@chat_bp.route('/chat/search', methods=['GET'])
+@jwt_required()
+@read_replica
+def search_chat_messages():
+    """Buscar mensagens em todas as salas (suporte/admin)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user != 'admin@driverconnect.com':
+            return jsonify({'success': False, 'message': 'Acesso negado'}), 403
+        
+        terms = parse_search_terms(request.args.get('q', ''))
+        if not terms:
+            return jsonify({'success': False, 'message': 'Parâmetro q é obrigatório'}), 400
+        
+        # Filtros opcionais
+        participant_type = request.args.get('participant_type')
+        chat_room_id = request.args.get('chat_room_id', type=int)
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        # Paginação por cursor (id da última mensagem retornada)
+        cursor = request.args.get('cursor', type=int)
+        per_page = min(int(request.args.get('per_page', 20)), 100)
+        
+        query = db.session.query(
+            ChatMessage.id,
+            ChatMessage.chat_room_id,
+            ChatMessage.sender_id,
+            ChatMessage.sender_type,
+            ChatMessage.message,
+            ChatMessage.created_at
+        ).filter(build_search_condition(terms))
+        
+        if chat_room_id:
+            query = query.filter(ChatMessage.chat_room_id == chat_room_id)
+        if participant_type:
+            query = query.join(ChatRoom, ChatRoom.id == ChatMessage.chat_room_id).filter(db.or_(
+                ChatRoom.participant1_type == participant_type,
+                ChatRoom.participant2_type == participant_type
+            ))
+        if start_date:
+            query = query.filter(ChatMessage.created_at >= datetime.fromisoformat(start_date))
+        if end_date:
+            query = query.filter(ChatMessage.created_at <= datetime.fromisoformat(end_date))
+        if cursor:
+            query = query.filter(ChatMessage.id < cursor)
+        
+        rows = query.order_by(ChatMessage.id.desc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        
+        results = [{
+            'id': row.id,
+            'chat_room_id': row.chat_room_id,
+            'sender_id': row.sender_id,
+            'sender_type': row.sender_type,
+            'snippet': make_snippet(row.message, terms),
+            'created_at': row.created_at.isoformat() if row.created_at else None
+        } for row in rows]
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'next_cursor': rows[-1].id if has_more else None
+        }), 200
+        
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Parâmetros de busca inválidos'}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
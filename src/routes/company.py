@@ -8,6 +8,13 @@ from src.models.service import Service
 from src.models.driver import Driver
 from src.models.payment import Payment, Commission, DriverEarning
 from src.models.trip import Trip
+from src.utils.idempotency import idempotent
+from src.utils.money import money_sum
+from src.models.rollup import DailyCompanyStats
+from src.services.rollups import parse_day_range, range_stats
+from src.services.heatmap import get_heatmap, parse_zoom
+from src.services.leaderboards import DEFAULT_WINDOW
+from src.utils.replicas import read_replica
 
 company_bp = Blueprint('company', __name__)
 
@@ -135,6 +142,7 @@ def get_company_services():
 
 @company_bp.route('/company/services', methods=['POST'])
 @jwt_required()
+@idempotent()
 def create_service():
     """Criar novo serviço"""
     try:
@@ -281,6 +289,7 @@ def get_company_drivers():
 
 @company_bp.route('/company/dashboard/stats', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_dashboard_stats():
     """Obter estatísticas para o dashboard da empresa"""
     try:
@@ -298,13 +307,11 @@ def get_dashboard_stats():
         
         # Receita do mês atual
         current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_payments = Payment.query.filter(
+        monthly_revenue = db.session.query(money_sum(Payment.valor_total)).filter(
             Payment.company_id == company_id,
             Payment.data_pagamento >= current_month,
             Payment.status_pagamento == 'aprovado'
-        ).all()
-        
-        monthly_revenue = sum(payment.valor_total for payment in monthly_payments)
+        ).scalar()
         
         # Serviços recentes
         recent_services = Service.query.filter_by(company_id=company_id)\
@@ -326,3 +333,49 @@ def get_dashboard_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@company_bp.route('/company/reports/daily', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_company_daily_report():
+    """Relatório diário da empresa (tabelas consolidadas)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user['type'] != 'company':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        try:
+            start_day, end_day = parse_day_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Período inválido'}), 400
+        
+        stats = range_stats(DailyCompanyStats, start_day, end_day, company_id=current_user['id'])
+        
+        return jsonify({
+            'period': {'start_date': start_day.isoformat(), 'end_date': end_day.isoformat()},
+            'totals': stats['totals'],
+            'series': stats['series']
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@company_bp.route('/company/heatmap', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_company_heatmap():
+    """Mapa de calor dos serviços solicitados pela empresa"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user['type'] != 'company':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        try:
+            zoom = parse_zoom(request.args.get('zoom'))
+            heatmap = get_heatmap(request.args.get('window', DEFAULT_WINDOW), zoom, current_user['id'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        return jsonify(heatmap), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -7,6 +7,7 @@ from src.models.customer import Customer
 from src.models.service import Service
 from src.models.driver import Driver
 from src.models.payment import Payment
+from src.utils.replicas import read_replica
 
 customer_bp = Blueprint('customer', __name__)
 
@@ -109,6 +110,7 @@ def get_customer_profile():
 
 @customer_bp.route('/customer/dashboard/stats', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_customer_dashboard_stats():
     """Obter estatísticas para o dashboard do cliente"""
     try:
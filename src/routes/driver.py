@@ -8,6 +8,12 @@ from src.models.service import Service
 from src.models.company import Company
 from src.models.payment import Payment, DriverEarning
 from src.models.trip import Trip
+from src.utils.idempotency import idempotent
+from src.services.outbox import trip_completed_event
+from src.utils.money import money_sum
+from src.models.rollup import DailyDriverStats
+from src.services.rollups import parse_day_range, range_stats
+from src.utils.replicas import read_replica
 
 driver_bp = Blueprint('driver', __name__)
 
@@ -156,7 +162,8 @@ def get_available_services():
 
 @driver_bp.route('/driver/accept-service/<int:service_id>', methods=['POST'])
 @jwt_required()
-def accept_service():
+@idempotent()
+def accept_service(service_id):
     """Aceitar um serviço"""
     try:
         current_user = get_jwt_identity()
@@ -164,7 +171,6 @@ def accept_service():
             return jsonify({'error': 'Acesso negado'}), 403
         
         driver_id = current_user['id']
-        service_id = request.view_args['service_id']
         
         # Verificar se o serviço existe e está disponível
         service = Service.query.get(service_id)
@@ -254,7 +260,8 @@ def get_driver_services():
 
 @driver_bp.route('/driver/start-trip/<int:service_id>', methods=['POST'])
 @jwt_required()
-def start_trip():
+@idempotent()
+def start_trip(service_id):
     """Iniciar viagem"""
     try:
         current_user = get_jwt_identity()
@@ -262,7 +269,6 @@ def start_trip():
             return jsonify({'error': 'Acesso negado'}), 403
         
         driver_id = current_user['id']
-        service_id = request.view_args['service_id']
         data = request.get_json()
         
         # Verificar se o serviço pertence ao motorista
@@ -301,7 +307,8 @@ def start_trip():
 
 @driver_bp.route('/driver/complete-trip/<int:service_id>', methods=['POST'])
 @jwt_required()
-def complete_trip():
+@idempotent()
+def complete_trip(service_id):
     """Finalizar viagem"""
     try:
         current_user = get_jwt_identity()
@@ -309,7 +316,6 @@ def complete_trip():
             return jsonify({'error': 'Acesso negado'}), 403
         
         driver_id = current_user['id']
-        service_id = request.view_args['service_id']
         data = request.get_json()
         
         # Verificar se o serviço pertence ao motorista
@@ -347,6 +353,9 @@ def complete_trip():
             service.valor_final = service.valor_base
             service.calculate_commission()
         
+        # Pagamento, comissão e ganho do motorista são gerados pelo consumidor do outbox
+        trip_completed_event(service, data.get('metodo_pagamento'))
+        
         db.session.commit()
         
         return jsonify({
@@ -392,6 +401,7 @@ def update_location():
 
 @driver_bp.route('/driver/dashboard/stats', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_driver_dashboard_stats():
     """Obter estatísticas para o dashboard do motorista"""
     try:
@@ -414,13 +424,11 @@ def get_driver_dashboard_stats():
         
         # Ganhos do mês atual
         current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_earnings = DriverEarning.query.filter(
+        monthly_income = db.session.query(money_sum(DriverEarning.valor_liquido)).filter(
             DriverEarning.driver_id == driver_id,
             DriverEarning.data_ganho >= current_month,
             DriverEarning.status_repasse == 'pago'
-        ).all()
-        
-        monthly_income = sum(earning.valor_liquido for earning in monthly_earnings)
+        ).scalar()
         
         # Avaliação média
         driver = Driver.query.get(driver_id)
@@ -445,3 +453,28 @@ def get_driver_dashboard_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@driver_bp.route('/driver/reports/daily', methods=['GET'])
+@jwt_required()
+@read_replica
+def get_driver_daily_report():
+    """Relatório diário do motorista (tabelas consolidadas)"""
+    try:
+        current_user = get_jwt_identity()
+        if current_user['type'] != 'driver':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        try:
+            start_day, end_day = parse_day_range(request.args)
+        except ValueError:
+            return jsonify({'error': 'Período inválido'}), 400
+        
+        stats = range_stats(DailyDriverStats, start_day, end_day, driver_id=current_user['id'])
+        
+        return jsonify({
+            'period': {'start_date': start_day.isoformat(), 'end_date': end_day.isoformat()},
+            'totals': stats['totals'],
+            'series': stats['series']
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -4,6 +4,7 @@ from src.models.user import db
 from src.models.rating import DriverRating
 from src.models.driver import Driver
 from src.models.company import Company
+from src.utils.replicas import read_replica
 from datetime import datetime
 
 rating_bp = Blueprint('rating', __name__)
@@ -64,6 +65,7 @@ def create_rating():
         return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
 
 @rating_bp.route('/rating/driver/<int:driver_id>', methods=['GET'])
+@read_replica
 def get_driver_ratings(driver_id):
     """Buscar todas as avaliações de um motorista"""
     try:
@@ -106,6 +108,7 @@ def get_driver_ratings(driver_id):
 
 @rating_bp.route('/rating/company/<int:company_id>', methods=['GET'])
 @jwt_required()
+@read_replica
 def get_company_ratings(company_id):
     """Buscar todas as avaliações feitas por uma empresa"""
     try:
@@ -133,6 +136,7 @@ def get_company_ratings(company_id):
         return jsonify({'success': False, 'message': f'Erro interno: {str(e)}'}), 500
 
 @rating_bp.route('/rating/top-drivers', methods=['GET'])
+@read_replica
 def get_top_drivers():
     """Buscar motoristas com melhor avaliação (4+ estrelas)"""
     try:
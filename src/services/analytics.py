@@ -0,0 +1,243 @@
+"""
+Consultas analíticas sobre o snapshot colunar (src.services.analytics_snapshot).
+
+As tabelas do snapshot são abertas com memory map (Arrow IPC) e os
+rankings, séries temporais e mapas de calor são calculados com operações
+vetorizadas do pyarrow, sem consultar o MySQL. Os resultados têm o mesmo
+formato das versões em SQL (leaderboards e timeseries), com dados da hora
+do último snapshot.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from src.services.analytics_snapshot import ANALYTICS_DIR, read_manifest
+from src.services.timeseries import BUCKETS, METRICS, bucket_range, next_bucket
+from src.utils.geogrid import BASE_CELL_SIZE, cell_center, zoom_shift
+from src.utils.money import from_cents
+from src.utils.streaming import pa
+
+try:
+    import pyarrow.compute as pc
+except ImportError:
+    pc = None
+
+# Intervalo mínimo entre leituras do manifesto (troca de snapshot)
+MANIFEST_CHECK_INTERVAL = 5  # segundos
+
+
+class SnapshotUnavailableError(Exception):
+    pass
+
+
+class SnapshotReader:
+    """Tabelas de um snapshot, abertas sob demanda com memory map"""
+
+    def __init__(self, manifest):
+        self.manifest = manifest
+        self.directory = os.path.join(ANALYTICS_DIR, manifest['snapshot'])
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def table(self, name):
+        with self._lock:
+            if name not in self._tables:
+                source = pa.memory_map(os.path.join(self.directory, f'{name}.arrow'), 'r')
+                self._tables[name] = pa.ipc.open_file(source).read_all()
+            return self._tables[name]
+
+
+_reader = None
+_reader_checked_at = 0
+_reader_lock = threading.Lock()
+
+
+def get_reader():
+    """Leitor do snapshot publicado mais recente"""
+    global _reader, _reader_checked_at
+    if pa is None:
+        raise SnapshotUnavailableError('Consultas analíticas indisponíveis (pyarrow não instalado)')
+
+    with _reader_lock:
+        now = time.monotonic()
+        if _reader is None or now - _reader_checked_at >= MANIFEST_CHECK_INTERVAL:
+            _reader_checked_at = now
+            manifest = read_manifest()
+            if manifest is None:
+                raise SnapshotUnavailableError('Nenhum snapshot analítico gerado ainda')
+            if _reader is None or manifest['snapshot'] != _reader.manifest['snapshot']:
+                _reader = SnapshotReader(manifest)
+        return _reader
+
+
+def _cents(array):
+    return pc.cast(pc.round(pc.multiply(array, 100)), pa.int64())
+
+
+def _since(table, column, start):
+    if start is None:
+        return table
+    return table.filter(pc.greater_equal(table[column], pa.scalar(start, type=pa.timestamp('us'))))
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time()) if day else None
+
+
+def _per_entity(table, key, metric, value=None):
+    """Tabela (entity_id, metric): contagem de linhas ou soma em centavos de `value`"""
+    if value is None:
+        grouped = table.group_by(key).aggregate([('id', 'count')])
+        return pa.table({'entity_id': grouped[key], metric: grouped['id_count']})
+    grouped = table.append_column('cents', _cents(table[value])).group_by(key).aggregate([('cents', 'sum')])
+    return pa.table({'entity_id': grouped[key], metric: grouped['cents_sum']})
+
+
+def _ranking(first, second, metrics, limit):
+    """Junta duas métricas por entidade e ordena (desempate pelo id)"""
+    joined = first.join(second, 'entity_id', join_type='full outer')
+    joined = joined.filter(pc.is_valid(joined['entity_id']))
+    columns = {'entity_id': joined['entity_id']}
+    for metric in metrics:
+        columns[metric] = pc.fill_null(joined[metric], 0)
+    ranked = pa.table(columns).sort_by(
+        [(metric, 'descending') for metric in metrics] + [('entity_id', 'ascending')]
+    )
+    return ranked.slice(0, limit).to_pylist()
+
+
+def _names(reader, table_name, ids, columns):
+    table = reader.table(table_name)
+    rows = table.filter(pc.is_in(table['id'], value_set=pa.array(ids, type=pa.int64()))).select(['id'] + columns)
+    return {row['id']: row for row in rows.to_pylist()}
+
+
+def top_drivers(start_day=None, limit=10):
+    reader = get_reader()
+    start = _day_start(start_day)
+
+    trips = reader.table('trips')
+    trips = _since(trips.filter(pc.equal(trips['status'], 'concluida')), 'data_fim', start)
+    payments = reader.table('payments')
+    payments = _since(payments.filter(pc.equal(payments['status_pagamento'], 'aprovado')), 'data_pagamento', start)
+
+    ranking = _ranking(
+        _per_entity(trips, 'driver_id', 'trips'),
+        _per_entity(payments, 'driver_id', 'earnings', 'valor_motorista'),
+        ['trips', 'earnings'], limit
+    )
+    drivers = _names(reader, 'drivers', [row['entity_id'] for row in ranking], ['nome', 'avaliacao'])
+    return [{
+        'id': row['entity_id'],
+        'name': drivers.get(row['entity_id'], {}).get('nome'),
+        'trips': row['trips'],
+        'earnings': from_cents(row['earnings']),
+        'rating': float(drivers.get(row['entity_id'], {}).get('avaliacao') or 0)
+    } for row in ranking]
+
+
+def top_companies(start_day=None, limit=10):
+    reader = get_reader()
+    start = _day_start(start_day)
+
+    services = _since(reader.table('services'), 'data_solicitacao', start)
+    payments = reader.table('payments')
+    payments = _since(payments.filter(pc.equal(payments['status_pagamento'], 'aprovado')), 'data_pagamento', start)
+
+    ranking = _ranking(
+        _per_entity(services, 'company_id', 'services'),
+        _per_entity(payments, 'company_id', 'revenue', 'valor_total'),
+        ['services', 'revenue'], limit
+    )
+    companies = _names(reader, 'companies', [row['entity_id'] for row in ranking], ['nome'])
+    return [{
+        'id': row['entity_id'],
+        'name': companies.get(row['entity_id'], {}).get('nome'),
+        'services': row['services'],
+        'revenue': from_cents(row['revenue'])
+    } for row in ranking]
+
+
+def timeseries(start_date, end_date, bucket='day'):
+    """Mesmo formato de src.services.timeseries.get_timeseries"""
+    if bucket not in BUCKETS:
+        raise ValueError(f'Intervalo inválido. Use: {", ".join(BUCKETS)}')
+    if start_date > end_date:
+        raise ValueError('Período inválido')
+
+    starts = bucket_range(start_date, end_date, bucket)
+    period_end = next_bucket(starts[-1], bucket)
+
+    payments = get_reader().table('payments')
+    timestamp = pa.timestamp('us')
+    payments = payments.filter(pc.and_(
+        pc.equal(payments['status_pagamento'], 'aprovado'),
+        pc.and_(
+            pc.greater_equal(payments['data_pagamento'], pa.scalar(starts[0], type=timestamp)),
+            pc.less(payments['data_pagamento'], pa.scalar(period_end, type=timestamp))
+        )
+    ))
+
+    grouped = pa.table({
+        'bucket': pc.floor_temporal(payments['data_pagamento'], unit=bucket, week_starts_monday=True),
+        'revenue': _cents(payments['valor_total']),
+        'commission': _cents(payments['valor_comissao']),
+        'driver_payments': _cents(payments['valor_motorista']),
+        'service_id': payments['service_id'],
+    }).group_by('bucket').aggregate([
+        ('revenue', 'sum'), ('commission', 'sum'), ('driver_payments', 'sum'), ('service_id', 'count_distinct')
+    ])
+    computed = {
+        row['bucket']: {
+            'revenue': row['revenue_sum'],
+            'commission': row['commission_sum'],
+            'driver_payments': row['driver_payments_sum'],
+            'services_count': row['service_id_count_distinct'],
+        }
+        for row in grouped.to_pylist()
+    }
+
+    empty = {metric: 0 for metric in METRICS}
+    series = []
+    totals = dict(empty)
+    for start in starts:
+        values = computed.get(start, empty)
+        for metric in METRICS:
+            totals[metric] += values[metric]
+        point = {metric: values[metric] if metric == 'services_count' else from_cents(values[metric])
+                 for metric in METRICS}
+        series.append(dict(point, bucket_start=start.isoformat()))
+
+    for metric in ('revenue', 'commission', 'driver_payments'):
+        totals[metric] = from_cents(totals[metric])
+
+    return {'bucket': bucket, 'series': series, 'totals': totals}
+
+
+def demand_heatmap(zoom, start_day=None, company_id=None):
+    """Células do mapa de calor (mesma grade de src.services.heatmap)"""
+    services = _since(get_reader().table('services'), 'data_solicitacao', _day_start(start_day))
+    lat, lng = services['origem_latitude'], services['origem_longitude']
+    mask = pc.and_(
+        pc.and_(pc.greater_equal(lat, -90), pc.less_equal(lat, 90)),
+        pc.and_(pc.greater_equal(lng, -180), pc.less_equal(lng, 180))
+    )
+    if company_id is not None:
+        mask = pc.and_(mask, pc.equal(services['company_id'], company_id))
+    services = services.filter(mask)
+
+    def cells(values, offset):
+        base = pc.cast(pc.floor(pc.divide(pc.add(values, offset), BASE_CELL_SIZE)), pa.int64())
+        return pc.shift_right(base, zoom_shift(zoom))
+
+    grouped = pa.table({
+        'cell_x': cells(services['origem_longitude'], 180),
+        'cell_y': cells(services['origem_latitude'], 90),
+        'id': services['id'],
+    }).group_by(['cell_x', 'cell_y']).aggregate([('id', 'count')])
+
+    result = [
+        dict(zip(('lat', 'lng'), cell_center(row['cell_x'], row['cell_y'], zoom)), count=row['id_count'])
+        for row in grouped.to_pylist()
+    ]
+    return sorted(result, key=lambda cell: (-cell['count'], cell['lat'], cell['lng']))
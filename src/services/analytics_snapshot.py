@@ -0,0 +1,255 @@
+"""
+Snapshot colunar das tabelas usadas nos relatórios do admin.
+
+Um job periódico copia services, trips, payments, driver_earnings e os
+cadastros de motoristas e empresas para arquivos Arrow IPC em disco local:
+
+    <ANALYTICS_DIR>/snapshot_<AAAAMMDDHHMMSS>_<id>/<tabela>.arrow
+    <ANALYTICS_DIR>/current.json   (manifesto do snapshot publicado)
+
+As tabelas são lidas com cursor no servidor e gravadas em lotes (memória
+constante) em um diretório temporário exclusivo, renomeado só quando todos
+os arquivos estão completos; em seguida o manifesto é trocado de forma
+atômica, então leitores nunca veem um snapshot pela metade. Uma geração por
+vez entre processos: a vez fica em rollup_state (locked_at), como no job de
+consolidação. Os arquivos são abertos com memory map pelo módulo
+src.services.analytics.
+
+pyarrow é opcional: sem ele o job não é iniciado.
+
+Uso: python -m src.services.analytics_snapshot
+"""
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from src.models.user import db
+from src.models.service import Service
+from src.models.trip import Trip
+from src.models.payment import Payment, DriverEarning
+from src.models.driver import Driver
+from src.models.company import Company
+from src.models.rollup import RollupState
+from src.services.rollups import claim_lease, get_state, release_lease, renew_lease
+from src.utils.streaming import arrow_schema, parquet_available, pa
+
+ANALYTICS_DIR = os.environ.get(
+    'ANALYTICS_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'analytics')
+)
+MANIFEST_NAME = 'current.json'
+SNAPSHOT_PREFIX = 'snapshot_'
+TEMP_PREFIX = '.tmp_snapshot_'
+
+STATE_NAME = 'analytics_snapshot'
+# Outra geração é considerada ativa por este tempo após a última renovação
+SNAPSHOT_LEASE = timedelta(minutes=30)
+
+SNAPSHOT_INTERVAL = int(os.environ.get('ANALYTICS_SNAPSHOT_INTERVAL', 3600))  # segundos
+SNAPSHOTS_TO_KEEP = 2  # o anterior continua disponível para leitores em andamento
+FETCH_SIZE = 5000
+
+# tabela -> (modelo, [(coluna, tipo)])
+SNAPSHOT_TABLES = {
+    'services': (Service, [
+        ('id', 'int'), ('company_id', 'int'), ('driver_id', 'int'), ('status', 'str'),
+        ('tipo_servico', 'str'), ('valor_base', 'float'), ('origem_latitude', 'float'),
+        ('origem_longitude', 'float'), ('data_solicitacao', 'timestamp'), ('data_conclusao', 'timestamp')
+    ]),
+    'trips': (Trip, [
+        ('id', 'int'), ('service_id', 'int'), ('company_id', 'int'), ('driver_id', 'int'),
+        ('status', 'str'), ('distancia_percorrida', 'float'), ('data_inicio', 'timestamp'), ('data_fim', 'timestamp')
+    ]),
+    'payments': (Payment, [
+        ('id', 'int'), ('service_id', 'int'), ('company_id', 'int'), ('driver_id', 'int'),
+        ('valor_total', 'float'), ('valor_comissao', 'float'), ('valor_motorista', 'float'),
+        ('metodo_pagamento', 'str'), ('status_pagamento', 'str'), ('data_pagamento', 'timestamp')
+    ]),
+    'driver_earnings': (DriverEarning, [
+        ('id', 'int'), ('driver_id', 'int'), ('payment_id', 'int'), ('service_id', 'int'),
+        ('valor_liquido', 'float'), ('status_repasse', 'str'), ('data_ganho', 'timestamp')
+    ]),
+    'drivers': (Driver, [('id', 'int'), ('nome', 'str'), ('avaliacao', 'float')]),
+    'companies': (Company, [('id', 'int'), ('nome', 'str')]),
+}
+
+_snapshot_lock = threading.Lock()
+
+
+def manifest_path():
+    return os.path.join(ANALYTICS_DIR, MANIFEST_NAME)
+
+
+def read_manifest():
+    try:
+        with open(manifest_path(), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_table(path, model, columns):
+    """Grava uma tabela em Arrow IPC, um lote por vez; retorna a quantidade de linhas"""
+    schema = arrow_schema(columns)
+    query = db.select(*[getattr(model, name) for name, _ in columns]).order_by(model.id)
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=FETCH_SIZE))
+
+    rows = 0
+    try:
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, schema) as writer:
+            for partition in result.partitions():
+                values = list(zip(*partition))
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(column, type=field.type) for column, field in zip(values, schema)],
+                    schema=schema
+                ))
+                rows += len(partition)
+    finally:
+        result.close()
+    return rows
+
+
+def _cleanup_old_snapshots(current):
+    """Remove snapshots antigos e diretórios temporários de gerações interrompidas (com a vez)"""
+    names = os.listdir(ANALYTICS_DIR)
+    snapshots = sorted(name for name in names if name.startswith(SNAPSHOT_PREFIX))
+    keep = set(snapshots[-SNAPSHOTS_TO_KEEP:]) | {current}
+    for name in snapshots:
+        if name not in keep:
+            shutil.rmtree(os.path.join(ANALYTICS_DIR, name), ignore_errors=True)
+    for name in names:
+        if name.startswith(TEMP_PREFIX):
+            shutil.rmtree(os.path.join(ANALYTICS_DIR, name), ignore_errors=True)
+
+
+def create_snapshot(max_age=None):
+    """Exporta todas as tabelas e publica o novo snapshot; retorna o manifesto.
+
+    Retorna None se outro processo estiver gerando um snapshot ou se, com
+    `max_age`, o snapshot publicado já for mais recente que isso.
+    """
+    if not parquet_available():
+        raise RuntimeError('Snapshot analítico indisponível (pyarrow não instalado)')
+
+    with _snapshot_lock:
+        state = get_state(STATE_NAME)
+        lease = claim_lease(state.id, SNAPSHOT_LEASE)
+        if lease is None:
+            return None
+
+        try:
+            # Outro processo pode ter publicado enquanto esperávamos a vez
+            age = snapshot_age()
+            if max_age is not None and age is not None and age < max_age:
+                release_lease(state.id, lease)
+                return None
+
+            manifest = _export_and_publish(state.id, lease)
+            lease = renew_lease(state.id, lease)
+            state = RollupState.query.get(state.id)
+            state.watermark = datetime.fromisoformat(manifest['generated_at'])
+            state.last_run_at = datetime.utcnow()
+            db.session.commit()
+            release_lease(state.id, lease)
+            return manifest
+        except Exception:
+            db.session.rollback()
+            release_lease(state.id, lease)
+            raise
+
+
+def _export_and_publish(state_id, lease):
+    os.makedirs(ANALYTICS_DIR, exist_ok=True)
+    generated_at = datetime.utcnow()
+    unique = uuid.uuid4().hex[:8]
+    name = f'{SNAPSHOT_PREFIX}{generated_at:%Y%m%d%H%M%S}_{unique}'
+    temp_directory = os.path.join(ANALYTICS_DIR, f'{TEMP_PREFIX}{os.getpid()}_{unique}')
+    os.makedirs(temp_directory)
+
+    try:
+        tables = {}
+        for table, (model, columns) in SNAPSHOT_TABLES.items():
+            tables[table] = _write_table(os.path.join(temp_directory, f'{table}.arrow'), model, columns)
+            lease = renew_lease(state_id, lease)
+            # Confirma a renovação e encerra a transação de leitura usada pela exportação
+            db.session.commit()
+        os.rename(temp_directory, os.path.join(ANALYTICS_DIR, name))
+    except Exception:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+
+    manifest = {
+        'snapshot': name,
+        'generated_at': generated_at.isoformat(),
+        'tables': tables
+    }
+    temp_path = f'{manifest_path()}.{os.getpid()}_{unique}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(temp_path, manifest_path())
+
+    _cleanup_old_snapshots(name)
+    return manifest
+
+
+def snapshot_age():
+    """Segundos desde o último snapshot publicado (None se não houver)"""
+    manifest = read_manifest()
+    if manifest is None:
+        return None
+    return (datetime.utcnow() - datetime.fromisoformat(manifest['generated_at'])).total_seconds()
+
+
+def start_snapshot_in_background():
+    """Dispara um snapshot em uma thread com o contexto da aplicação"""
+    app = current_app._get_current_object()
+
+    def target():
+        with app.app_context():
+            try:
+                create_snapshot()
+            except Exception as e:
+                print(f"❌ Erro no snapshot analítico: {e}")
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=target, name='analytics-snapshot', daemon=True)
+    thread.start()
+    return thread
+
+
+def start_snapshot_worker(socketio, app, interval=SNAPSHOT_INTERVAL):
+    """Gera snapshots periodicamente em segundo plano (desligue com ANALYTICS_SNAPSHOT=0)"""
+    if os.environ.get('ANALYTICS_SNAPSHOT', '1') == '0' or not parquet_available():
+        return None
+
+    def worker():
+        while True:
+            try:
+                # Com vários processos, só gera se ninguém gerou no intervalo
+                age = snapshot_age()
+                if age is None or age >= interval:
+                    with app.app_context():
+                        try:
+                            create_snapshot(max_age=interval)
+                        finally:
+                            db.session.remove()
+            except Exception as e:
+                print(f"❌ Erro no snapshot analítico: {e}")
+            socketio.sleep(min(interval, 300))
+
+    return socketio.start_background_task(worker)
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        manifest = create_snapshot()
+        if manifest is None:
+            print("❌ Outro processo está gerando um snapshot")
+        else:
+            print(f"✅ Snapshot {manifest['snapshot']}: {manifest['tables']}")
@@ -0,0 +1,190 @@
+"""
+Arquivamento do histórico de chat em segmentos comprimidos.
+
+Mensagens mais antigas que N dias saem da tabela chat_messages e vão para
+arquivos append-only em disco local, um por sala e por mês:
+
+    <CHAT_ARCHIVE_DIR>/room_<id>/<AAAA-MM>.jsonl.gz   (membros gzip concatenados)
+    <CHAT_ARCHIVE_DIR>/room_<id>/<AAAA-MM>.idx.json   (índice de offsets)
+
+Cada execução acrescenta um novo membro gzip ao segmento, e o índice guarda o
+offset, o tamanho e a faixa de ids de cada membro. Assim a leitura de uma
+página descomprime apenas os membros necessários.
+
+Uso: python -m src.services.chat_archive --days 90
+"""
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from src.models.user import db
+from src.models.chat import ChatMessage
+
+CHAT_ARCHIVE_DIR = os.environ.get(
+    'CHAT_ARCHIVE_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'chat_archive')
+)
+DEFAULT_ARCHIVE_AFTER_DAYS = int(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', 90))
+
+_write_lock = threading.Lock()
+
+
+def _room_dir(chat_room_id):
+    return os.path.join(CHAT_ARCHIVE_DIR, f'room_{chat_room_id}')
+
+
+def _segment_paths(chat_room_id, month):
+    base = os.path.join(_room_dir(chat_room_id), month)
+    return base + '.jsonl.gz', base + '.idx.json'
+
+
+def _load_index(index_path):
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path) as f:
+        return json.load(f)
+
+
+def _save_index(index_path, entries):
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(entries, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+
+
+def append_segment(chat_room_id, month, messages):
+    """Acrescenta mensagens (dicts ordenados por id) ao segmento da sala/mês.
+
+    Mensagens já arquivadas (id <= último id do índice) são ignoradas, o que
+    torna a reexecução após uma falha idempotente.
+    """
+    segment_path, index_path = _segment_paths(chat_room_id, month)
+    os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+
+    with _write_lock:
+        entries = _load_index(index_path)
+        last_archived_id = entries[-1]['last_id'] if entries else 0
+        messages = [m for m in messages if m['id'] > last_archived_id]
+        if not messages:
+            return 0
+
+        payload = '\n'.join(json.dumps(m, ensure_ascii=False) for m in messages).encode('utf-8')
+        member = gzip.compress(payload)
+
+        with open(segment_path, 'ab') as f:
+            offset = f.tell()
+            f.write(member)
+            f.flush()
+            os.fsync(f.fileno())
+
+        # O índice só é gravado depois do segmento estar em disco
+        entries.append({
+            'offset': offset,
+            'length': len(member),
+            'first_id': messages[0]['id'],
+            'last_id': messages[-1]['id'],
+            'count': len(messages)
+        })
+        _save_index(index_path, entries)
+
+    return len(messages)
+
+
+def _room_members(chat_room_id):
+    """Membros arquivados da sala, do mais recente para o mais antigo"""
+    room_dir = _room_dir(chat_room_id)
+    if not os.path.isdir(room_dir):
+        return []
+
+    members = []
+    for name in os.listdir(room_dir):
+        if not name.endswith('.idx.json'):
+            continue
+        month = name[:-len('.idx.json')]
+        segment_path, index_path = _segment_paths(chat_room_id, month)
+        for entry in _load_index(index_path):
+            members.append(dict(entry, path=segment_path))
+
+    members.sort(key=lambda entry: entry['last_id'], reverse=True)
+    return members
+
+
+def count_archived_messages(chat_room_id):
+    return sum(entry['count'] for entry in _room_members(chat_room_id))
+
+
+def _read_member(entry):
+    with open(entry['path'], 'rb') as f:
+        f.seek(entry['offset'])
+        data = gzip.decompress(f.read(entry['length']))
+    return [json.loads(line) for line in data.decode('utf-8').splitlines() if line]
+
+
+def read_archived_messages(chat_room_id, skip, limit):
+    """Lê mensagens arquivadas da mais recente para a mais antiga.
+
+    `skip` é a posição a partir da mais recente mensagem arquivada.
+    """
+    result = []
+    for entry in _room_members(chat_room_id):
+        if limit <= 0:
+            break
+        if skip >= entry['count']:
+            skip -= entry['count']
+            continue
+
+        messages = sorted(_read_member(entry), key=lambda m: m['id'], reverse=True)
+        chunk = messages[skip:skip + limit]
+        result.extend(chunk)
+        limit -= len(chunk)
+        skip = 0
+
+    return result
+
+
+def archive_chat_messages(older_than_days=DEFAULT_ARCHIVE_AFTER_DAYS, batch_size=1000, max_batches=None):
+    """Move mensagens antigas para os segmentos e as remove da tabela, em lotes"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        batch = ChatMessage.query.filter(ChatMessage.created_at < cutoff)\
+            .order_by(ChatMessage.id)\
+            .limit(batch_size)\
+            .all()
+        if not batch:
+            break
+
+        segments = {}
+        for message in batch:
+            month = message.created_at.strftime('%Y-%m')
+            segments.setdefault((message.chat_room_id, month), []).append(message.to_dict())
+
+        for (chat_room_id, month), messages in segments.items():
+            archived += append_segment(chat_room_id, month, messages)
+
+        # Remover da tabela quente somente após gravar os segmentos
+        ChatMessage.query.filter(ChatMessage.id.in_([m.id for m in batch]))\
+            .delete(synchronize_session=False)
+        db.session.commit()
+        batches += 1
+
+    return {'archived': archived, 'batches': batches, 'cutoff': cutoff.isoformat()}
+
+
+if __name__ == '__main__':
+    import argparse
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description='Arquivar mensagens antigas do chat')
+    parser.add_argument('--days', type=int, default=DEFAULT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        result = archive_chat_messages(args.days, args.batch_size)
+        print(f"✅ {result['archived']} mensagens arquivadas em {result['batches']} lotes")
@@ -0,0 +1,138 @@
+"""
+Configurações de comissão persistidas e lidas de um cache em memória.
+
+Cada alteração grava uma nova linha em commission_settings com versão
+incrementada; a versão atual é a maior. As leituras usam o cache do processo:
+
+- a cada VERSION_CHECK_INTERVAL segundos, um SELECT MAX(version) verifica se
+  outro worker gravou uma versão nova e, se sim, recarrega;
+- após SETTINGS_TTL segundos o cache é recarregado de qualquer forma;
+- o worker que grava atualiza o próprio cache na hora.
+
+Sem nenhuma versão gravada valem os DEFAULT_SETTINGS.
+"""
+import threading
+import time
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.settings import CommissionSettings
+from src.utils.money import round_money
+
+DEFAULT_SETTINGS = {
+    'version': 0,
+    'platform_commission': 15.0,  # %
+    'min_commission': 5.00,
+    'max_commission': 100.00,
+    'auto_transfer': True,
+    'transfer_delay': 24  # horas
+}
+
+SETTINGS_TTL = 300  # segundos
+VERSION_CHECK_INTERVAL = 5  # segundos
+
+
+class SettingsConflictError(Exception):
+    """Outra alteração foi gravada ao mesmo tempo"""
+
+
+class CommissionSettingsCache:
+
+    def __init__(self, ttl=SETTINGS_TTL, check_interval=VERSION_CHECK_INTERVAL):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._settings = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _load(self):
+        row = CommissionSettings.query.order_by(CommissionSettings.version.desc()).first()
+        settings = row.to_dict() if row else dict(DEFAULT_SETTINGS)
+        self.set(settings)
+        self.reloads += 1
+        return settings
+
+    def set(self, settings):
+        now = time.monotonic()
+        with self._lock:
+            self._settings = settings
+            self._loaded_at = now
+            self._checked_at = now
+
+    def get(self):
+        now = time.monotonic()
+        with self._lock:
+            settings = self._settings
+            expired = settings is None or now - self._loaded_at >= self.ttl
+            check = not expired and now - self._checked_at >= self.check_interval
+            if check:
+                self._checked_at = now
+
+        if expired:
+            return self._load()
+
+        if check:
+            latest = db.session.query(func.max(CommissionSettings.version)).scalar() or 0
+            if latest != settings['version']:
+                return self._load()
+
+        return settings
+
+    def invalidate(self):
+        with self._lock:
+            self._settings = None
+
+
+settings_cache = CommissionSettingsCache()
+
+
+def get_commission_settings():
+    """Configurações atuais (dict), servidas pelo cache"""
+    return dict(settings_cache.get())
+
+
+def save_commission_settings(values, created_by=None):
+    """Grava uma nova versão a partir da atual com os valores informados"""
+    current = CommissionSettings.query.order_by(CommissionSettings.version.desc()).first()
+    base = current.to_dict() if current else dict(DEFAULT_SETTINGS)
+    base.update(values)
+
+    row = CommissionSettings(
+        version=base['version'] + 1,
+        platform_commission=base['platform_commission'],
+        min_commission=base['min_commission'],
+        max_commission=base['max_commission'],
+        auto_transfer=base['auto_transfer'],
+        transfer_delay=base['transfer_delay'],
+        created_by=created_by
+    )
+    db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise SettingsConflictError('Configurações alteradas por outro usuário, tente novamente')
+
+    settings = row.to_dict()
+    settings_cache.set(settings)
+    return settings
+
+
+def compute_commission(value, rate=None, settings=None, apply_limits=False):
+    """Comissão sobre um valor.
+
+    `rate` é a fração (ex.: 0.15); sem ela usa o percentual configurado.
+    Os limites mínimo e máximo só são aplicados com `apply_limits` (usado
+    pela calculadora do admin); a comissão dos serviços é só o percentual.
+    Retorna (rate, valor_comissao, valor_motorista).
+    """
+    settings = settings or get_commission_settings()
+    if rate is None:
+        rate = settings['platform_commission'] / 100
+    commission = round_money(value * rate)
+    if apply_limits:
+        commission = max(settings['min_commission'], min(commission, settings['max_commission']))
+        commission = min(commission, value)
+    return rate, commission, round_money(value - commission)
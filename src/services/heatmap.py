@@ -0,0 +1,96 @@
+"""
+Mapa de calor da demanda (origem dos serviços solicitados).
+
+As contagens por célula base vêm de daily_demand_cells, mantida pelo job de
+rollups: só os dias alterados são recalculados, então atualizar é barato.
+Para um zoom menor as células base são agregadas por deslocamento de bits
+(GROUP BY cell_x >> shift, cell_y >> shift). Enquanto a tabela não cobre
+todo o histórico (antes da primeira consolidação que a preenche) a mesma
+agregação é feita direto sobre services.
+
+O resultado fica em cache por janela, zoom, empresa, dia e marca d'água
+dos rollups.
+"""
+from datetime import datetime
+from sqlalchemy import func
+from src.models.user import db
+from src.models.service import Service
+from src.models.rollup import DailyDemandCell
+from src.services.leaderboards import DEFAULT_WINDOW, window_start
+from src.services.rollups import demand_cells_watermark, rollup_watermark
+from src.utils.cache import TTLCache
+from src.utils.geogrid import (
+    MAX_ZOOM, MIN_ZOOM, base_cell_expressions, cell_center, cell_size, valid_coordinates, zoom_shift
+)
+
+DEFAULT_ZOOM = 10
+HEATMAP_TTL = 60  # segundos
+
+heatmap_cache = TTLCache(ttl=HEATMAP_TTL, max_size=256)
+
+
+def parse_zoom(value):
+    zoom = DEFAULT_ZOOM if value is None else int(value)
+    if not MIN_ZOOM <= zoom <= MAX_ZOOM:
+        raise ValueError(f'Zoom inválido. Use de {MIN_ZOOM} a {MAX_ZOOM}')
+    return zoom
+
+
+def _grouped_cells(cell_x, cell_y, count, zoom, conditions):
+    shift = zoom_shift(zoom)
+    x = cell_x.op('>>')(shift)
+    y = cell_y.op('>>')(shift)
+    query = db.session.query(x, y, count).filter(*conditions).group_by(x, y)
+    return [
+        dict(zip(('lat', 'lng'), cell_center(row[0], row[1], zoom)), count=int(row[2]))
+        for row in query.all()
+    ]
+
+
+def compute_heatmap(zoom, start_day=None, company_id=None, use_rollups=True):
+    if use_rollups:
+        conditions = []
+        if start_day:
+            conditions.append(DailyDemandCell.day >= start_day)
+        if company_id is not None:
+            conditions.append(DailyDemandCell.company_id == company_id)
+        cells = _grouped_cells(
+            DailyDemandCell.cell_x, DailyDemandCell.cell_y, func.sum(DailyDemandCell.services),
+            zoom, conditions
+        )
+    else:
+        cell_x, cell_y = base_cell_expressions(
+            Service.origem_latitude, Service.origem_longitude, db.session.get_bind().dialect.name
+        )
+        conditions = [valid_coordinates(Service.origem_latitude, Service.origem_longitude)]
+        if start_day:
+            conditions.append(Service.data_solicitacao >= datetime.combine(start_day, datetime.min.time()))
+        if company_id is not None:
+            conditions.append(Service.company_id == company_id)
+        cells = _grouped_cells(cell_x, cell_y, func.count(Service.id), zoom, conditions)
+
+    return sorted(cells, key=lambda cell: (-cell['count'], cell['lat'], cell['lng']))
+
+
+def get_heatmap(window=DEFAULT_WINDOW, zoom=DEFAULT_ZOOM, company_id=None):
+    """Mapa de calor em cache; levanta ValueError para janela inválida"""
+    today = datetime.utcnow().date()
+    start_day = window_start(window, today)
+    watermark = rollup_watermark()
+    use_rollups = demand_cells_watermark() is not None
+
+    key = (window, zoom, company_id, today, watermark, use_rollups)
+    cells = heatmap_cache.get_or_set(
+        key, lambda: compute_heatmap(zoom, start_day, company_id, use_rollups=use_rollups)
+    )
+    return heatmap_response(window, zoom, cells)
+
+
+def heatmap_response(window, zoom, cells):
+    return {
+        'window': window,
+        'zoom': zoom,
+        'cell_size': cell_size(zoom),
+        'total': sum(cell['count'] for cell in cells),
+        'cells': cells
+    }
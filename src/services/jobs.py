@@ -0,0 +1,123 @@
+"""
+Execução de jobs em segundo plano com checkpoint (repasses e conciliação).
+
+Os modelos de job têm status (pendente, executando, concluido, erro),
+started_at, heartbeat_at e error_message. Este módulo concentra o que é
+comum a eles:
+
+- só um job não concluído por tipo; um pedido novo retoma o job
+  interrompido apenas se os parâmetros forem os mesmos, senão gera
+  JobConflictError (409 nas rotas);
+- jobs com erro não são retomados implicitamente, só por pedido explícito;
+- a posse do job é assumida com um UPDATE atômico, e um heartbeat recente
+  (menos de STALE_JOB_AFTER) indica que outro worker ainda o executa.
+"""
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from src.models.user import db
+
+# Job sem heartbeat há mais tempo que isso é considerado interrompido
+STALE_JOB_AFTER = timedelta(minutes=5)
+
+UNFINISHED_STATUSES = ('pendente', 'executando')
+
+
+class JobConflictError(Exception):
+    """Já existe um job não concluído que não corresponde ao pedido"""
+
+    def __init__(self, job, running):
+        self.job = job
+        self.running = running
+        super().__init__('Job em andamento' if running else 'Job interrompido com outros parâmetros')
+
+
+def get_unfinished_job(model):
+    """Job pendente ou executando (talvez interrompido), se existir; jobs com erro ficam de fora"""
+    return model.query.filter(model.status.in_(UNFINISHED_STATUSES))\
+        .order_by(model.id.desc())\
+        .first()
+
+
+def is_job_running(job):
+    return (
+        job.status == 'executando' and
+        job.heartbeat_at is not None and
+        datetime.utcnow() - job.heartbeat_at < STALE_JOB_AFTER
+    )
+
+
+def get_or_create_job(model, same_parameters, create):
+    """Retoma o job interrompido com os mesmos parâmetros ou cria outro.
+
+    Levanta JobConflictError se houver um job em andamento ou interrompido
+    com parâmetros diferentes.
+    """
+    job = get_unfinished_job(model)
+    if job is None:
+        return create()
+    if is_job_running(job):
+        raise JobConflictError(job, running=True)
+    if not same_parameters(job):
+        raise JobConflictError(job, running=False)
+    return job
+
+
+def claim_job(model, job_id):
+    """Assume o job de forma atômica; outro worker com heartbeat recente mantém a posse"""
+    now = datetime.utcnow()
+    claimed = model.query.filter(
+        model.id == job_id,
+        model.status != 'concluido',
+        db.or_(
+            model.status != 'executando',
+            model.heartbeat_at.is_(None),
+            model.heartbeat_at < now - STALE_JOB_AFTER
+        )
+    ).update({
+        model.status: 'executando',
+        model.error_message: None,
+        model.started_at: func.coalesce(model.started_at, now),
+        model.heartbeat_at: now
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(claimed)
+
+
+def run_job(model, job_id, work):
+    """Assume o job e executa `work(job)`; marca concluido ou erro ao final"""
+    claimed = claim_job(model, job_id)
+    job = model.query.get(job_id)
+    if not claimed:
+        return job
+
+    try:
+        work(job)
+        job.status = 'concluido'
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        job = model.query.get(job_id)
+        job.status = 'erro'
+        job.error_message = str(e)
+        db.session.commit()
+
+    return job
+
+
+def start_job_in_background(run, job_id, name):
+    """Dispara `run(job_id)` em uma thread com o contexto da aplicação"""
+    app = current_app._get_current_object()
+
+    def target():
+        with app.app_context():
+            try:
+                run(job_id)
+            finally:
+                db.session.remove()
+
+    thread = threading.Thread(target=target, name=f'{name}-{job_id}', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,158 @@
+"""
+Rankings de motoristas e empresas por janela de tempo.
+
+Cada métrica é agregada por entidade em uma subconsulta própria antes do
+join com o cadastro, então não há multiplicação de linhas (viagens ×
+ganhos). Depois da primeira consolidação diária os totais vêm das tabelas
+daily_* (uma linha por dia e entidade), que o job de rollups mantém
+atualizadas de forma incremental; antes disso são agregados direto das
+tabelas transacionais.
+
+A lista ordenada (até LEADERBOARD_SIZE posições) fica em cache por tipo,
+janela, dia e marca d'água dos rollups: uma nova consolidação gera uma
+chave nova e o ranking é recalculado uma única vez (single-flight).
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from src.models.user import db
+from src.models.company import Company
+from src.models.driver import Driver
+from src.models.service import Service
+from src.models.trip import Trip
+from src.models.payment import Payment
+from src.models.rollup import DailyCompanyStats, DailyDriverStats
+from src.services.rollups import rollup_watermark
+from src.utils.cache import TTLCache
+from src.utils.money import money_sum
+
+LEADERBOARD_SIZE = 100
+LEADERBOARD_TTL = 60  # segundos
+
+# Janela -> quantidade de dias (None = todo o histórico)
+LEADERBOARD_WINDOWS = {'7d': 7, '30d': 30, '90d': 90, 'all': None}
+DEFAULT_WINDOW = 'all'
+
+leaderboard_cache = TTLCache(ttl=LEADERBOARD_TTL, max_size=64)
+
+
+def _driver_sources(start_day, use_rollups):
+    if use_rollups:
+        query = select(
+            DailyDriverStats.driver_id.label('entity_id'),
+            func.sum(DailyDriverStats.trips_completed).label('trips'),
+            money_sum(DailyDriverStats.earnings).label('earnings')
+        ).group_by(DailyDriverStats.driver_id)
+        if start_day:
+            query = query.where(DailyDriverStats.day >= start_day)
+        return [query.subquery()]
+
+    trips = select(Trip.driver_id.label('entity_id'), func.count(Trip.id).label('trips'))\
+        .where(Trip.status == 'concluida')\
+        .group_by(Trip.driver_id)
+    earnings = select(Payment.driver_id.label('entity_id'), money_sum(Payment.valor_motorista).label('earnings'))\
+        .where(Payment.status_pagamento == 'aprovado')\
+        .group_by(Payment.driver_id)
+    if start_day:
+        start = datetime.combine(start_day, datetime.min.time())
+        trips = trips.where(Trip.data_fim >= start)
+        earnings = earnings.where(Payment.data_pagamento >= start)
+    return [trips.subquery(), earnings.subquery()]
+
+
+def _company_sources(start_day, use_rollups):
+    if use_rollups:
+        query = select(
+            DailyCompanyStats.company_id.label('entity_id'),
+            func.sum(DailyCompanyStats.services_created).label('services'),
+            money_sum(DailyCompanyStats.revenue).label('revenue')
+        ).group_by(DailyCompanyStats.company_id)
+        if start_day:
+            query = query.where(DailyCompanyStats.day >= start_day)
+        return [query.subquery()]
+
+    services = select(Service.company_id.label('entity_id'), func.count(Service.id).label('services'))\
+        .group_by(Service.company_id)
+    revenue = select(Payment.company_id.label('entity_id'), money_sum(Payment.valor_total).label('revenue'))\
+        .where(Payment.status_pagamento == 'aprovado')\
+        .group_by(Payment.company_id)
+    if start_day:
+        start = datetime.combine(start_day, datetime.min.time())
+        services = services.where(Service.data_solicitacao >= start)
+        revenue = revenue.where(Payment.data_pagamento >= start)
+    return [services.subquery(), revenue.subquery()]
+
+
+def _ranked(model, columns, sources, metrics):
+    """Junta as subconsultas (já agregadas) ao cadastro e ordena pelas métricas"""
+    def metric(name):
+        for source in sources:
+            if name in source.c:
+                return func.coalesce(source.c[name], 0)
+
+    query = db.session.query(*columns, *[metric(name).label(name) for name in metrics])
+    for source in sources:
+        query = query.outerjoin(source, source.c.entity_id == model.id)
+
+    return query.filter(db.or_(*[source.c.entity_id.isnot(None) for source in sources]))\
+        .order_by(*[metric(name).desc() for name in metrics], model.id)\
+        .limit(LEADERBOARD_SIZE)\
+        .all()
+
+
+def compute_driver_leaderboard(start_day=None, use_rollups=True):
+    rows = _ranked(
+        Driver, [Driver.id, Driver.nome, Driver.avaliacao],
+        _driver_sources(start_day, use_rollups), ['trips', 'earnings']
+    )
+    return [{
+        'id': row.id,
+        'name': row.nome,
+        'trips': int(row.trips),
+        'earnings': float(row.earnings),
+        'rating': float(row.avaliacao or 0)
+    } for row in rows]
+
+
+def compute_company_leaderboard(start_day=None, use_rollups=True):
+    rows = _ranked(
+        Company, [Company.id, Company.nome],
+        _company_sources(start_day, use_rollups), ['services', 'revenue']
+    )
+    return [{
+        'id': row.id,
+        'name': row.nome,
+        'services': int(row.services),
+        'revenue': float(row.revenue)
+    } for row in rows]
+
+
+LEADERBOARDS = {
+    'drivers': compute_driver_leaderboard,
+    'companies': compute_company_leaderboard,
+}
+
+
+def window_start(window, today=None):
+    """Primeiro dia da janela (None = todo o histórico); levanta ValueError para janela inválida"""
+    if window not in LEADERBOARD_WINDOWS:
+        raise ValueError(f'Janela inválida. Use: {", ".join(LEADERBOARD_WINDOWS)}')
+    today = today or datetime.utcnow().date()
+    days = LEADERBOARD_WINDOWS[window]
+    return today - timedelta(days=days - 1) if days else None
+
+
+def clamp_limit(limit):
+    return max(1, min(limit, LEADERBOARD_SIZE))
+
+
+def get_leaderboard(kind, window=DEFAULT_WINDOW, limit=10):
+    """Ranking em cache; levanta ValueError para janela inválida"""
+    today = datetime.utcnow().date()
+    start_day = window_start(window, today)
+    watermark = rollup_watermark()
+
+    key = (kind, window, today, watermark)
+    ranking = leaderboard_cache.get_or_set(
+        key, lambda: LEADERBOARDS[kind](start_day, use_rollups=watermark is not None)
+    )
+    return ranking[:clamp_limit(limit)]
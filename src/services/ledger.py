@@ -0,0 +1,236 @@
+"""
+Livro razão de partidas dobradas.
+
+Cada evento financeiro gera um conjunto de lançamentos (journal) cuja soma de
+débitos é igual à soma de créditos. Contas:
+
+- ('company', id)  empresa que paga o serviço
+- ('driver', id)   motorista; saldo positivo = valor a receber
+- ('platform', 0)  receita de comissão da plataforma
+- ('bank', 0)      saída de caixa para repasses
+
+Eventos:
+
+- pagamento aprovado: empresa D valor_total / motorista C valor_motorista /
+  plataforma C valor_comissao
+- repasse pago: motorista D valor_liquido / banco C valor_liquido
+
+Os lançamentos e o saldo materializado de cada conta (account_balances) são
+gravados na sessão atual; quem chama faz o commit junto com o evento de origem.
+
+Uso: python -m src.services.ledger --backfill
+"""
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.ledger import LedgerEntry, AccountBalance
+from src.models.payment import Payment, DriverEarning
+from src.utils.money import to_cents, from_cents
+
+PLATFORM_ACCOUNT = ('platform', 0)
+BANK_ACCOUNT = ('bank', 0)
+
+
+class UnbalancedJournalError(ValueError):
+    pass
+
+
+def payment_journal(payment):
+    """Lançamentos de um pagamento aprovado"""
+    return {
+        'journal_key': f'payment_approved:{payment.id}',
+        'entry_type': 'payment_approved',
+        'payment_id': payment.id,
+        'lines': [
+            ('company', payment.company_id, payment.valor_total, 0.0),
+            ('driver', payment.driver_id, 0.0, payment.valor_motorista),
+            (PLATFORM_ACCOUNT[0], PLATFORM_ACCOUNT[1], 0.0, payment.valor_comissao)
+        ],
+        'description': f'Pagamento {payment.id} aprovado'
+    }
+
+
+def payout_journal(earning_id, driver_id, valor_liquido, payment_id=None):
+    """Lançamentos de um repasse pago ao motorista"""
+    return {
+        'journal_key': f'driver_payout:{earning_id}',
+        'entry_type': 'driver_payout',
+        'payment_id': payment_id,
+        'driver_earning_id': earning_id,
+        'lines': [
+            ('driver', driver_id, valor_liquido, 0.0),
+            (BANK_ACCOUNT[0], BANK_ACCOUNT[1], 0.0, valor_liquido)
+        ],
+        'description': f'Repasse do ganho {earning_id}'
+    }
+
+
+def post_journals(journals):
+    """Grava os lançamentos e atualiza os saldos na sessão atual.
+
+    Journals já lançados (mesma journal_key) são ignorados. Retorna a
+    quantidade de journals efetivamente gravados.
+    """
+    if not journals:
+        return 0
+
+    for journal in journals:
+        debits = sum(to_cents(line[2]) for line in journal['lines'])
+        credits = sum(to_cents(line[3]) for line in journal['lines'])
+        if debits != credits:
+            raise UnbalancedJournalError(
+                f"Lançamento {journal['journal_key']} desbalanceado: D {debits / 100:.2f} / C {credits / 100:.2f}"
+            )
+
+    keys = [journal['journal_key'] for journal in journals]
+    posted = {
+        row.journal_key for row in
+        db.session.query(LedgerEntry.journal_key).filter(LedgerEntry.journal_key.in_(keys)).distinct()
+    }
+
+    now = datetime.utcnow()
+    entries = []
+    deltas = defaultdict(lambda: [0, 0, 0])  # débitos e créditos em centavos, quantidade
+    for journal in journals:
+        if journal['journal_key'] in posted:
+            continue
+        posted.add(journal['journal_key'])
+        for account_type, account_id, debit, credit in journal['lines']:
+            entries.append({
+                'journal_key': journal['journal_key'],
+                'entry_type': journal['entry_type'],
+                'account_type': account_type,
+                'account_id': account_id,
+                'debit': debit,
+                'credit': credit,
+                'payment_id': journal.get('payment_id'),
+                'driver_earning_id': journal.get('driver_earning_id'),
+                'description': journal.get('description'),
+                'created_at': now
+            })
+            delta = deltas[(account_type, account_id)]
+            delta[0] += to_cents(debit)
+            delta[1] += to_cents(credit)
+            delta[2] += 1
+
+    if not entries:
+        return 0
+
+    db.session.execute(LedgerEntry.__table__.insert(), entries)
+    apply_balance_deltas(deltas)
+    return len({entry['journal_key'] for entry in entries})
+
+
+def ensure_balance_rows(accounts):
+    """Cria as linhas de saldo que ainda não existem"""
+    existing = set()
+    for account_type in {account_type for account_type, _ in accounts}:
+        ids = [account_id for kind, account_id in accounts if kind == account_type]
+        rows = db.session.query(AccountBalance.account_id).filter(
+            AccountBalance.account_type == account_type,
+            AccountBalance.account_id.in_(ids)
+        )
+        existing.update((account_type, row.account_id) for row in rows)
+
+    for account_type, account_id in set(accounts) - existing:
+        try:
+            with db.session.begin_nested():
+                db.session.add(AccountBalance(account_type=account_type, account_id=account_id))
+        except IntegrityError:
+            # Criada por outra transação
+            pass
+
+
+def apply_balance_deltas(deltas):
+    """Soma os débitos/créditos aos saldos com UPDATE atômico (saldo = saldo + delta)"""
+    ensure_balance_rows(list(deltas))
+    for (account_type, account_id), (debit_cents, credit_cents, count) in deltas.items():
+        debit, credit = from_cents(debit_cents), from_cents(credit_cents)
+        change = from_cents(credit_cents - debit_cents)
+        AccountBalance.query.filter_by(account_type=account_type, account_id=account_id).update({
+            AccountBalance.balance: AccountBalance.balance + change,
+            AccountBalance.total_debits: AccountBalance.total_debits + debit,
+            AccountBalance.total_credits: AccountBalance.total_credits + credit,
+            AccountBalance.entry_count: AccountBalance.entry_count + count
+        }, synchronize_session=False)
+
+
+def post_payment_approved(payment):
+    return post_journals([payment_journal(payment)])
+
+
+def get_balance(account_type, account_id):
+    """Saldo da conta por busca pontual no índice"""
+    balance = AccountBalance.query.filter_by(account_type=account_type, account_id=account_id).first()
+    if balance is None:
+        return AccountBalance(account_type=account_type, account_id=account_id,
+                              balance=0.0, total_debits=0.0, total_credits=0.0, entry_count=0)
+    return balance
+
+
+def get_statement(account_type, account_id, start_date=None, end_date=None, cursor=None, limit=50):
+    """Extrato da conta, do lançamento mais recente para o mais antigo"""
+    query = LedgerEntry.query.filter(
+        LedgerEntry.account_type == account_type,
+        LedgerEntry.account_id == account_id
+    )
+    if start_date:
+        query = query.filter(LedgerEntry.created_at >= start_date)
+    if end_date:
+        query = query.filter(LedgerEntry.created_at <= end_date)
+    if cursor:
+        query = query.filter(LedgerEntry.id < cursor)
+
+    entries = query.order_by(LedgerEntry.id.desc()).limit(limit + 1).all()
+    next_cursor = entries[limit - 1].id if len(entries) > limit else None
+    return entries[:limit], next_cursor
+
+
+def backfill_ledger(batch_size=1000):
+    """Lança pagamentos aprovados e repasses pagos que ainda não estão no razão"""
+    totals = {'payments': 0, 'payouts': 0}
+
+    last_id = 0
+    while True:
+        payments = Payment.query.filter(
+            Payment.status_pagamento == 'aprovado',
+            Payment.id > last_id
+        ).order_by(Payment.id).limit(batch_size).all()
+        if not payments:
+            break
+        totals['payments'] += post_journals([payment_journal(payment) for payment in payments])
+        db.session.commit()
+        last_id = payments[-1].id
+
+    last_id = 0
+    while True:
+        earnings = db.session.query(
+            DriverEarning.id, DriverEarning.driver_id, DriverEarning.valor_liquido, DriverEarning.payment_id
+        ).filter(
+            DriverEarning.status_repasse == 'pago',
+            DriverEarning.id > last_id
+        ).order_by(DriverEarning.id).limit(batch_size).all()
+        if not earnings:
+            break
+        totals['payouts'] += post_journals([
+            payout_journal(row.id, row.driver_id, row.valor_liquido, row.payment_id) for row in earnings
+        ])
+        db.session.commit()
+        last_id = earnings[-1].id
+
+    return totals
+
+
+if __name__ == '__main__':
+    import argparse
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description='Livro razão do DriverConnect')
+    parser.add_argument('--backfill', action='store_true', help='Lançar o histórico existente')
+    args = parser.parse_args()
+
+    if args.backfill:
+        with app.app_context():
+            totals = backfill_ledger()
+            print(f"✅ {totals['payments']} pagamentos e {totals['payouts']} repasses lançados")
@@ -0,0 +1,234 @@
+"""
+Outbox transacional da conclusão de viagens.
+
+`complete_trip` grava apenas um OutboxEvent ('trip_completed') no mesmo commit
+que conclui o serviço. Este consumidor, em segundo plano, lê os eventos
+pendentes em lotes e cria Payment, Commission e DriverEarning (e os
+lançamentos do livro razão) numa única transação por lote.
+
+- Reprocessar é seguro: serviços que já têm Payment são apenas marcados como
+  processados.
+- Se um lote falha, os eventos são reprocessados um a um; o que continuar
+  falhando é reagendado com backoff e, após MAX_ATTEMPTS, fica em 'erro'.
+
+Uso: python -m src.services.outbox (processa todos os pendentes e sai)
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from src.models.user import db
+from src.models.outbox import OutboxEvent
+from src.models.payment import Payment, Commission, DriverEarning
+from src.services.ledger import payment_journal, post_journals
+
+TRIP_COMPLETED = 'trip_completed'
+
+BATCH_SIZE = 200
+POLL_INTERVAL = 2  # segundos
+MAX_ATTEMPTS = 8
+MAX_BACKOFF = timedelta(hours=1)
+
+DEFAULT_PAYMENT_METHOD = 'boleto'
+
+
+def trip_completed_event(service, metodo_pagamento=None):
+    """Evento de conclusão de viagem (adicionado à sessão do chamador)"""
+    payload = {
+        'service_id': service.id,
+        'company_id': service.company_id,
+        'customer_id': service.customer_id,
+        'driver_id': service.driver_id,
+        'valor_total': service.valor_final,
+        'valor_comissao': service.valor_comissao,
+        'valor_motorista': service.valor_motorista,
+        'comissao_plataforma': service.comissao_plataforma,
+        'metodo_pagamento': metodo_pagamento or DEFAULT_PAYMENT_METHOD,
+        'data_conclusao': service.data_conclusao.isoformat() if service.data_conclusao else None
+    }
+    event = OutboxEvent(
+        event_type=TRIP_COMPLETED,
+        aggregate_id=service.id,
+        payload=json.dumps(payload, separators=(',', ':'))
+    )
+    db.session.add(event)
+    return event
+
+
+def materialize(events):
+    """Cria os registros financeiros dos eventos na sessão atual"""
+    now = datetime.utcnow()
+    payloads = {event.id: json.loads(event.payload) for event in events}
+
+    service_ids = [payload['service_id'] for payload in payloads.values()]
+    already_paid = {
+        row.service_id for row in
+        db.session.query(Payment.service_id).filter(Payment.service_id.in_(service_ids))
+    }
+
+    created = []
+    ignored = []
+    for event in events:
+        payload = payloads[event.id]
+        if event.event_type != TRIP_COMPLETED or not payload.get('company_id'):
+            # Serviços de pessoa física não geram Payment (company_id obrigatório)
+            ignored.append(event.id)
+            continue
+        if payload['service_id'] in already_paid:
+            continue
+        already_paid.add(payload['service_id'])
+
+        data = datetime.fromisoformat(payload['data_conclusao']) if payload.get('data_conclusao') else now
+        payment = Payment(
+            service_id=payload['service_id'],
+            company_id=payload['company_id'],
+            driver_id=payload['driver_id'],
+            customer_id=payload.get('customer_id'),
+            valor_total=payload['valor_total'],
+            valor_comissao=payload['valor_comissao'],
+            valor_motorista=payload['valor_motorista'],
+            metodo_pagamento=payload['metodo_pagamento'],
+            status_pagamento='aprovado',
+            data_pagamento=data,
+            data_aprovacao=now
+        )
+        created.append((payment, payload, data))
+
+    db.session.add_all([payment for payment, _, _ in created])
+    db.session.flush()
+
+    for payment, payload, data in created:
+        db.session.add(Commission(
+            payment_id=payment.id,
+            company_id=payment.company_id,
+            valor_comissao=payment.valor_comissao,
+            percentual_comissao=(payload.get('comissao_plataforma') or 0) * 100,
+            valor_servico=payment.valor_total,
+            status='processada',
+            data_comissao=data,
+            data_processamento=now
+        ))
+        db.session.add(DriverEarning(
+            driver_id=payment.driver_id,
+            payment_id=payment.id,
+            service_id=payment.service_id,
+            valor_bruto=payment.valor_total,
+            valor_comissao=payment.valor_comissao,
+            valor_liquido=payment.valor_motorista,
+            data_ganho=data
+        ))
+
+    post_journals([payment_journal(payment) for payment, _, _ in created])
+
+    event_ids = [event.id for event in events]
+    processed_ids = [event_id for event_id in event_ids if event_id not in ignored]
+    if processed_ids:
+        OutboxEvent.query.filter(OutboxEvent.id.in_(processed_ids)).update({
+            OutboxEvent.status: 'processado',
+            OutboxEvent.attempts: OutboxEvent.attempts + 1,
+            OutboxEvent.last_error: None,
+            OutboxEvent.processed_at: now
+        }, synchronize_session=False)
+    if ignored:
+        OutboxEvent.query.filter(OutboxEvent.id.in_(ignored)).update({
+            OutboxEvent.status: 'ignorado',
+            OutboxEvent.processed_at: now
+        }, synchronize_session=False)
+
+    return len(created)
+
+
+def _pending_query(now):
+    return OutboxEvent.query.filter(
+        OutboxEvent.status == 'pendente',
+        OutboxEvent.available_at <= now
+    )
+
+
+def _process_single(event_id):
+    now = datetime.utcnow()
+    event = _pending_query(now).filter(OutboxEvent.id == event_id).with_for_update().first()
+    if event is None:
+        db.session.rollback()
+        return
+
+    try:
+        materialize([event])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        event = OutboxEvent.query.get(event_id)
+        event.attempts = (event.attempts or 0) + 1
+        event.last_error = str(e)[:2000]
+        event.available_at = now + min(timedelta(seconds=10 * 2 ** event.attempts), MAX_BACKOFF)
+        if event.attempts >= MAX_ATTEMPTS:
+            event.status = 'erro'
+        db.session.commit()
+
+
+def process_outbox_batch(batch_size=BATCH_SIZE):
+    """Processa um lote de eventos pendentes; retorna quantos foram lidos"""
+    events = _pending_query(datetime.utcnow())\
+        .order_by(OutboxEvent.id)\
+        .limit(batch_size)\
+        .with_for_update()\
+        .all()
+    if not events:
+        db.session.rollback()
+        return 0
+
+    event_ids = [event.id for event in events]
+    try:
+        materialize(events)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # Isolar o evento com problema sem travar os demais
+        for event_id in event_ids:
+            _process_single(event_id)
+
+    return len(event_ids)
+
+
+def drain_outbox(batch_size=BATCH_SIZE):
+    total = 0
+    while True:
+        count = process_outbox_batch(batch_size)
+        total += count
+        if count < batch_size:
+            return total
+
+
+def outbox_stats():
+    rows = db.session.query(OutboxEvent.status, db.func.count(OutboxEvent.id))\
+        .group_by(OutboxEvent.status).all()
+    return {status: count for status, count in rows}
+
+
+def start_outbox_consumer(socketio, app, poll_interval=POLL_INTERVAL):
+    """Consumidor contínuo em segundo plano (desligue com OUTBOX_CONSUMER=0)"""
+    if os.environ.get('OUTBOX_CONSUMER', '1') == '0':
+        return None
+
+    def consumer():
+        while True:
+            try:
+                with app.app_context():
+                    try:
+                        count = drain_outbox()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"❌ Erro no consumidor do outbox: {e}")
+                count = 0
+            if not count:
+                socketio.sleep(poll_interval)
+
+    return socketio.start_background_task(consumer)
+
+
+if __name__ == '__main__':
+    from src.main import app
+
+    with app.app_context():
+        total = drain_outbox()
+        print(f"✅ {total} eventos processados - {outbox_stats()}")
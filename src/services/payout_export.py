@@ -0,0 +1,227 @@
+"""
+Arquivo de remessa de repasses para o banco.
+
+Os ganhos são lidos com um cursor no servidor (stream_results + yield_per) e
+o arquivo é gerado por geradores, linha a linha, então a memória usada não
+depende do tamanho do lote. Formatos:
+
+- csv: uma linha por ganho, com cabeçalho;
+- cnab: layout de largura fixa no estilo CNAB 240 (registro header,
+  detalhes e trailer com quantidade e total em centavos).
+
+Campos numéricos do CNAB nunca são truncados nem preenchidos a partir de
+texto: banco, agência, conta ou CPF que não sejam numéricos ou não caibam
+na largura do campo tornam o ganho inválido (invalid_cnab_rows), e
+format_record levanta InvalidRecordError em vez de gerar a linha.
+"""
+import unicodedata
+from datetime import datetime
+from src.models.user import db
+from src.models.driver import Driver
+from src.models.payment import DriverEarning
+from src.utils.money import to_cents
+from src.utils.streaming import chunked, iter_csv
+
+FETCH_SIZE = 1000
+MAX_REPORTED_INVALID = 100
+
+# Pontuação aceita em campos numéricos (ex.: CPF 123.456.789-00)
+NUMERIC_SEPARATORS = '.-/ '
+
+PAYER_NAME = 'DRIVERCONNECT'
+CNAB_RECORD_LENGTH = 240
+
+CSV_COLUMNS = [
+    'earning_id', 'driver_id', 'nome', 'cpf', 'banco', 'agencia', 'conta',
+    'tipo_conta', 'valor_liquido', 'data_ganho'
+]
+
+# (campo, largura, tipo) - 'N' numérico com zeros à esquerda, 'A' alfanumérico com espaços à direita
+CNAB_HEADER = [
+    ('record_type', 1, 'N'),
+    ('payer_name', 30, 'A'),
+    ('generated_at', 14, 'N'),
+    ('file_sequence', 6, 'N'),
+    ('layout', 3, 'A'),
+]
+CNAB_DETAIL = [
+    ('record_type', 1, 'N'),
+    ('sequence', 6, 'N'),
+    ('earning_id', 10, 'N'),
+    ('banco', 3, 'N'),
+    ('agencia', 5, 'N'),
+    ('conta', 12, 'N'),
+    ('conta_dv', 1, 'A'),
+    ('tipo_conta', 2, 'A'),
+    ('cpf', 11, 'N'),
+    ('nome', 30, 'A'),
+    ('valor_cents', 15, 'N'),
+    ('data_ganho', 8, 'N'),
+]
+CNAB_TRAILER = [
+    ('record_type', 1, 'N'),
+    ('record_count', 6, 'N'),
+    ('total_cents', 18, 'N'),
+]
+
+
+class InvalidRecordError(ValueError):
+    pass
+
+
+def iter_earnings(status='pendente', cutoff=None):
+    """Ganhos com dados bancários e do motorista, em ordem de id, via cursor no servidor"""
+    query = db.select(
+        DriverEarning.id, DriverEarning.driver_id, Driver.nome, Driver.cpf,
+        DriverEarning.banco, DriverEarning.agencia, DriverEarning.conta, DriverEarning.tipo_conta,
+        DriverEarning.valor_liquido, DriverEarning.data_ganho
+    ).join(Driver, Driver.id == DriverEarning.driver_id)\
+     .where(DriverEarning.status_repasse == status)\
+     .order_by(DriverEarning.id)
+    if cutoff is not None:
+        query = query.where(DriverEarning.data_ganho <= cutoff)
+
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=FETCH_SIZE))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def generate_csv(rows):
+    return chunked(iter_csv(CSV_COLUMNS, (
+        [
+            row.id, row.driver_id, row.nome, row.cpf, row.banco or '', row.agencia or '',
+            row.conta or '', row.tipo_conta or '', f'{row.valor_liquido:.2f}',
+            row.data_ganho.isoformat() if row.data_ganho else ''
+        ]
+        for row in rows
+    )))
+
+
+def _ascii(value):
+    value = unicodedata.normalize('NFKD', str(value or ''))
+    return ''.join(char for char in value if not unicodedata.combining(char)).upper()
+
+
+def _numeric(name, value, width):
+    """Dígitos do valor sem a pontuação; levanta InvalidRecordError se não couber no campo"""
+    if isinstance(value, int):
+        if value < 0:
+            raise InvalidRecordError(f'{name}: valor negativo ({value})')
+        digits = str(value)
+    else:
+        digits = ''.join(char for char in str(value or '') if char not in NUMERIC_SEPARATORS)
+    if digits and not (digits.isascii() and digits.isdigit()):
+        raise InvalidRecordError(f'{name}: valor não numérico ({value})')
+    if len(digits) > width:
+        raise InvalidRecordError(f'{name}: mais de {width} dígitos ({value})')
+    return digits
+
+
+def format_record(layout, values):
+    """Monta um registro de largura fixa (completado até CNAB_RECORD_LENGTH)"""
+    parts = []
+    for name, width, kind in layout:
+        value = values.get(name)
+        if kind == 'N':
+            parts.append(_numeric(name, value, width).rjust(width, '0'))
+        else:
+            parts.append(_ascii(value)[:width].ljust(width))
+    return ''.join(parts).ljust(CNAB_RECORD_LENGTH)[:CNAB_RECORD_LENGTH] + '\r\n'
+
+
+def split_account(conta):
+    """'56789-0' -> ('56789', '0')"""
+    conta = str(conta or '').strip()
+    if '-' in conta:
+        number, digit = conta.rsplit('-', 1)
+        return number, digit.strip()
+    return conta, ''
+
+
+def _detail_values(row, sequence):
+    conta, conta_dv = split_account(row.conta)
+    return {
+        'record_type': 3,
+        'sequence': sequence,
+        'earning_id': row.id,
+        'banco': row.banco,
+        'agencia': row.agencia,
+        'conta': conta,
+        'conta_dv': conta_dv,
+        'tipo_conta': 'PP' if row.tipo_conta == 'poupanca' else 'CC',
+        'cpf': row.cpf,
+        'nome': row.nome,
+        'valor_cents': to_cents(row.valor_liquido),
+        'data_ganho': row.data_ganho.strftime('%Y%m%d') if row.data_ganho else ''
+    }
+
+
+def cnab_errors(row):
+    """Problemas dos dados bancários de um ganho para a remessa (lista vazia = válido)"""
+    values = _detail_values(row, 1)
+    errors = []
+    for name in ('banco', 'agencia', 'conta', 'cpf'):
+        if not str(values[name] or '').strip():
+            errors.append(f'{name}: não informado')
+    conta_dv = values['conta_dv']
+    if len(conta_dv) > 1 or (conta_dv and not (conta_dv.isascii() and conta_dv.isalnum())):
+        errors.append(f'conta_dv: dígito verificador inválido ({conta_dv})')
+    for name, width, kind in CNAB_DETAIL:
+        if kind == 'N':
+            try:
+                _numeric(name, values[name], width)
+            except InvalidRecordError as e:
+                errors.append(str(e))
+    return errors
+
+
+def invalid_cnab_rows(rows, limit=MAX_REPORTED_INVALID):
+    """(quantidade, até `limit` ganhos inválidos com os problemas de cada um)"""
+    count = 0
+    invalid = []
+    for row in rows:
+        errors = cnab_errors(row)
+        if errors:
+            count += 1
+            if len(invalid) < limit:
+                invalid.append({'earning_id': row.id, 'driver_id': row.driver_id, 'errors': errors})
+    return count, invalid
+
+
+def generate_cnab(rows, file_sequence=1):
+    def lines():
+        yield format_record(CNAB_HEADER, {
+            'record_type': 0,
+            'payer_name': PAYER_NAME,
+            'generated_at': datetime.utcnow().strftime('%Y%m%d%H%M%S'),
+            'file_sequence': file_sequence,
+            'layout': '240'
+        })
+
+        count = 0
+        total_cents = 0
+        for row in rows:
+            errors = cnab_errors(row)
+            if errors:
+                raise InvalidRecordError(f'Ganho {row.id}: ' + '; '.join(errors))
+            count += 1
+            values = _detail_values(row, count)
+            total_cents += values['valor_cents']
+            yield format_record(CNAB_DETAIL, values)
+
+        yield format_record(CNAB_TRAILER, {
+            'record_type': 9,
+            'record_count': count,
+            'total_cents': total_cents
+        })
+
+    return chunked(lines())
+
+
+EXPORT_FORMATS = {
+    'csv': (generate_csv, 'text/csv', 'csv'),
+    'cnab': (generate_cnab, 'text/plain', 'rem'),
+}
@@ -0,0 +1,141 @@
+"""
+Processamento de repasses (transferências) para motoristas em segundo plano.
+
+Os ganhos pendentes são percorridos em ordem de id, em lotes de tamanho fixo
+(keyset: id > último id processado). Cada lote é travado, atualizado com um
+único UPDATE e confirmado junto com o checkpoint do job, de modo que:
+
+- a memória usada é limitada ao tamanho do lote;
+- um job interrompido continua do último lote confirmado;
+- reexecutar é seguro: só ganhos ainda 'pendente' são pagos;
+- os lançamentos do livro razão entram na mesma transação do lote.
+
+Uso: python -m src.services.payouts [--resume JOB_ID]
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from src.models.user import db
+from src.models.payment import DriverEarning, PayoutJob
+from src.services.jobs import get_or_create_job, run_job, start_job_in_background
+from src.services.ledger import payout_journal, post_journals
+from src.utils.money import money_sum, sum_money
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+def create_payout_job(transfer_delay_hours, chunk_size=DEFAULT_CHUNK_SIZE):
+    job = PayoutJob(
+        status='pendente',
+        cutoff_time=datetime.utcnow() - timedelta(hours=transfer_delay_hours),
+        chunk_size=chunk_size
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def get_or_create_payout_job(transfer_delay_hours, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Novo job de repasses; levanta JobConflictError se já houver um não concluído.
+
+    O corte de um job interrompido é sempre anterior ao de um pedido novo,
+    então ele não é retomado implicitamente (use a retomada explícita).
+    """
+    return get_or_create_job(
+        PayoutJob,
+        lambda job: False,
+        lambda: create_payout_job(transfer_delay_hours, chunk_size)
+    )
+
+
+def process_chunk(job):
+    """Processa um lote e grava o checkpoint na mesma transação.
+
+    Retorna o número de ganhos lidos no lote (0 quando não há mais nada).
+    """
+    rows = db.session.query(
+        DriverEarning.id, DriverEarning.driver_id, DriverEarning.valor_liquido, DriverEarning.payment_id
+    ).filter(
+        DriverEarning.status_repasse == 'pendente',
+        DriverEarning.data_ganho <= job.cutoff_time,
+        DriverEarning.id > job.last_earning_id
+    ).order_by(DriverEarning.id)\
+     .limit(job.chunk_size)\
+     .with_for_update()\
+     .all()
+
+    if not rows:
+        return 0
+
+    ids = [row.id for row in rows]
+    now = datetime.utcnow()
+
+    paid = DriverEarning.query.filter(
+        DriverEarning.id.in_(ids),
+        DriverEarning.status_repasse == 'pendente'
+    ).update({
+        DriverEarning.status_repasse: 'pago',
+        DriverEarning.data_repasse: now
+    }, synchronize_session=False)
+
+    post_journals([
+        payout_journal(row.id, row.driver_id, row.valor_liquido, row.payment_id) for row in rows
+    ])
+
+    job.last_earning_id = ids[-1]
+    job.processed_count = (job.processed_count or 0) + paid
+    job.total_amount = sum_money([job.total_amount or 0] + [row.valor_liquido for row in rows])
+    job.chunks_done = (job.chunks_done or 0) + 1
+    job.heartbeat_at = now
+    db.session.commit()
+
+    return len(rows)
+
+
+def run_payout_job(job_id):
+    """Executa (ou retoma) o job até não restarem ganhos elegíveis"""
+    def work(job):
+        while process_chunk(job):
+            pass
+
+    return run_job(PayoutJob, job_id, work)
+
+
+def start_payout_job_in_background(job_id):
+    return start_job_in_background(run_payout_job, job_id, 'payout-job')
+
+
+def remaining_earnings(job):
+    """Quantidade e valor ainda elegíveis para o job (para o progresso)"""
+    count, amount = db.session.query(
+        func.count(DriverEarning.id),
+        money_sum(DriverEarning.valor_liquido)
+    ).filter(
+        DriverEarning.status_repasse == 'pendente',
+        DriverEarning.data_ganho <= job.cutoff_time,
+        DriverEarning.id > job.last_earning_id
+    ).one()
+    return count, amount
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from src.main import app
+    from src.services.commission_settings import get_commission_settings
+    from src.services.jobs import JobConflictError
+
+    parser = argparse.ArgumentParser(description='Processamento de repasses')
+    parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Retomar um job interrompido ou com erro')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.resume:
+            job_id = args.resume
+        else:
+            try:
+                job_id = get_or_create_payout_job(get_commission_settings()['transfer_delay']).id
+            except JobConflictError as e:
+                print(f"❌ Job {e.job.id} não concluído ({e.job.status}); use --resume {e.job.id}")
+                sys.exit(1)
+        job = run_payout_job(job_id)
+        print(f"✅ Job {job.id}: {job.status} - {job.processed_count} repasses, R$ {job.total_amount:.2f}")
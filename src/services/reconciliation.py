@@ -0,0 +1,199 @@
+"""
+Conciliação financeira dos pagamentos aprovados.
+
+Para cada pagamento aprovado deve existir exatamente uma Commission e um
+DriverEarning, com valores que batem com o pagamento. As verificações são
+feitas no banco, em conjunto (anti-joins e agregações por payment_id), com
+INSERT ... SELECT direto na tabela de divergências:
+
+- missing_commission / missing_earning: pagamento sem o registro;
+- duplicate_commission / duplicate_earning: mais de um registro;
+- commission_amount: Commission.valor_comissao != Payment.valor_comissao;
+- earning_amount: DriverEarning.valor_liquido != Payment.valor_motorista;
+- payment_split: valor_comissao + valor_motorista != valor_total.
+
+O período é processado em faixas de data_pagamento; cada faixa é confirmada
+junto com o checkpoint, então uma execução interrompida continua de onde parou
+(implicitamente só para o mesmo período; com erro, só com --resume).
+
+Uso: python -m src.services.reconciliation [--start AAAA-MM-DD] [--end AAAA-MM-DD] [--resume RUN_ID]
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, literal, insert, select
+from src.models.user import db
+from src.models.payment import Payment, Commission, DriverEarning
+from src.models.reconciliation import ReconciliationRun, ReconciliationMismatch
+from src.services.jobs import get_or_create_job, run_job, start_job_in_background
+
+DEFAULT_CHUNK_HOURS = 24
+
+MISMATCH_COLUMNS = ['run_id', 'payment_id', 'mismatch_type', 'expected_value', 'actual_value', 'created_at']
+
+
+def default_period():
+    """Dia anterior completo (execução noturna)"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=1), today
+
+
+def create_run(start_date, end_date, chunk_hours=DEFAULT_CHUNK_HOURS):
+    run = ReconciliationRun(
+        status='pendente',
+        start_date=start_date,
+        end_date=end_date,
+        chunk_hours=chunk_hours,
+        checkpoint_date=start_date
+    )
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def get_or_create_run(start_date, end_date, chunk_hours=DEFAULT_CHUNK_HOURS):
+    """Retoma a execução interrompida do mesmo período ou cria outra.
+
+    Levanta JobConflictError se houver uma execução em andamento ou
+    interrompida de outro período.
+    """
+    return get_or_create_job(
+        ReconciliationRun,
+        lambda run: run.start_date == start_date and run.end_date == end_date,
+        lambda: create_run(start_date, end_date, chunk_hours)
+    )
+
+
+def _chunk_filter(chunk_start, chunk_end):
+    return (
+        Payment.status_pagamento == 'aprovado',
+        Payment.data_pagamento >= chunk_start,
+        Payment.data_pagamento < chunk_end
+    )
+
+
+def _per_payment(model, amount_column, conditions):
+    """Quantidade e soma por payment_id, restrita aos pagamentos da faixa"""
+    return select(
+        model.payment_id.label('payment_id'),
+        func.count(model.id).label('records'),
+        func.sum(amount_column).label('amount')
+    ).join(Payment, Payment.id == model.payment_id)\
+     .where(*conditions)\
+     .group_by(model.payment_id)\
+     .subquery()
+
+
+def _mismatch_select(run_id, now, mismatch_type, expected, actual, source, *where):
+    return select(
+        literal(run_id),
+        Payment.id,
+        literal(mismatch_type),
+        expected,
+        actual,
+        literal(now)
+    ).select_from(source).where(*where)
+
+
+def reconcile_chunk(run_id, chunk_start, chunk_end):
+    """Grava as divergências de uma faixa na sessão atual; retorna (pagamentos, divergências)"""
+    conditions = _chunk_filter(chunk_start, chunk_end)
+    now = datetime.utcnow()
+
+    payments_checked = db.session.query(func.count(Payment.id)).filter(*conditions).scalar()
+    if not payments_checked:
+        return 0, 0
+
+    selects = []
+    for kind, model, amount_column, expected_amount in [
+        ('commission', Commission, Commission.valor_comissao, Payment.valor_comissao),
+        ('earning', DriverEarning, DriverEarning.valor_liquido, Payment.valor_motorista),
+    ]:
+        agg = _per_payment(model, amount_column, conditions)
+        source = db.outerjoin(Payment.__table__, agg, agg.c.payment_id == Payment.id)
+        selects.extend([
+            # Anti-join: pagamento sem registro
+            _mismatch_select(run_id, now, f'missing_{kind}', literal(1), literal(0),
+                             source, *conditions, agg.c.payment_id.is_(None)),
+            _mismatch_select(run_id, now, f'duplicate_{kind}', literal(1), agg.c.records,
+                             source, *conditions, agg.c.records > 1),
+            _mismatch_select(run_id, now, f'{kind}_amount', expected_amount, agg.c.amount,
+                             source, *conditions, agg.c.records == 1, agg.c.amount != expected_amount),
+        ])
+
+    selects.append(_mismatch_select(
+        run_id, now, 'payment_split', Payment.valor_total, Payment.valor_comissao + Payment.valor_motorista,
+        Payment.__table__, *conditions,
+        Payment.valor_comissao + Payment.valor_motorista != Payment.valor_total
+    ))
+
+    mismatches = 0
+    for statement in selects:
+        result = db.session.execute(
+            insert(ReconciliationMismatch).from_select(MISMATCH_COLUMNS, statement)
+        )
+        mismatches += max(result.rowcount or 0, 0)
+
+    return payments_checked, mismatches
+
+
+def run_reconciliation(run_id):
+    """Executa (ou retoma) a conciliação até o fim do período"""
+    def work(run):
+        step = timedelta(hours=run.chunk_hours or DEFAULT_CHUNK_HOURS)
+        while run.checkpoint_date < run.end_date:
+            chunk_end = min(run.checkpoint_date + step, run.end_date)
+            payments_checked, mismatches = reconcile_chunk(run.id, run.checkpoint_date, chunk_end)
+
+            run.checkpoint_date = chunk_end
+            run.payments_checked = (run.payments_checked or 0) + payments_checked
+            run.mismatches_found = (run.mismatches_found or 0) + mismatches
+            run.chunks_done = (run.chunks_done or 0) + 1
+            run.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+    return run_job(ReconciliationRun, run_id, work)
+
+
+def start_reconciliation_in_background(run_id):
+    return start_job_in_background(run_reconciliation, run_id, 'reconciliation')
+
+
+def mismatch_summary(run_id):
+    rows = db.session.query(ReconciliationMismatch.mismatch_type, func.count(ReconciliationMismatch.id))\
+        .filter(ReconciliationMismatch.run_id == run_id)\
+        .group_by(ReconciliationMismatch.mismatch_type)\
+        .all()
+    return {mismatch_type: count for mismatch_type, count in rows}
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+    from src.main import app
+    from src.services.jobs import JobConflictError
+
+    parser = argparse.ArgumentParser(description='Conciliação financeira')
+    parser.add_argument('--start', help='Data inicial (AAAA-MM-DD), padrão: ontem')
+    parser.add_argument('--end', help='Data final exclusiva (AAAA-MM-DD), padrão: hoje')
+    parser.add_argument('--chunk-hours', type=int, default=DEFAULT_CHUNK_HOURS)
+    parser.add_argument('--resume', type=int, metavar='RUN_ID', help='Retomar uma execução interrompida ou com erro')
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.resume:
+            run_id = args.resume
+        else:
+            start_date, end_date = default_period()
+            if args.start:
+                start_date = datetime.fromisoformat(args.start)
+            if args.end:
+                end_date = datetime.fromisoformat(args.end)
+
+            try:
+                run_id = get_or_create_run(start_date, end_date, args.chunk_hours).id
+            except JobConflictError as e:
+                print(f"❌ Conciliação {e.job.id} ({e.job.start_date} a {e.job.end_date}) não concluída; "
+                      f"use --resume {e.job.id}")
+                sys.exit(1)
+        run = run_reconciliation(run_id)
+        print(f"✅ Conciliação {run.id}: {run.status} - {run.payments_checked} pagamentos, "
+              f"{run.mismatches_found} divergências {mismatch_summary(run.id)}")
@@ -0,0 +1,121 @@
+"""
+Exportação do relatório financeiro (pagamentos aprovados de um período).
+
+As linhas vêm de um cursor no servidor (stream_results + yield_per) e são
+enviadas em CSV ou em row groups Parquet (quando o pyarrow está instalado),
+com memória constante. Com group_by (day, company ou driver) a agregação é
+feita no banco e apenas uma linha por grupo é transferida.
+"""
+from datetime import date, datetime
+from sqlalchemy import func
+from src.models.user import db
+from src.models.payment import Payment
+from src.models.company import Company
+from src.models.driver import Driver
+from src.utils.money import money_sum
+from src.utils.streaming import chunked, iter_csv, iter_parquet, parquet_available
+
+FETCH_SIZE = 2000
+
+GROUP_BY_OPTIONS = ('day', 'company', 'driver')
+REPORT_FORMATS = ('csv', 'parquet')
+
+PAYMENT_COLUMNS = [
+    ('payment_id', 'int'), ('service_id', 'int'), ('company_id', 'int'), ('driver_id', 'int'),
+    ('metodo_pagamento', 'str'), ('valor_total', 'float'), ('valor_comissao', 'float'),
+    ('valor_motorista', 'float'), ('data_pagamento', 'timestamp')
+]
+
+AGGREGATE_COLUMNS = [
+    ('payments_count', 'int'), ('services_count', 'int'), ('total_revenue', 'float'),
+    ('total_commission', 'float'), ('total_driver_payments', 'float')
+]
+
+
+def _as_date(value):
+    if isinstance(value, str):  # SQLite retorna DATE() como texto
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def _period_filter(start_date, end_date):
+    return (
+        Payment.status_pagamento == 'aprovado',
+        Payment.data_pagamento >= start_date,
+        Payment.data_pagamento <= end_date
+    )
+
+
+def _stream(query):
+    result = db.session.execute(query.execution_options(stream_results=True, yield_per=FETCH_SIZE))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def financial_report_rows(start_date, end_date, group_by=None):
+    """Retorna (colunas, gerador de tuplas) do relatório"""
+    conditions = _period_filter(start_date, end_date)
+
+    if group_by is None:
+        query = db.select(
+            Payment.id, Payment.service_id, Payment.company_id, Payment.driver_id, Payment.metodo_pagamento,
+            Payment.valor_total, Payment.valor_comissao, Payment.valor_motorista, Payment.data_pagamento
+        ).where(*conditions).order_by(Payment.id)
+        return PAYMENT_COLUMNS, (tuple(row) for row in _stream(query))
+
+    aggregates = [
+        func.count(Payment.id),
+        func.count(func.distinct(Payment.service_id)),
+        money_sum(Payment.valor_total),
+        money_sum(Payment.valor_comissao),
+        money_sum(Payment.valor_motorista)
+    ]
+
+    if group_by == 'day':
+        day = func.date(Payment.data_pagamento)
+        query = db.select(day, *aggregates).where(*conditions).group_by(day).order_by(day)
+        columns = [('day', 'date')] + AGGREGATE_COLUMNS
+        return columns, ((_as_date(row[0]),) + tuple(row[1:]) for row in _stream(query))
+
+    if group_by == 'company':
+        key, model, name_column = Payment.company_id, Company, Company.nome
+    else:
+        key, model, name_column = Payment.driver_id, Driver, Driver.nome
+
+    # Agrupar primeiro e só depois buscar o nome (uma linha por grupo no join)
+    grouped = db.select(key.label('entity_id'), *[aggregate.label(f'a{index}') for index, aggregate in enumerate(aggregates)])\
+        .where(*conditions)\
+        .group_by(key)\
+        .subquery()
+    query = db.select(grouped.c.entity_id, name_column, *[grouped.c[f'a{index}'] for index in range(len(aggregates))])\
+        .join(model, model.id == grouped.c.entity_id)\
+        .order_by(grouped.c.entity_id)
+    columns = [(f'{group_by}_id', 'int'), (f'{group_by}_nome', 'str')] + AGGREGATE_COLUMNS
+    return columns, (tuple(row) for row in _stream(query))
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, float):
+        return f'{value:.2f}'
+    return '' if value is None else value
+
+
+def export_financial_report(start_date, end_date, export_format='csv', group_by=None):
+    """Retorna (gerador do arquivo, mimetype, extensão)"""
+    columns, rows = financial_report_rows(start_date, end_date, group_by)
+
+    if export_format == 'parquet':
+        if not parquet_available():
+            raise RuntimeError('Exportação Parquet indisponível (pyarrow não instalado)')
+        return iter_parquet(columns, rows), 'application/vnd.apache.parquet', 'parquet'
+
+    names = [name for name, _ in columns]
+    lines = iter_csv(names, ([_csv_value(value) for value in row] for row in rows))
+    return chunked(lines), 'text/csv', 'csv'
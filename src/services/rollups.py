@@ -0,0 +1,424 @@
+"""
+Consolidação diária (rollups) por plataforma, empresa e motorista.
+
+Um job de recuperação (catch-up) guarda uma marca d'água em rollup_state.
+A cada execução ele procura linhas de services, trips, payments e
+driver_ratings com updated_at posterior à marca (menos uma margem de
+segurança). A partir delas descobre os dias afetados e recalcula só esses
+dias, com GROUP BY limitado ao próprio dia. As colunas updated_at e as
+datas de evento usadas aqui são indexadas, então cada execução lê só as
+linhas alteradas e as do dia recalculado. Recalcular um dia substitui as
+linhas dele, então repetir é seguro e a margem não gera contagem dupla.
+
+Linhas apagadas e datas de evento alteradas não deixam rastro em updated_at
+no dia antigo: um hook de before_flush grava esses dias em rollup_dirty_days,
+na mesma transação da escrita, e a execução seguinte também os recalcula.
+
+Relatórios por período leem as tabelas daily_* (uma linha por dia e
+entidade), sem varrer as tabelas transacionais. daily_demand_cells guarda as
+contagens do mapa de calor por dia, empresa e célula base da grade; em uma
+instalação que já tinha consolidação, a primeira execução preenche as
+células de todo o histórico.
+
+Uso: python -m src.services.rollups [--rebuild]
+"""
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, func, inspect, insert, literal, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.service import Service
+from src.models.trip import Trip
+from src.models.payment import Payment
+from src.models.rating import DriverRating
+from src.models.rollup import DailyPlatformStats, DailyCompanyStats, DailyDriverStats, DailyDemandCell, RollupDirtyDay, RollupState
+from src.utils.money import money_sum, to_cents, from_cents
+from src.utils.geogrid import base_cell_expressions, valid_coordinates
+
+STATE_NAME = 'daily_rollups'
+# daily_demand_cells já cobre todo o histórico (preenchida uma vez em instalações existentes)
+DEMAND_CELLS_STATE_NAME = 'daily_demand_cells'
+
+# Margem para transações confirmadas depois de a marca d'água avançar
+SAFETY_LAG = timedelta(minutes=5)
+# Outra execução é considerada ativa por este tempo após a última renovação
+RUN_LEASE = timedelta(minutes=10)
+
+RUN_INTERVAL = 60  # segundos entre execuções do worker
+DAYS_PER_COMMIT = 31
+
+MONEY_METRICS = ('revenue', 'commission', 'driver_payments', 'earnings')
+
+# (modelo, coluna de data do evento) usados para achar os dias afetados
+EVENT_SOURCES = [
+    (Service, Service.data_solicitacao),
+    (Service, Service.data_conclusao),
+    (Trip, Trip.data_fim),
+    (Payment, Payment.data_pagamento),
+    (DriverRating, DriverRating.created_at),
+]
+
+# modelo -> atributos com data de evento (dias marcados no before_flush)
+EVENT_ATTRIBUTES = defaultdict(list)
+for _model, _event_column in EVENT_SOURCES:
+    EVENT_ATTRIBUTES[_model].append(_event_column.key)
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):  # SQLite retorna DATE() como texto
+        return date.fromisoformat(value[:10])
+    return value
+
+
+@event.listens_for(Session, 'before_flush')
+def mark_dirty_days(session, flush_context, instances):
+    """Grava, na transação da escrita, os dias de linhas apagadas e as datas
+    anteriores de eventos alterados (o novo dia é achado por updated_at)"""
+    days = set()
+    for obj in list(session.deleted) + list(session.dirty):
+        attributes = EVENT_ATTRIBUTES.get(type(obj))
+        if not attributes:
+            continue
+        state = inspect(obj)
+        for key in attributes:
+            values = list(state.attrs[key].history.deleted)
+            if obj in session.deleted:
+                values.append(getattr(obj, key))
+            days.update(value.date() for value in values if isinstance(value, datetime))
+
+    for day in sorted(days):
+        session.add(RollupDirtyDay(day=day))
+
+
+def marked_days():
+    """Dias marcados pelas escritas: [(id, dia)]"""
+    return db.session.query(RollupDirtyDay.id, RollupDirtyDay.day).all()
+
+
+def dirty_days(since=None):
+    """Dias com eventos em linhas alteradas depois de `since` (todos quando None)"""
+    days = set()
+    for model, event_column in EVENT_SOURCES:
+        query = db.session.query(func.date(event_column)).filter(event_column.isnot(None)).distinct()
+        if since is not None:
+            query = query.filter(model.updated_at > since)
+        days.update(_as_date(row[0]) for row in query)
+    return sorted(day for day in days if day is not None)
+
+
+def _day_range(day):
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def compute_day(day):
+    """Agrega um dia: retorna (plataforma, {company_id: {...}}, {driver_id: {...}})"""
+    start, end = _day_range(day)
+    platform = defaultdict(int)
+    companies = defaultdict(lambda: defaultdict(int))
+    drivers = defaultdict(lambda: defaultdict(int))
+
+    created = db.session.query(Service.company_id, func.count(Service.id))\
+        .filter(Service.data_solicitacao >= start, Service.data_solicitacao < end)\
+        .group_by(Service.company_id)
+    for company_id, count in created:
+        platform['services_created'] += count
+        if company_id:
+            companies[company_id]['services_created'] += count
+
+    completed = db.session.query(Service.company_id, func.count(Service.id))\
+        .filter(Service.status == 'concluido', Service.data_conclusao >= start, Service.data_conclusao < end)\
+        .group_by(Service.company_id)
+    for company_id, count in completed:
+        platform['services_completed'] += count
+        if company_id:
+            companies[company_id]['services_completed'] += count
+
+    trips = db.session.query(Trip.company_id, Trip.driver_id, func.count(Trip.id))\
+        .filter(Trip.status == 'concluida', Trip.data_fim >= start, Trip.data_fim < end)\
+        .group_by(Trip.company_id, Trip.driver_id)
+    for company_id, driver_id, count in trips:
+        platform['trips_completed'] += count
+        companies[company_id]['trips_completed'] += count
+        drivers[driver_id]['trips_completed'] += count
+
+    # Valores acumulados em centavos para não somar floats
+    payments = db.session.query(
+        Payment.company_id, Payment.driver_id, func.count(Payment.id),
+        money_sum(Payment.valor_total), money_sum(Payment.valor_comissao), money_sum(Payment.valor_motorista)
+    ).filter(
+        Payment.status_pagamento == 'aprovado', Payment.data_pagamento >= start, Payment.data_pagamento < end
+    ).group_by(Payment.company_id, Payment.driver_id)
+    for company_id, driver_id, count, total, commission, driver_amount in payments:
+        platform['payments_count'] += count
+        platform['revenue'] += to_cents(total)
+        platform['commission'] += to_cents(commission)
+        platform['driver_payments'] += to_cents(driver_amount)
+        companies[company_id]['payments_count'] += count
+        companies[company_id]['revenue'] += to_cents(total)
+        companies[company_id]['commission'] += to_cents(commission)
+        drivers[driver_id]['payments_count'] += count
+        drivers[driver_id]['earnings'] += to_cents(driver_amount)
+
+    ratings = db.session.query(DriverRating.driver_id, func.count(DriverRating.id), func.sum(DriverRating.stars))\
+        .filter(DriverRating.created_at >= start, DriverRating.created_at < end)\
+        .group_by(DriverRating.driver_id)
+    for driver_id, count, stars in ratings:
+        platform['ratings_count'] += count
+        platform['ratings_sum'] += float(stars or 0)
+        drivers[driver_id]['ratings_count'] += count
+        drivers[driver_id]['ratings_sum'] += float(stars or 0)
+
+    return platform, companies, drivers
+
+
+def _rollup_row(model, values, **keys):
+    """Linha completa para o INSERT em lote (métricas ausentes = 0, valores em reais)"""
+    row = dict(keys)
+    for column in model.__table__.columns:
+        if column.name in ('id', 'updated_at') or column.name in keys:
+            continue
+        value = values.get(column.name, 0)
+        row[column.name] = from_cents(value) if column.name in MONEY_METRICS else value
+    row['updated_at'] = datetime.utcnow()
+    return row
+
+
+def demand_cells_select(day):
+    """SELECT (day, company_id, cell_x, cell_y, services) dos serviços solicitados no dia"""
+    start, end = _day_range(day)
+    cell_x, cell_y = base_cell_expressions(
+        Service.origem_latitude, Service.origem_longitude, db.session.get_bind().dialect.name
+    )
+    return select(literal(day), Service.company_id, cell_x, cell_y, func.count(Service.id))\
+        .where(
+            Service.data_solicitacao >= start,
+            Service.data_solicitacao < end,
+            valid_coordinates(Service.origem_latitude, Service.origem_longitude)
+        )\
+        .group_by(Service.company_id, cell_x, cell_y)
+
+
+def service_days():
+    """Dias com serviços solicitados (preenchimento inicial de daily_demand_cells)"""
+    query = db.session.query(func.date(Service.data_solicitacao))\
+        .filter(Service.data_solicitacao.isnot(None))\
+        .distinct()
+    return sorted(day for day in (_as_date(row[0]) for row in query) if day is not None)
+
+
+def refresh_demand_cells(day):
+    """Substitui as células do mapa de calor de um dia (binning e contagem direto no banco)"""
+    DailyDemandCell.query.filter(DailyDemandCell.day == day).delete(synchronize_session=False)
+    db.session.execute(insert(DailyDemandCell).from_select(
+        ['day', 'company_id', 'cell_x', 'cell_y', 'services'], demand_cells_select(day)
+    ))
+
+
+def refresh_day(day):
+    """Substitui as linhas consolidadas de um dia (na sessão atual)"""
+    platform, companies, drivers = compute_day(day)
+
+    for model in (DailyPlatformStats, DailyCompanyStats, DailyDriverStats):
+        model.query.filter(model.day == day).delete(synchronize_session=False)
+
+    refresh_demand_cells(day)
+
+    if platform:
+        db.session.execute(DailyPlatformStats.__table__.insert(), [
+            _rollup_row(DailyPlatformStats, platform, day=day)
+        ])
+    if companies:
+        db.session.execute(DailyCompanyStats.__table__.insert(), [
+            _rollup_row(DailyCompanyStats, values, company_id=company_id, day=day)
+            for company_id, values in companies.items()
+        ])
+    if drivers:
+        db.session.execute(DailyDriverStats.__table__.insert(), [
+            _rollup_row(DailyDriverStats, values, driver_id=driver_id, day=day)
+            for driver_id, values in drivers.items()
+        ])
+
+
+def rollup_watermark():
+    """Até quando as tabelas consolidadas estão atualizadas (None antes da primeira execução)"""
+    return db.session.query(RollupState.watermark).filter(RollupState.name == STATE_NAME).scalar()
+
+
+def demand_cells_watermark():
+    """Até quando daily_demand_cells cobre todo o histórico (None antes do preenchimento inicial)"""
+    return db.session.query(RollupState.watermark).filter(RollupState.name == DEMAND_CELLS_STATE_NAME).scalar()
+
+
+def get_state(name=STATE_NAME):
+    """Linha de rollup_state do job (criada na primeira vez)"""
+    state = RollupState.query.filter_by(name=name).first()
+    if state is None:
+        try:
+            db.session.add(RollupState(name=name, days_refreshed=0))
+            db.session.commit()
+        except IntegrityError:
+            # Outro worker criou a linha ao mesmo tempo
+            db.session.rollback()
+        state = RollupState.query.filter_by(name=name).one()
+    return state
+
+
+def _lease_value():
+    return datetime.utcnow().replace(microsecond=0)  # DATETIME do MySQL sem fração
+
+
+def claim_lease(state_id, duration):
+    """Assume a vez do job (UPDATE atômico); retorna o valor da vez ou None se outro a detém"""
+    now = datetime.utcnow()
+    lease = _lease_value()
+    claimed = RollupState.query.filter(
+        RollupState.id == state_id,
+        db.or_(RollupState.locked_at.is_(None), RollupState.locked_at < now - duration)
+    ).update({RollupState.locked_at: lease}, synchronize_session=False)
+    db.session.commit()
+    return lease if claimed else None
+
+
+def renew_lease(state_id, lease):
+    """Renova a vez desta execução; levanta RuntimeError se outro worker a assumiu"""
+    renewed_at = _lease_value()
+    renewed = RollupState.query.filter(RollupState.id == state_id, RollupState.locked_at == lease)\
+        .update({RollupState.locked_at: renewed_at}, synchronize_session=False)
+    if not renewed:
+        raise RuntimeError(f'Job assumido por outra execução (rollup_state {state_id})')
+    return renewed_at
+
+
+def release_lease(state_id, lease):
+    """Libera a vez, se ainda for desta execução (confirma a transação)"""
+    RollupState.query.filter(RollupState.id == state_id, RollupState.locked_at == lease)\
+        .update({RollupState.locked_at: None}, synchronize_session=False)
+    db.session.commit()
+
+
+def run_rollups(rebuild=False):
+    """Recalcula os dias alterados desde a marca d'água; retorna os dias atualizados"""
+    state = get_state()
+    now = datetime.utcnow()
+
+    # Uma execução por vez entre os workers
+    lease = claim_lease(state.id, RUN_LEASE)
+    if lease is None:
+        return []
+
+    try:
+        cells_state = get_state(DEMAND_CELLS_STATE_NAME)
+        since = None if rebuild or state.watermark is None else state.watermark - SAFETY_LAG
+        marked = marked_days()
+        days = sorted(set(dirty_days(since)) | {day for _, day in marked})
+
+        # Consolidação anterior a daily_demand_cells: preencher as células dos
+        # demais dias uma única vez (só o INSERT ... SELECT das células)
+        backfill = []
+        if since is not None and cells_state.watermark is None:
+            backfill = sorted(set(service_days()) - set(days))
+
+        refreshes = [(refresh_day, day) for day in days] + [(refresh_demand_cells, day) for day in backfill]
+        for index, (refresh, day) in enumerate(refreshes, start=1):
+            refresh(day)
+            if index % DAYS_PER_COMMIT == 0:
+                # Execuções longas (--rebuild) renovam a vez a cada lote
+                lease = renew_lease(state.id, lease)
+                db.session.commit()
+
+        lease = renew_lease(state.id, lease)
+        state = RollupState.query.get(state.id)
+        state.watermark = now
+        state.days_refreshed = (state.days_refreshed or 0) + len(days)
+        state.last_run_at = datetime.utcnow()
+        cells_state = RollupState.query.get(cells_state.id)
+        if cells_state.watermark is None:
+            cells_state.watermark = now
+        cells_state.last_run_at = state.last_run_at
+        # Só as marcas lidas: as gravadas durante a execução ficam para a próxima
+        if marked:
+            RollupDirtyDay.query.filter(RollupDirtyDay.id.in_([mark_id for mark_id, _ in marked]))\
+                .delete(synchronize_session=False)
+        db.session.commit()
+        # Liberar a vez para a próxima execução
+        release_lease(state.id, lease)
+        return days
+    except Exception:
+        db.session.rollback()
+        release_lease(state.id, lease)
+        raise
+
+
+def parse_day_range(args, default_days=30):
+    """Período (start_date, end_date em AAAA-MM-DD, inclusivos) dos parâmetros da requisição"""
+    end_day = date.fromisoformat(args['end_date'][:10]) if args.get('end_date') else datetime.utcnow().date()
+    start_day = date.fromisoformat(args['start_date'][:10]) if args.get('start_date') \
+        else end_day - timedelta(days=default_days - 1)
+    if start_day > end_day:
+        raise ValueError('Período inválido')
+    return start_day, end_day
+
+
+def range_stats(model, start_day, end_day, **filters):
+    """Série diária e totais de um período, lidos das tabelas consolidadas"""
+    metrics = [column.name for column in model.__table__.columns
+               if column.name not in ('id', 'day', 'updated_at', 'company_id', 'driver_id')]
+
+    rows = model.query.filter_by(**filters)\
+        .filter(model.day >= start_day, model.day <= end_day)\
+        .order_by(model.day)\
+        .all()
+
+    series = []
+    totals = {metric: 0 for metric in metrics}
+    for row in rows:
+        values = {metric: getattr(row, metric) for metric in metrics}
+        series.append(dict(values, day=row.day.isoformat()))
+        for metric, value in values.items():
+            totals[metric] += to_cents(value) if metric in MONEY_METRICS else value
+
+    for metric in MONEY_METRICS:
+        if metric in totals:
+            totals[metric] = from_cents(totals[metric])
+    if 'ratings_count' in totals:
+        totals['average_rating'] = round(totals['ratings_sum'] / totals['ratings_count'], 2) if totals['ratings_count'] else None
+
+    return {'series': series, 'totals': totals}
+
+
+def start_rollup_worker(socketio, app, interval=RUN_INTERVAL):
+    """Executa a consolidação periodicamente em segundo plano (desligue com ROLLUP_WORKER=0)"""
+    if os.environ.get('ROLLUP_WORKER', '1') == '0':
+        return None
+
+    def worker():
+        while True:
+            try:
+                with app.app_context():
+                    try:
+                        run_rollups()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"❌ Erro na consolidação diária: {e}")
+            socketio.sleep(interval)
+
+    return socketio.start_background_task(worker)
+
+
+if __name__ == '__main__':
+    import argparse
+    from src.main import app
+
+    parser = argparse.ArgumentParser(description='Consolidação diária')
+    parser.add_argument('--rebuild', action='store_true', help='Recalcular todo o histórico')
+    args = parser.parse_args()
+
+    with app.app_context():
+        days = run_rollups(rebuild=args.rebuild)
+        print(f"✅ {len(days)} dias consolidados")
@@ -0,0 +1,185 @@
+"""
+Série temporal de receita, comissão e serviços pagos por intervalo
+(hour, day, week ou month).
+
+Os intervalos são calculados com GROUP BY sobre uma expressão de data que
+depende do banco (MySQL ou SQLite). Intervalos de dia, semana e mês já
+consolidados são lidos de daily_platform_stats; os de hora e os ainda não
+consolidados vêm dos pagamentos aprovados, usando o índice
+(status_pagamento, data_pagamento).
+
+Intervalos já fechados ficam em cache: só os que ainda não estão no cache
+e o intervalo em aberto são consultados.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from src.models.user import db
+from src.models.payment import Payment
+from src.models.rollup import DailyPlatformStats
+from src.services.rollups import SAFETY_LAG, rollup_watermark
+from src.utils.cache import TTLCache
+from src.utils.money import money_sum, to_cents, from_cents
+
+BUCKETS = ('hour', 'day', 'week', 'month')
+MAX_BUCKETS = 1000
+
+# Pagamentos aprovados depois do fim do intervalo ainda podem alterá-lo
+CLOSED_BUCKET_TTL = 3600  # segundos
+
+METRICS = ('revenue', 'commission', 'driver_payments', 'services_count')
+
+closed_buckets_cache = TTLCache(ttl=CLOSED_BUCKET_TTL, max_size=20000)
+
+
+def bucket_start(moment, bucket):
+    if bucket == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())  # semana começa na segunda
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, bucket):
+    if bucket == 'hour':
+        return start + timedelta(hours=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def bucket_range(start_date, end_date, bucket):
+    """Inícios dos intervalos que cobrem [start_date, end_date]"""
+    starts = []
+    current = bucket_start(start_date, bucket)
+    while current <= end_date:
+        starts.append(current)
+        if len(starts) > MAX_BUCKETS:
+            raise ValueError(f'Período muito longo para o intervalo (máximo {MAX_BUCKETS} pontos)')
+        current = next_bucket(current, bucket)
+    return starts
+
+
+def _bucket_expression(column, bucket, dialect):
+    """Início do intervalo calculado no banco"""
+    if dialect == 'sqlite':
+        if bucket == 'hour':
+            return func.strftime('%Y-%m-%d %H:00:00', column)
+        if bucket == 'week':
+            return func.date(column, func.printf('-%d days', (func.strftime('%w', column) + 6) % 7))
+        if bucket == 'month':
+            return func.strftime('%Y-%m-01', column)
+        return func.date(column)
+
+    if bucket == 'hour':
+        return func.date_format(column, '%Y-%m-%d %H:00:00')
+    if bucket == 'week':
+        return func.subdate(func.date(column), func.weekday(column))
+    if bucket == 'month':
+        return func.date_format(column, '%Y-%m-01')
+    return func.date(column)
+
+
+def _as_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return datetime.combine(value, datetime.min.time())
+
+
+def rollup_coverage():
+    """Momento até o qual a consolidação diária já inclui tudo (None sem consolidação)"""
+    watermark = rollup_watermark()
+    return watermark - SAFETY_LAG if watermark is not None else None
+
+
+def query_buckets(bucket, start, end, use_rollups):
+    """{início do intervalo: métricas} para [start, end) em um único GROUP BY"""
+    dialect = db.session.get_bind().dialect.name
+
+    if use_rollups:
+        key = _bucket_expression(DailyPlatformStats.day, bucket, dialect)
+        query = db.session.query(
+            key,
+            money_sum(DailyPlatformStats.revenue),
+            money_sum(DailyPlatformStats.commission),
+            money_sum(DailyPlatformStats.driver_payments),
+            func.coalesce(func.sum(DailyPlatformStats.payments_count), 0)
+        ).filter(DailyPlatformStats.day >= start.date(), DailyPlatformStats.day < end.date())
+    else:
+        key = _bucket_expression(Payment.data_pagamento, bucket, dialect)
+        query = db.session.query(
+            key,
+            money_sum(Payment.valor_total),
+            money_sum(Payment.valor_comissao),
+            money_sum(Payment.valor_motorista),
+            func.count(func.distinct(Payment.service_id))
+        ).filter(
+            Payment.status_pagamento == 'aprovado',
+            Payment.data_pagamento >= start,
+            Payment.data_pagamento < end
+        )
+
+    return {
+        _as_datetime(row[0]): dict(zip(METRICS, (float(row[1]), float(row[2]), float(row[3]), int(row[4]))))
+        for row in query.group_by(key).all()
+    }
+
+
+def _contiguous(starts, bucket):
+    """Agrupa inícios de intervalo em faixas contínuas [início, fim)"""
+    ranges = []
+    for start in starts:
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = next_bucket(start, bucket)
+        else:
+            ranges.append([start, next_bucket(start, bucket)])
+    return ranges
+
+
+def get_timeseries(start_date, end_date, bucket='day'):
+    if bucket not in BUCKETS:
+        raise ValueError(f'Intervalo inválido. Use: {", ".join(BUCKETS)}')
+    if start_date > end_date:
+        raise ValueError('Período inválido')
+
+    starts = bucket_range(start_date, end_date, bucket)
+    closed_until = datetime.utcnow() - SAFETY_LAG
+
+    cached = closed_buckets_cache.get_many([(bucket, start) for start in starts])
+    missing = [start for start in starts if (bucket, start) not in cached]
+
+    # Intervalos já consolidados vêm dos rollups; o restante, dos pagamentos
+    coverage = rollup_coverage() if bucket != 'hour' else None
+    from_rollups = [start for start in missing if coverage and next_bucket(start, bucket) <= coverage]
+    from_payments = [start for start in missing if start not in from_rollups]
+
+    computed = {}
+    for group, use_rollups in ((from_rollups, True), (from_payments, False)):
+        for range_start, range_end in _contiguous(group, bucket):
+            computed.update(query_buckets(bucket, range_start, range_end, use_rollups))
+
+    empty = {metric: 0 for metric in METRICS}
+    series = []
+    totals = {metric: 0 for metric in METRICS}
+    for start in starts:
+        key = (bucket, start)
+        if key in cached:
+            values = cached[key]
+        else:
+            values = computed.get(start, empty)
+            if next_bucket(start, bucket) <= closed_until:
+                closed_buckets_cache.set(key, values)
+        series.append(dict(values, bucket_start=start.isoformat()))
+        for metric in METRICS:
+            totals[metric] += values[metric] if metric == 'services_count' else to_cents(values[metric])
+
+    for metric in ('revenue', 'commission', 'driver_payments'):
+        totals[metric] = from_cents(totals[metric])
+
+    return {'bucket': bucket, 'series': series, 'totals': totals}
@@ -0,0 +1,45 @@
+"""
+Grade geográfica dos mapas de calor.
+
+As células têm lado em graus que dobra a cada nível de zoom a menos
+(8×8 células por tile de mapa). As contagens são guardadas só no zoom
+máximo (célula base); uma célula de zoom z é a célula base deslocada
+MAX_ZOOM - z bits (cell >> shift), então agregar para um zoom menor é um
+GROUP BY sobre chaves inteiras.
+"""
+from sqlalchemy import Integer, and_, cast, func
+
+MIN_ZOOM = 3
+MAX_ZOOM = 14
+CELLS_PER_TILE_BITS = 3
+
+
+def cell_size(zoom):
+    """Lado da célula em graus"""
+    return 360.0 / 2 ** (zoom + CELLS_PER_TILE_BITS)
+
+
+BASE_CELL_SIZE = cell_size(MAX_ZOOM)
+
+
+def zoom_shift(zoom):
+    return MAX_ZOOM - zoom
+
+
+def valid_coordinates(lat, lng):
+    return and_(lat.isnot(None), lng.isnot(None), lat.between(-90, 90), lng.between(-180, 180))
+
+
+def base_cell_expressions(lat, lng, dialect):
+    """(cell_x, cell_y) da célula base calculados no banco (valores sempre >= 0)"""
+    x = (lng + 180) / BASE_CELL_SIZE
+    y = (lat + 90) / BASE_CELL_SIZE
+    if dialect == 'sqlite':  # sem FLOOR; para valores >= 0 truncar é o mesmo
+        return cast(x, Integer), cast(y, Integer)
+    return func.floor(x), func.floor(y)
+
+
+def cell_center(cell_x, cell_y, zoom):
+    """(lat, lng) do centro de uma célula no zoom informado"""
+    size = cell_size(zoom)
+    return round(-90 + (cell_y + 0.5) * size, 6), round(-180 + (cell_x + 0.5) * size, 6)
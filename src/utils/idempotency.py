@@ -0,0 +1,251 @@
+"""
+Camada de idempotência para endpoints que alteram dados.
+
+O cliente envia o cabeçalho `Idempotency-Key` (ex.: um UUID por ação). A
+primeira requisição executa o handler e grava a resposta; repetições com a
+mesma chave recebem a resposta gravada, sem executar o handler de novo.
+
+- A chave é guardada como SHA-256 de usuário + método + rota + chave, na
+  tabela idempotency_keys, com um LRU em memória na frente para replays.
+- Duplicatas concorrentes esperam a primeira terminar: no mesmo processo por
+  um threading.Event, entre processos consultando a tabela.
+- O handler e a resposta gravada formam uma única transação: os commits do
+  handler viram flush e o commit real só acontece junto com a gravação da
+  resposta. Uma falha entre os dois desfaz também o efeito do handler, e a
+  chave é liberada (nunca fica efeito aplicado com a chave 'processando').
+- Respostas 5xx não são gravadas; a chave é liberada para nova tentativa.
+- Reusar a chave com outro corpo de requisição retorna 422.
+
+Sem o cabeçalho o endpoint se comporta como antes.
+"""
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.idempotency import IdempotencyKey
+from src.utils.cache import TTLCache
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+DEFAULT_TTL = 24 * 3600  # segundos
+
+# Tempo máximo que uma duplicata espera a requisição original
+WAIT_TIMEOUT = 10.0
+POLL_INTERVAL = 0.1
+
+# Chave 'processando' sem conclusão após esse tempo é considerada abandonada
+LOCK_TIMEOUT = timedelta(seconds=60)
+
+PURGE_INTERVAL = 600  # segundos
+
+response_cache = TTLCache(ttl=3600, max_size=10000)
+
+_inflight = {}  # key_hash -> threading.Event das requisições em execução neste processo
+_inflight_lock = threading.Lock()
+_last_purge = [0.0]
+
+
+def hash_key(raw_key):
+    identity = json.dumps(get_jwt_identity(), sort_keys=True, default=str)
+    material = '\n'.join([identity, request.method, request.path, raw_key])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def hash_request_body():
+    return hashlib.sha256(request.get_data() or b'').hexdigest()
+
+
+def replay(stored):
+    status, body, mimetype = stored[1:]
+    response = current_app.response_class(body, status=status, mimetype=mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def conflict_response():
+    return jsonify({'error': 'Idempotency-Key já utilizada com outra requisição'}), 422
+
+
+def _claim(key_hash, request_hash, ttl):
+    """Tenta registrar a chave como 'processando'. Retorna True se esta requisição é a dona."""
+    now = datetime.utcnow()
+    try:
+        db.session.add(IdempotencyKey(
+            key_hash=key_hash,
+            request_hash=request_hash,
+            status='processando',
+            locked_at=now,
+            expires_at=now + timedelta(seconds=ttl)
+        ))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+
+    # Chave expirada ou abandonada: assumir de forma atômica
+    taken = IdempotencyKey.query.filter(
+        IdempotencyKey.key_hash == key_hash,
+        db.or_(
+            IdempotencyKey.expires_at < now,
+            db.and_(IdempotencyKey.status == 'processando', IdempotencyKey.locked_at < now - LOCK_TIMEOUT)
+        )
+    ).update({
+        IdempotencyKey.request_hash: request_hash,
+        IdempotencyKey.status: 'processando',
+        IdempotencyKey.response_status: None,
+        IdempotencyKey.response_body: None,
+        IdempotencyKey.response_mimetype: None,
+        IdempotencyKey.locked_at: now,
+        IdempotencyKey.expires_at: now + timedelta(seconds=ttl)
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(taken)
+
+
+def _load_finished(key_hash):
+    """(request_hash, status, body, mimetype) da resposta gravada, 'processando' ou None"""
+    # Encerrar a transação para enxergar commits de outras conexões
+    db.session.rollback()
+    row = db.session.query(
+        IdempotencyKey.request_hash, IdempotencyKey.status, IdempotencyKey.response_status,
+        IdempotencyKey.response_body, IdempotencyKey.response_mimetype
+    ).filter(
+        IdempotencyKey.key_hash == key_hash,
+        IdempotencyKey.expires_at >= datetime.utcnow()
+    ).first()
+    if row is None:
+        return None
+    if row.status != 'concluido':
+        return 'processando'
+    return (row.request_hash, row.response_status, row.response_body, row.response_mimetype)
+
+
+def _wait_for_result(key_hash):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while True:
+        with _inflight_lock:
+            event = _inflight.get(key_hash)
+        remaining = deadline - time.monotonic()
+        if event is not None:
+            event.wait(max(remaining, 0))
+        else:
+            time.sleep(min(POLL_INTERVAL, max(remaining, 0)))
+
+        stored = response_cache.get(key_hash) or _load_finished(key_hash)
+        if stored != 'processando' or time.monotonic() >= deadline:
+            return stored
+
+
+@contextmanager
+def _handler_transaction():
+    """Os commits do handler viram flush; o commit real fica para _finish"""
+    session = db.session()
+    session.commit = session.flush
+    try:
+        yield session
+    finally:
+        del session.commit
+
+
+def _store_response(key_hash, response):
+    body = response.get_data(as_text=True)
+    IdempotencyKey.query.filter_by(key_hash=key_hash).update({
+        IdempotencyKey.status: 'concluido',
+        IdempotencyKey.response_status: response.status_code,
+        IdempotencyKey.response_body: body,
+        IdempotencyKey.response_mimetype: response.mimetype
+    }, synchronize_session=False)
+    return (response.status_code, body, response.mimetype)
+
+
+def _finish(key_hash, response, ttl):
+    """Grava a resposta na transação do handler e confirma as duas juntas"""
+    if response.status_code >= 500:
+        # Erro transitório: desfazer o que o handler deixou e liberar a chave
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(key_hash=key_hash).delete(synchronize_session=False)
+        db.session.commit()
+        return None
+
+    stored = _store_response(key_hash, response)
+    db.session.commit()
+    return stored
+
+
+def purge_expired_keys():
+    """Remove chaves expiradas (executado no máximo a cada PURGE_INTERVAL segundos)"""
+    now = time.monotonic()
+    if now - _last_purge[0] < PURGE_INTERVAL:
+        return 0
+    _last_purge[0] = now
+    deleted = IdempotencyKey.query.filter(
+        IdempotencyKey.expires_at < datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def idempotent(ttl=DEFAULT_TTL):
+    """Decorator para rotas; deve ficar abaixo de @jwt_required()"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            raw_key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not raw_key:
+                return view(*args, **kwargs)
+            if len(raw_key) > 255:
+                return jsonify({'error': 'Idempotency-Key inválida'}), 400
+
+            key_hash = hash_key(raw_key)
+            request_hash = hash_request_body()
+
+            stored = response_cache.get(key_hash)
+            if stored is not None:
+                return replay(stored) if stored[0] == request_hash else conflict_response()
+
+            try:
+                purge_expired_keys()
+                owner = _claim(key_hash, request_hash, ttl)
+            except Exception as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 500
+
+            if not owner:
+                stored = _wait_for_result(key_hash)
+                if stored == 'processando':
+                    return jsonify({'error': 'Requisição com esta Idempotency-Key ainda em processamento'}), 409
+                if stored is None:
+                    # A original falhou e liberou a chave
+                    return jsonify({'error': 'Requisição original falhou, tente novamente'}), 409
+                response_cache.set(key_hash, stored, ttl=min(ttl, response_cache.ttl))
+                return replay(stored) if stored[0] == request_hash else conflict_response()
+
+            event = threading.Event()
+            with _inflight_lock:
+                _inflight[key_hash] = event
+            try:
+                with _handler_transaction():
+                    response = make_response(view(*args, **kwargs))
+                result = _finish(key_hash, response, ttl)
+                if result is not None:
+                    response_cache.set(key_hash, (request_hash,) + result, ttl=min(ttl, response_cache.ttl))
+                return response
+            except Exception:
+                # Handler e resposta são desfeitos juntos; a chave volta a ficar livre
+                db.session.rollback()
+                IdempotencyKey.query.filter_by(key_hash=key_hash).delete(synchronize_session=False)
+                db.session.commit()
+                raise
+            finally:
+                with _inflight_lock:
+                    _inflight.pop(key_hash, None)
+                event.set()
+
+        return wrapper
+    return decorator
@@ -0,0 +1,75 @@
+"""
+Valores monetários.
+
+No banco os valores são DECIMAL(14, 2) (tipo `Money`), exatos ao centavo; no
+Python continuam sendo float em reais, arredondados ao centavo na gravação,
+para não mudar a API nem o JSON. Somas devem ser feitas no SQL
+(`money_sum`) ou em centavos inteiros (`sum_money`, com NumPy int64 quando
+disponível), nunca somando floats.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from sqlalchemy import func
+from sqlalchemy.types import TypeDecorator, Numeric
+
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional; sem ele a soma em centavos é feita em Python
+    np = None
+
+MONEY_PRECISION = 14
+MONEY_SCALE = 2
+CENT = Decimal('0.01')
+
+
+def to_decimal(value):
+    """Valor em reais como Decimal arredondado ao centavo"""
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def to_cents(value):
+    return int(to_decimal(value) * 100)
+
+
+def from_cents(cents):
+    return float(Decimal(int(cents)) / 100)
+
+
+def round_money(value):
+    """Arredonda ao centavo (meio para cima), devolvendo float"""
+    if value is None:
+        return None
+    return float(to_decimal(value))
+
+
+def sum_money(values):
+    """Soma exata de valores em reais, feita em centavos inteiros"""
+    values = [value for value in values if value is not None]
+    if not values:
+        return 0.0
+    if np is not None:
+        cents = np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+        return from_cents(cents.sum())
+    return from_cents(sum(to_cents(value) for value in values))
+
+
+class Money(TypeDecorator):
+    """DECIMAL(14, 2) no banco, float em reais no Python"""
+    impl = Numeric(MONEY_PRECISION, MONEY_SCALE)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return to_decimal(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return float(value)
+
+
+def money_sum(column):
+    """SUM exato no banco, 0 quando não há linhas"""
+    return func.coalesce(func.sum(column), 0, type_=Money())
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # Redis é opcional; sem ele a presença fica restrita ao processo
+    redis = None
+
+
+def presence_key(user_type, user_id):
+    return f'{user_type}:{user_id}'
+
+
+class MemoryPresenceBackend:
+    """Registro de presença em memória (um único worker)"""
+
+    def __init__(self):
+        self._users = {}  # chave do usuário -> {sid: expira_em}
+        self._lock = threading.Lock()
+
+    def add(self, user_key, sid, expires_at):
+        with self._lock:
+            sids = self._users.setdefault(user_key, {})
+            was_online = bool(sids)
+            sids[sid] = expires_at
+            return not was_online
+
+    def touch(self, user_key, sid, expires_at):
+        with self._lock:
+            sids = self._users.get(user_key)
+            if sids is not None and sid in sids:
+                sids[sid] = expires_at
+
+    def remove(self, user_key, sid, now):
+        with self._lock:
+            sids = self._users.get(user_key)
+            if not sids:
+                return False
+            sids.pop(sid, None)
+            for other_sid, expires_at in list(sids.items()):
+                if expires_at < now:
+                    del sids[other_sid]
+            if sids:
+                return False
+            del self._users[user_key]
+            return True
+
+    def online(self, user_keys, now):
+        with self._lock:
+            result = {}
+            for user_key in user_keys:
+                sids = self._users.get(user_key, {})
+                result[user_key] = any(expires_at >= now for expires_at in sids.values())
+            return result
+
+
+class RedisPresenceBackend:
+    """Registro de presença no Redis, compartilhado entre workers.
+
+    Cada usuário tem um ZSET `presence:<tipo>:<id>` com os sids e o instante
+    de expiração como score.
+    """
+
+    def __init__(self, url, ttl):
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def _key(self, user_key):
+        return f'presence:{user_key}'
+
+    def add(self, user_key, sid, expires_at):
+        key = self._key(user_key)
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', time.time())
+        pipe.zcard(key)
+        pipe.zadd(key, {sid: expires_at})
+        pipe.expire(key, int(self.ttl * 2))
+        _, count_before, _, _ = pipe.execute()
+        return count_before == 0
+
+    def touch(self, user_key, sid, expires_at):
+        key = self._key(user_key)
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {sid: expires_at}, xx=True)
+        pipe.expire(key, int(self.ttl * 2))
+        pipe.execute()
+
+    def remove(self, user_key, sid, now):
+        key = self._key(user_key)
+        pipe = self.client.pipeline()
+        pipe.zrem(key, sid)
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zcard(key)
+        _, _, remaining = pipe.execute()
+        return remaining == 0
+
+    def online(self, user_keys, now):
+        user_keys = list(user_keys)
+        pipe = self.client.pipeline()
+        for user_key in user_keys:
+            pipe.zcount(self._key(user_key), now, '+inf')
+        return {user_key: count > 0 for user_key, count in zip(user_keys, pipe.execute())}
+
+
+class PresenceRegistry:
+    """Quem está conectado ao chat, com todas as abas/dispositivos (sids) de cada usuário.
+
+    Cada evento (conexão, heartbeat, desconexão) custa O(1). Sids sem heartbeat
+    por mais de `ttl` segundos expiram na varredura periódica. Os métodos que
+    mudam o estado retornam a chave do usuário quando ele fica online/offline,
+    para que o chamador avise as salas.
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        self.backend = backend or MemoryPresenceBackend()
+        self.ttl = ttl
+        self._local_sids = {}  # sid -> [chave do usuário, expira_em], apenas deste worker
+        self._lock = threading.Lock()
+
+    def connect(self, user_type, user_id, sid):
+        """Registra um sid; retorna (usuário que ficou online, usuário que ficou offline).
+
+        Se o sid já estava registrado para outro usuário, a entrada antiga é
+        removida do backend (o usuário antigo pode ficar offline).
+        """
+        user_key = presence_key(user_type, user_id)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            previous = self._local_sids.get(sid)
+            self._local_sids[sid] = [user_key, expires_at]
+
+        offline_key = None
+        if previous is not None and previous[0] != user_key:
+            if self.backend.remove(previous[0], sid, time.time()):
+                offline_key = previous[0]
+        online_key = user_key if self.backend.add(user_key, sid, expires_at) else None
+        return online_key, offline_key
+
+    def heartbeat(self, sid):
+        with self._lock:
+            entry = self._local_sids.get(sid)
+            if entry is None:
+                return False
+            entry[1] = time.time() + self.ttl
+            user_key, expires_at = entry
+        self.backend.touch(user_key, sid, expires_at)
+        return True
+
+    def disconnect(self, sid):
+        """Remove um sid; retorna a chave do usuário se ele ficou offline"""
+        with self._lock:
+            entry = self._local_sids.pop(sid, None)
+        if entry is None:
+            return None
+        user_key = entry[0]
+        return user_key if self.backend.remove(user_key, sid, time.time()) else None
+
+    def expire(self):
+        """Remove sids deste worker sem heartbeat; retorna usuários que ficaram offline"""
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, (_, expires_at) in self._local_sids.items() if expires_at < now]
+
+        offline = []
+        for sid in expired:
+            user_key = self.disconnect(sid)
+            if user_key:
+                offline.append(user_key)
+        return offline
+
+    def lookup(self, user_keys):
+        """Consulta em lote: {chave do usuário: online}"""
+        return self.backend.online(set(user_keys), time.time())
+
+    def get_stats(self):
+        with self._lock:
+            return {'local_connections': len(self._local_sids)}
+
+
+def create_presence_registry(ttl=60):
+    """Usa Redis quando PRESENCE_REDIS_URL está definido e o pacote está instalado"""
+    url = os.environ.get('PRESENCE_REDIS_URL')
+    if url and redis is not None:
+        return PresenceRegistry(RedisPresenceBackend(url, ttl), ttl=ttl)
+    return PresenceRegistry(ttl=ttl)
@@ -0,0 +1,52 @@
+import threading
+
+
+class ReadReceiptCoalescer:
+    """Agrupa confirmações de leitura antes de enviá-las para as salas.
+
+    Para cada (sala, leitor) guarda apenas o maior id lido desde o último envio,
+    de modo que várias leituras seguidas resultam em um único evento.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'received': 0,
+            'emitted': 0,
+            'coalesced': 0
+        }
+
+    def add(self, chat_room_id, reader_type, reader_id, last_read_id):
+        key = (chat_room_id, reader_type, reader_id)
+        with self._lock:
+            self.stats['received'] += 1
+            current = self._pending.get(key)
+            if current is not None:
+                self.stats['coalesced'] += 1
+                if current >= last_read_id:
+                    return
+            self._pending[key] = last_read_id
+
+    def drain(self):
+        """Retorna os payloads de `messages_read` pendentes e limpa o buffer"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self.stats['emitted'] += len(pending)
+
+        return [
+            {
+                'chat_room_id': chat_room_id,
+                'reader_type': reader_type,
+                'reader_id': reader_id,
+                'last_read_id': last_read_id
+            }
+            for (chat_room_id, reader_type, reader_id), last_read_id in pending.items()
+        ]
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending'] = len(self._pending)
+        return stats
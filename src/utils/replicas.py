@@ -0,0 +1,168 @@
+"""
+Roteamento de leituras para réplicas do banco.
+
+As réplicas são binds opcionais do Flask-SQLAlchemy com nome iniciado por
+"replica" (ex.: SQLALCHEMY_BINDS = {'replica_0': ...}). Só endpoints
+marcados com @read_replica usam réplica, e mesmo neles:
+
+- apenas SELECTs (sem FOR UPDATE) vão para a réplica; flush, INSERT,
+  UPDATE e DELETE continuam no primário;
+- depois da primeira escrita na requisição, todas as leituras seguintes
+  voltam para o primário (read-your-writes dentro da requisição);
+- um usuário que escreveu há menos de PIN_AFTER_WRITE segundos lê do
+  primário (read-your-writes entre requisições, por processo);
+- uma réplica com atraso maior que MAX_REPLICA_LAG (ou inacessível) não é
+  usada. O atraso é medido por um heartbeat gravado no primário a cada
+  HEARTBEAT_INTERVAL segundos e lido na réplica.
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, g, has_app_context
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+from src.utils.cache import TTLCache
+
+REPLICA_BIND_PREFIX = 'replica'
+
+MAX_REPLICA_LAG = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+PIN_AFTER_WRITE = MAX_REPLICA_LAG  # segundos no primário depois de uma escrita
+LAG_CHECK_INTERVAL = 2  # segundos entre medições de atraso de cada réplica
+HEARTBEAT_INTERVAL = 1  # segundos
+
+HEARTBEAT_TABLE = 'replica_heartbeat'
+
+recent_writers = TTLCache(ttl=PIN_AFTER_WRITE, max_size=100000)
+
+_lag_checks = {}  # bind -> (medido em, saudável)
+_lag_lock = threading.Lock()
+
+
+def replica_binds(db):
+    return [key for key in db.engines if key and key.startswith(REPLICA_BIND_PREFIX)]
+
+
+def _parse_timestamp(value):
+    if isinstance(value, str):  # SQLite retorna DATETIME como texto
+        return datetime.fromisoformat(value)
+    return value
+
+
+def measure_lag(engine):
+    """Atraso da réplica em segundos (None se não for possível medir)"""
+    try:
+        with engine.connect() as connection:
+            beat_at = connection.execute(text(f'SELECT beat_at FROM {HEARTBEAT_TABLE} WHERE id = 1')).scalar()
+    except Exception:
+        return None
+    if beat_at is None:
+        return None
+    return (datetime.utcnow() - _parse_timestamp(beat_at)).total_seconds()
+
+
+def replica_healthy(db, bind):
+    now = time.monotonic()
+    checked_at, healthy = _lag_checks.get(bind, (0, False))
+    if now - checked_at < LAG_CHECK_INTERVAL:
+        return healthy
+
+    lag = measure_lag(db.engines[bind])
+    healthy = lag is not None and lag <= MAX_REPLICA_LAG
+    with _lag_lock:
+        _lag_checks[bind] = (now, healthy)
+    return healthy
+
+
+def choose_replica(db):
+    """Uma réplica saudável ao acaso (None para usar o primário)"""
+    healthy = [bind for bind in replica_binds(db) if replica_healthy(db, bind)]
+    return random.choice(healthy) if healthy else None
+
+
+def _identity_key():
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:  # requisição sem JWT verificado
+        return None
+    if identity is None:
+        return None
+    return repr(sorted(identity.items())) if isinstance(identity, dict) else str(identity)
+
+
+class RoutingSession(Session):
+    """Sessão que envia os SELECTs de endpoints @read_replica para a réplica escolhida"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            is_read = (
+                not self._flushing and
+                getattr(clause, 'is_select', False) and
+                getattr(clause, '_for_update_arg', None) is None
+            )
+            if not is_read:
+                g.replica_wrote = True
+            elif g.get('replica_bind') and not g.get('replica_wrote'):
+                return self._db.engines[g.replica_bind]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Leituras do endpoint vão para uma réplica (coloque abaixo de @jwt_required, se houver)"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions['sqlalchemy']
+        if replica_binds(db):
+            try:
+                verify_jwt_in_request(optional=True)
+            except Exception:  # token expirado/inválido em endpoint público: sem identidade
+                pass
+            identity = _identity_key()
+            if identity is None or recent_writers.get(identity) is None:
+                g.replica_bind = choose_replica(db)
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def init_replica_routing(app):
+    """Registra o hook que mantém no primário quem acabou de escrever"""
+    @app.after_request
+    def remember_writers(response):
+        if g.get('replica_wrote'):
+            identity = _identity_key()
+            if identity is not None:
+                recent_writers.set(identity, True)
+        return response
+
+
+def write_heartbeat(db):
+    now = datetime.utcnow()
+    with db.engine.begin() as connection:
+        updated = connection.execute(
+            text(f'UPDATE {HEARTBEAT_TABLE} SET beat_at = :now WHERE id = 1'), {'now': now}
+        ).rowcount
+        if not updated:
+            connection.execute(text(f'INSERT INTO {HEARTBEAT_TABLE} (id, beat_at) VALUES (1, :now)'), {'now': now})
+
+
+def start_replica_heartbeat(socketio, app, interval=HEARTBEAT_INTERVAL):
+    """Grava o heartbeat no primário em segundo plano (só com réplicas configuradas)"""
+    db = app.extensions['sqlalchemy']
+    with app.app_context():
+        if not replica_binds(db):
+            return None
+
+    def worker():
+        while True:
+            try:
+                with app.app_context():
+                    write_heartbeat(db)
+            except Exception as e:
+                print(f"❌ Erro no heartbeat das réplicas: {e}")
+            socketio.sleep(interval)
+
+    return socketio.start_background_task(worker)
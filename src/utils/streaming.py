@@ -0,0 +1,119 @@
+"""Geradores para respostas em streaming (memória constante)"""
+import csv
+import io
+
+ROWS_PER_CHUNK = 500  # linhas acumuladas antes de cada envio
+
+
+def chunked(lines, size=ROWS_PER_CHUNK):
+    """Agrupa linhas de texto em blocos para reduzir o número de writes da resposta"""
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_csv(columns, rows):
+    """Linhas CSV (cabeçalho + uma por item de `rows`), reaproveitando um único buffer"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+
+    def line(values):
+        writer.writerow(values)
+        value = out.getvalue()
+        out.seek(0)
+        out.truncate()
+        return value
+
+    yield line(columns)
+    for values in rows:
+        yield line(values)
+
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow é opcional; sem ele só há exportação em CSV
+    pa = None
+    pq = None
+
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+def parquet_available():
+    return pa is not None
+
+
+class _ChunkSink:
+    """Arquivo só de escrita que acumula os bytes até serem enviados"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def arrow_schema(columns):
+    """Schema Arrow de uma lista de (nome, tipo) com tipo em int, float, str, date ou timestamp"""
+    types = {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'str': pa.string(),
+        'date': pa.date32(),
+        'timestamp': pa.timestamp('us'),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def iter_parquet(columns, rows, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    """Arquivo Parquet em blocos: um row group por vez é montado e enviado.
+
+    `columns` é uma lista de (nome, tipo) com tipo em int, float, str, date
+    ou timestamp; `rows` produz sequências de valores nessa ordem.
+    """
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+
+    def write_group(batch):
+        values = list(zip(*batch))
+        writer.write_table(pa.table(
+            [pa.array(column, type=field.type) for column, field in zip(values, schema)],
+            schema=schema
+        ))
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= row_group_size:
+            write_group(batch)
+            batch = []
+            yield sink.drain()
+    if batch:
+        write_group(batch)
+    writer.close()
+    yield sink.drain()
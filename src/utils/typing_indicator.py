@@ -0,0 +1,117 @@
+import threading
+import time
+
+
+class TypingTracker:
+    """Máquina de estados de "digitando" por sala e por usuário.
+
+    Os eventos de teclado dos clientes só atualizam o estado em memória. Uma
+    mudança (começou/parou de digitar) é emitida no máximo uma vez por
+    intervalo para cada usuário, e quem para de enviar eventos expira após o
+    timeout. Eventos que não geram mudança visível são contados como suprimidos.
+    """
+
+    def __init__(self, interval=1.0, timeout=5.0):
+        self.interval = interval
+        self.timeout = timeout
+        self._states = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            'received': 0,
+            'emitted': 0,
+            'suppressed': 0,
+            'expired': 0
+        }
+
+    def update(self, chat_room_id, sender_type, sender_id, is_typing, sid=None, now=None):
+        """Registra um evento do cliente.
+
+        Retorna o payload de `user_typing` a ser emitido agora, ou None se o
+        evento foi absorvido (sem mudança ou dentro do intervalo mínimo).
+        """
+        now = time.monotonic() if now is None else now
+        key = (chat_room_id, sender_type, sender_id)
+
+        with self._lock:
+            self.stats['received'] += 1
+            state = self._states.get(key)
+            if state is None:
+                if not is_typing:
+                    # Parar de digitar sem ter começado não muda nada
+                    self.stats['suppressed'] += 1
+                    return None
+                state = {'typing': False, 'emitted': False, 'last_event': now, 'last_emit': None, 'sid': sid}
+                self._states[key] = state
+
+            state['typing'] = bool(is_typing)
+            state['last_event'] = now
+            if sid is not None:
+                state['sid'] = sid
+
+            payload = self._maybe_emit(key, state, now)
+            if payload is None:
+                self.stats['suppressed'] += 1
+            return payload
+
+    def sweep(self, now=None):
+        """Expira usuários inativos e libera mudanças pendentes.
+
+        Retorna uma lista de (payload, sid) a serem emitidos.
+        """
+        now = time.monotonic() if now is None else now
+        pending = []
+
+        with self._lock:
+            for key, state in list(self._states.items()):
+                if state['typing'] and now - state['last_event'] >= self.timeout:
+                    state['typing'] = False
+                    self.stats['expired'] += 1
+
+                payload = self._maybe_emit(key, state, now)
+                if payload is not None:
+                    pending.append((payload, state['sid']))
+
+                if not state['typing'] and not state['emitted']:
+                    del self._states[key]
+
+        return pending
+
+    def forget(self, sid):
+        """Encerra os estados de um socket desconectado; retorna os payloads de parada"""
+        pending = []
+        with self._lock:
+            for key, state in list(self._states.items()):
+                if state['sid'] != sid:
+                    continue
+                if state['emitted']:
+                    pending.append((self._payload(key, False), sid))
+                    self.stats['emitted'] += 1
+                del self._states[key]
+        return pending
+
+    def _maybe_emit(self, key, state, now):
+        if state['typing'] == state['emitted']:
+            return None
+        if state['last_emit'] is not None and now - state['last_emit'] < self.interval:
+            return None
+
+        state['emitted'] = state['typing']
+        state['last_emit'] = now
+        self.stats['emitted'] += 1
+        return self._payload(key, state['typing'])
+
+    @staticmethod
+    def _payload(key, is_typing):
+        chat_room_id, sender_type, sender_id = key
+        return {
+            'chat_room_id': chat_room_id,
+            'sender_type': sender_type,
+            'sender_id': sender_id,
+            'is_typing': is_typing
+        }
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['active'] = sum(1 for state in self._states.values() if state['typing'])
+        return stats
@@ -0,0 +1,71 @@
+"""
+Marcação de leitura do chat (ChatRoom.mark_messages_as_read e
+mark_room_as_read) em um banco SQLite.
+"""
+import importlib
+import pkgutil
+
+import pytest
+from flask import Flask
+
+import src.models
+from src.models.user import db
+from src.models.chat import ChatMessage, ChatRoom
+from src.routes.chat import mark_room_as_read, read_receipts
+
+# Todos os modelos, para que os relacionamentos e chaves estrangeiras resolvam
+for module in pkgutil.iter_modules(src.models.__path__):
+    importlib.import_module(f'src.models.{module.name}')
+
+
+@pytest.fixture
+def chat_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "chat.db"}'
+    app.config['TESTING'] = True
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all(bind_key=[None])
+        read_receipts.drain()
+        yield app
+        read_receipts.drain()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _room_with_messages():
+    room, _ = ChatRoom.get_or_create('company', 1, 'driver', 2)
+    for sender_type, sender_id in [('company', 1), ('driver', 2), ('driver', 2)]:
+        db.session.add(ChatMessage(chat_room_id=room.id, sender_id=sender_id,
+                                   sender_type=sender_type, message='oi'))
+        room.update_last_message('oi', sender_id, sender_type)
+    db.session.commit()
+    db.session.refresh(room)
+    return room
+
+
+def test_participant_marks_received_messages_as_read(chat_app):
+    room = _room_with_messages()
+
+    assert mark_room_as_read(room, 'company', 1) == 2
+    db.session.refresh(room)
+
+    assert room.unread_count_p1 == 0
+    assert ChatMessage.query.filter_by(is_read=True, sender_type='driver').count() == 2
+    assert ChatMessage.query.filter_by(is_read=True, sender_type='company').count() == 0
+    assert read_receipts.drain()
+
+
+def test_admin_viewing_non_support_room_changes_nothing(chat_app):
+    room = _room_with_messages()
+    counters = (room.unread_count_p1, room.unread_count_p2)
+
+    assert room.mark_messages_as_read(1, 'admin') == (0, None)
+    assert mark_room_as_read(room, 'admin', 1) == 0
+    db.session.refresh(room)
+
+    assert ChatMessage.query.filter_by(is_read=True).count() == 0
+    assert ChatMessage.query.filter(ChatMessage.read_at.isnot(None)).count() == 0
+    assert (room.unread_count_p1, room.unread_count_p2) == counters
+    assert not read_receipts.drain()
@@ -0,0 +1,96 @@
+"""
+Camada de idempotência (src.utils.idempotency) em um banco SQLite: o efeito
+do handler e a resposta gravada são confirmados juntos.
+"""
+import importlib
+import pkgutil
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+
+import src.models
+from src.models.user import db
+from src.models.company import Company
+from src.models.idempotency import IdempotencyKey
+from src.utils import idempotency
+from src.utils.idempotency import idempotent
+
+# Todos os modelos, para que os relacionamentos e chaves estrangeiras resolvam
+for module in pkgutil.iter_modules(src.models.__path__):
+    importlib.import_module(f'src.models.{module.name}')
+
+
+@pytest.fixture
+def idempotent_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "idempotency.db"}'
+    app.config['JWT_SECRET_KEY'] = 'idempotency-tests-secret-key-32-bytes'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    JWTManager(app)
+
+    @app.route('/companies', methods=['POST'])
+    @jwt_required()
+    @idempotent()
+    def create_company():
+        count = Company.query.count()
+        db.session.add(Company(
+            nome=f'empresa {count}', cnpj=f'00.000.000/0001-{count:02d}', email=f'e{count}@teste.com',
+            telefone='1', endereco='Rua A', cidade='São Paulo', estado='SP', cep='01000-000',
+            responsavel_nome='Responsável', responsavel_cargo='Gerente', password_hash='hash'
+        ))
+        db.session.commit()
+        return jsonify({'companies': count + 1}), 201
+
+    with app.app_context():
+        db.create_all(bind_key=[None])
+        headers = {
+            'Authorization': f'Bearer {create_access_token(identity="company:1")}',
+            'Idempotency-Key': 'chave-1'
+        }
+        idempotency.response_cache.clear()
+        yield app, headers
+        idempotency.response_cache.clear()
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _persisted_companies():
+    db.session.rollback()
+    return Company.query.count()
+
+
+def test_replay_after_commit_does_not_repeat_the_handler(idempotent_app):
+    app, headers = idempotent_app
+    client = app.test_client()
+
+    assert client.post('/companies', headers=headers).status_code == 201
+    idempotency.response_cache.clear()  # replay a partir da tabela, como em outro processo
+
+    response = client.post('/companies', headers=headers)
+    assert response.status_code == 201
+    assert response.headers['Idempotent-Replayed'] == 'true'
+    assert _persisted_companies() == 1
+
+
+def test_failure_storing_the_response_undoes_the_handler(idempotent_app, monkeypatch):
+    app, headers = idempotent_app
+    client = app.test_client()
+
+    def fail(key_hash, response):
+        raise RuntimeError('queda antes de gravar a resposta')
+
+    monkeypatch.setattr(idempotency, '_store_response', fail)
+    with pytest.raises(RuntimeError):
+        client.post('/companies', headers=headers)
+
+    # Nem o efeito do handler nem a chave ficaram gravados
+    assert _persisted_companies() == 0
+    assert IdempotencyKey.query.count() == 0
+
+    # A nova tentativa executa uma vez e depois é reaproveitada
+    monkeypatch.undo()
+    assert client.post('/companies', headers=headers).json == {'companies': 1}
+    assert client.post('/companies', headers=headers).headers['Idempotent-Replayed'] == 'true'
+    assert _persisted_companies() == 1
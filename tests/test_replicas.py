@@ -0,0 +1,165 @@
+"""
+Roteamento de leituras para réplicas (src.utils.replicas) com dois arquivos
+SQLite: um faz o papel do primário e o outro, da réplica.
+
+O arquivo da réplica é uma cópia do primário em que o nome da empresa foi
+trocado, então cada endpoint de teste sabe de qual banco leu.
+"""
+import importlib
+import pkgutil
+import shutil
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask, jsonify
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required
+
+import src.models
+from src.models.user import db
+from src.models.company import Company
+from src.utils import replicas
+from src.utils.replicas import init_replica_routing, read_replica, write_heartbeat
+
+# Todos os modelos, para que os relacionamentos e chaves estrangeiras resolvam
+for module in pkgutil.iter_modules(src.models.__path__):
+    importlib.import_module(f'src.models.{module.name}')
+
+
+def _set_heartbeat(path, beat_at):
+    connection = sqlite3.connect(path)
+    if beat_at is None:
+        connection.execute('DELETE FROM replica_heartbeat')
+    else:
+        connection.execute('UPDATE replica_heartbeat SET beat_at = ?', (beat_at.isoformat(' '),))
+    connection.commit()
+    connection.close()
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    primary = tmp_path / 'primary.db'
+    replica = tmp_path / 'replica.db'
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{primary}'
+    app.config['SQLALCHEMY_BINDS'] = {'replica_0': f'sqlite:///{replica}'}
+    app.config['JWT_SECRET_KEY'] = 'replica-tests-secret-key-with-32-bytes'
+    app.config['TESTING'] = True
+    db.init_app(app)
+    JWTManager(app)
+    init_replica_routing(app)
+
+    with app.app_context():
+        db.create_all(bind_key=[None])
+        db.session.add(Company(
+            nome='primario', cnpj='00.000.000/0001-00', email='empresa@teste.com', telefone='1',
+            endereco='Rua A', cidade='São Paulo', estado='SP', cep='01000-000',
+            responsavel_nome='Responsável', responsavel_cargo='Gerente', password_hash='hash'
+        ))
+        db.session.commit()
+        write_heartbeat(db)
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    # "Replicação": cópia do primário, com o nome trocado para identificar a origem
+    shutil.copy(primary, replica)
+    connection = sqlite3.connect(replica)
+    connection.execute("UPDATE companies SET nome = 'replica'")
+    connection.commit()
+    connection.close()
+
+    @app.route('/read')
+    @read_replica
+    def read():
+        return jsonify(source=Company.query.first().nome)
+
+    @app.route('/write-then-read')
+    @read_replica
+    def write_then_read():
+        company = Company.query.first()
+        company.telefone = '2'
+        db.session.flush()
+        source = db.session.query(Company.nome).scalar()  # coluna: não reaproveita o identity map
+        db.session.rollback()
+        return jsonify(source=source)
+
+    @app.route('/for-update')
+    @read_replica
+    def for_update():
+        return jsonify(source=Company.query.with_for_update().first().nome)
+
+    @app.route('/write', methods=['POST'])
+    @jwt_required()
+    def write():
+        Company.query.first().telefone = '3'
+        db.session.commit()
+        return jsonify(ok=True)
+
+    @app.route('/me')
+    @jwt_required()
+    @read_replica
+    def me():
+        return jsonify(source=Company.query.first().nome)
+
+    replicas._lag_checks.clear()
+    replicas.recent_writers.clear()
+    app.replica_path = str(replica)
+    yield app
+    replicas._lag_checks.clear()
+    replicas.recent_writers.clear()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def _auth(app, identity):
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=identity)}'}
+
+
+def test_read_replica_view_reads_from_replica(replica_app):
+    response = replica_app.test_client().get('/read')
+    assert response.status_code == 200
+    assert response.json['source'] == 'replica'
+
+
+def test_stale_heartbeat_falls_back_to_primary(replica_app):
+    _set_heartbeat(replica_app.replica_path, datetime.utcnow() - timedelta(minutes=5))
+    assert replica_app.test_client().get('/read').json['source'] == 'primario'
+
+
+def test_missing_heartbeat_falls_back_to_primary(replica_app):
+    _set_heartbeat(replica_app.replica_path, None)
+    assert replica_app.test_client().get('/read').json['source'] == 'primario'
+
+
+def test_reads_after_write_in_same_request_use_primary(replica_app):
+    assert replica_app.test_client().get('/write-then-read').json['source'] == 'primario'
+
+
+def test_recent_writer_is_pinned_to_primary(replica_app):
+    client = replica_app.test_client()
+    headers = _auth(replica_app, 'company:1')
+    assert client.get('/me', headers=headers).json['source'] == 'replica'
+
+    assert client.post('/write', headers=headers).status_code == 200
+    assert client.get('/me', headers=headers).json['source'] == 'primario'
+
+    other = _auth(replica_app, 'company:2')
+    assert client.get('/me', headers=other).json['source'] == 'replica'
+
+
+def test_select_for_update_uses_primary(replica_app):
+    assert replica_app.test_client().get('/for-update').json['source'] == 'primario'
+
+
+def test_invalid_token_on_public_view_is_ignored(replica_app):
+    with replica_app.app_context():
+        expired = create_access_token(identity='company:1', expires_delta=timedelta(seconds=-1))
+    client = replica_app.test_client()
+    for token in (expired, 'not-a-jwt'):
+        response = client.get('/read', headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        assert response.json['source'] == 'replica'
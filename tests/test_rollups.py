@@ -0,0 +1,82 @@
+"""
+Consolidação diária (src.services.rollups) em um banco SQLite: dias que a
+marca d'água não encontra (linha apagada, data do evento alterada) também
+são recalculados.
+"""
+import importlib
+import pkgutil
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+import src.models
+from src.models.user import db
+from src.models.rating import DriverRating
+from src.models.rollup import DailyDriverStats, DailyPlatformStats, RollupDirtyDay
+from src.services.rollups import run_rollups
+
+# Todos os modelos, para que os relacionamentos e chaves estrangeiras resolvam
+for module in pkgutil.iter_modules(src.models.__path__):
+    importlib.import_module(f'src.models.{module.name}')
+
+FIRST_DAY = datetime(2026, 3, 2, 10)
+SECOND_DAY = FIRST_DAY + timedelta(days=1)
+THIRD_DAY = FIRST_DAY + timedelta(days=2)
+
+
+@pytest.fixture
+def rollup_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "rollups.db"}'
+    app.config['TESTING'] = True
+    db.init_app(app)
+
+    with app.app_context():
+        db.create_all(bind_key=[None])
+        db.session.add_all([
+            DriverRating(driver_id=1, stars=5, created_at=FIRST_DAY),
+            DriverRating(driver_id=1, stars=3, created_at=FIRST_DAY),
+            DriverRating(driver_id=1, stars=4, created_at=SECOND_DAY),
+        ])
+        db.session.commit()
+        run_rollups()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def _ratings(day):
+    row = DailyPlatformStats.query.filter_by(day=day.date()).first()
+    return (row.ratings_count, row.ratings_sum) if row else (0, 0)
+
+
+def test_deleted_rating_is_removed_from_its_day(rollup_app):
+    assert _ratings(FIRST_DAY) == (2, 8)
+
+    db.session.delete(DriverRating.query.filter_by(stars=5).one())
+    db.session.commit()
+    assert RollupDirtyDay.query.count() == 1
+
+    assert FIRST_DAY.date() in run_rollups()
+    assert _ratings(FIRST_DAY) == (1, 3)
+    assert DailyDriverStats.query.filter_by(driver_id=1, day=FIRST_DAY.date()).one().ratings_count == 1
+    assert RollupDirtyDay.query.count() == 0
+
+
+def test_moved_event_date_refreshes_the_old_day(rollup_app):
+    assert _ratings(SECOND_DAY) == (1, 4)
+
+    DriverRating.query.filter_by(stars=4).one().created_at = THIRD_DAY
+    db.session.commit()
+
+    days = run_rollups()
+    assert SECOND_DAY.date() in days and THIRD_DAY.date() in days
+    assert _ratings(SECOND_DAY) == (0, 0)
+    assert _ratings(THIRD_DAY) == (1, 4)
+
+
+def test_unrelated_updates_do_not_mark_days(rollup_app):
+    DriverRating.query.filter_by(stars=4).one().feedback = 'pontual'
+    db.session.commit()
+    assert RollupDirtyDay.query.count() == 0